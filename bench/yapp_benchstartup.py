@@ -0,0 +1,166 @@
+#!/usr/bin/python
+
+# yapp_benchstartup.py
+# Measure the cold-start cost of the YAPP Python scripts, with and without
+#   graphics, so that startup regressions can be tracked. Each script is run
+#   repeatedly on small synthetic inputs in a scratch directory, and the wall
+#   clock time of each run is recorded. Cases that plot use the
+#   non-interactive Agg backend so that they do not block.
+
+import sys
+import os
+import getopt
+import shutil
+import subprocess
+import tempfile
+import time
+import numpy
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options]"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -n  --runs <n>                       ",                        \
+          "Number of runs per case\n",                                        \
+          "                                         ",                        \
+          "(default is 10)"
+    print "    -p  --python <path>                  ",                        \
+          "Python interpreter to use\n",                                      \
+          "                                         ",                        \
+          "(default is the current interpreter)"
+    print "    -s  --scripts <dir>                  ",                        \
+          "Directory containing the YAPP scripts\n",                          \
+          "                                         ",                        \
+          "(default is ../scripts)"
+    print "    -o  --output <file>                  ",                        \
+          "Append results to file as CSV"
+    return
+
+def WriteProfs(Dir, NBands, NBins):
+    "Writes synthetic folded profiles and returns their file names."
+    numpy.random.seed(0)
+    Files = []
+    for i in range(NBands):
+        prof = numpy.random.normal(1.0, 0.01, NBins)
+        prof[NBins // 2:(NBins // 2) + (NBins // 16)] += 0.5
+        fileProf = os.path.join(Dir, "bench.band" + str(i) + ".ypr")
+        fdest = open(fileProf, "w")
+        fdest.write("# Centre frequency                  : %.10g MHz\n"
+                    % (1400.0 + i))
+        fdest.write("# Original channel bandwidth        : 1 MHz\n")
+        fdest.write("# Bandwidth                         : 1 MHz\n")
+        fdest.write("# Duration of data                  : 600 s\n")
+        prof.tofile(fdest, "\n", "%.10f")
+        fdest.close()
+        Files.append(fileProf)
+    return Files
+
+def TimeRun(Cmd, Dir, Env):
+    "Runs a command and returns its wall clock time in seconds."
+    tStart = time.time()
+    Ret = subprocess.call(Cmd, cwd=Dir, env=Env,
+                          stdout=open(os.devnull, "w"),
+                          stderr=subprocess.STDOUT)
+    tStop = time.time()
+    if (Ret != 0):
+        raise RuntimeError("'" + " ".join(Cmd) + "' failed with exit code "
+                           + str(Ret))
+    return tStop - tStart
+
+# defaults
+NRuns = 10
+Python = sys.executable
+ScriptDir = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])),
+                         os.pardir, "scripts")
+Output = None
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "hn:p:s:o:"
+OptsLong = ["help", "runs=", "python=", "scripts=", "output="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+for o, a in Opts:
+    if o in ("-h", "--help"):
+        PrintUsage(ProgName)
+        sys.exit()
+    elif o in ("-n", "--runs"):
+        NRuns = int(a)
+    elif o in ("-p", "--python"):
+        Python = a
+    elif o in ("-s", "--scripts"):
+        ScriptDir = a
+    elif o in ("-o", "--output"):
+        Output = a
+    else:
+        PrintUsage(ProgName)
+        sys.exit(1)
+
+ScriptDir = os.path.abspath(ScriptDir)
+WorkDir = tempfile.mkdtemp(prefix="yapp_bench_")
+Files = WriteProfs(WorkDir, 8, 1024)
+
+Env = dict(os.environ)
+Env["MPLBACKEND"] = "Agg"
+Env["PYTHONPATH"] = ScriptDir + os.pathsep + Env.get("PYTHONPATH", "")
+
+CalOpts = ["-T", "30", "-G", "10", "-p", "2", "-n", "0.5", "-f", "0.5625",
+           "-b", "1"]
+# (label, script, arguments), where a script of None runs the interpreter
+#   itself, for reference
+Cases = [("python", None, ["-c", "pass"]),
+         ("import numpy", None, ["-c", "import numpy"]),
+         ("import matplotlib.pyplot", None, ["-c", "import matplotlib.pyplot"]),
+         ("yapp_genpfbcoeff.py", "yapp_genpfbcoeff.py",
+          ["-n", "4096", "-t", "8"]),
+         ("yapp_genpfbcoeff.py -g", "yapp_genpfbcoeff.py",
+          ["-n", "4096", "-t", "8", "-g"]),
+         ("yapp_genfiltermask.py", "yapp_genfiltermask.py",
+          ["-n", "4096", "-t", "0.0001"]),
+         ("yapp_genfiltermask.py -g", "yapp_genfiltermask.py",
+          ["-n", "4096", "-t", "0.0001", "-g"]),
+         ("yapp_addprof.py", "yapp_addprof.py", Files[:2]),
+         ("yapp_addprof.py -g", "yapp_addprof.py", ["-g"] + Files[:2]),
+         ("yapp_calcspecidx.py -B", "yapp_calcspecidx.py",
+          ["-B", "-j", "1"] + CalOpts + Files),
+         ("yapp_calcspecidx.py", "yapp_calcspecidx.py", CalOpts + Files),
+         ("yapp_stackprof.py", "yapp_stackprof.py", CalOpts + Files)]
+
+Results = []
+try:
+    for (Label, Script, CaseArgs) in Cases:
+        Cmd = [Python]
+        if (Script is not None):
+            Cmd.append(os.path.join(ScriptDir, Script))
+        Cmd = Cmd + CaseArgs
+        Times = numpy.array([TimeRun(Cmd, WorkDir, Env)
+                             for i in range(NRuns)]) * 1e3
+        Results.append((Label, numpy.median(Times), numpy.min(Times),
+                        numpy.max(Times)))
+        print "%-28s median %8.1f ms  min %8.1f ms  max %8.1f ms"             \
+              % Results[-1]
+finally:
+    shutil.rmtree(WorkDir)
+
+if (Output is not None):
+    NewFile = not os.path.exists(Output)
+    fdest = open(Output, "a")
+    if (NewFile):
+        fdest.write("timestamp,python,case,median_ms,min_ms,max_ms\n")
+    Stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    for (Label, Median, Min, Max) in Results:
+        fdest.write(Stamp + "," + Python + "," + Label + ","
+                    + str("%.1f" % Median) + "," + str("%.1f" % Min) + ","
+                    + str("%.1f" % Max) + "\n")
+    fdest.close()
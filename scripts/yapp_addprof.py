@@ -1,14 +1,17 @@
 #!/usr/bin/python
 
 # yapp_addprof.py
-# Add [calibrated] profiles from two polarisations.
+# Add [calibrated] profiles from two polarisations, for one pair of files, or
+#   for many pairs in batch mode.
 
 import sys
 import os
 import getopt
+import glob
 import math
+import multiprocessing.pool
 import numpy
-import matplotlib.pyplot as plotter
+import yapp_common as yapp
 
 # function definitions
 def PrintUsage(ProgName):
@@ -18,16 +21,72 @@ def PrintUsage(ProgName):
           "Display this usage information"
     print "    -g  --graphics                       ",                        \
           "Turn on graphics"
+    print "    -m  --manifest <file>                ",                        \
+          "Batch mode: add the pairs of files\n",                             \
+          "                                         ",                        \
+          "listed in the given file, one pair per\n",                         \
+          "                                         ",                        \
+          "line"
+    print "    -p  --pattern <glob>                 ",                        \
+          "Batch mode: add the pol0 files matching\n",                        \
+          "                                         ",                        \
+          "the given wildcard pattern to their\n",                            \
+          "                                         ",                        \
+          "pol1 files"
+    print "    -r  --replace <pol0>:<pol1>          ",                        \
+          "Replace <pol0> with <pol1> in the names\n",                        \
+          "                                         ",                        \
+          "of pol0 files to get the names of pol1\n",                         \
+          "                                         ",                        \
+          "files (default is pol0:pol1)"
+    print "    -j  --jobs <n>                       ",                        \
+          "Number of threads reading and writing\n",                          \
+          "                                         ",                        \
+          "files in batch mode\n",                                            \
+          "                                         ",                        \
+          "(default is number of CPUs)"
     return
 
+def ReadPairList(FilePairs):
+    """Reads a list of pairs of files, one pair per line, separated by white
+    space. Anything after a '#' is ignored."""
+    Pairs = []
+    for Line in open(FilePairs, "r"):
+        Line = Line.split("#")[0].strip()
+        if ("" == Line):
+            continue
+        Fields = Line.split()
+        if (len(Fields) != 2):
+            raise ValueError("Invalid line in " + FilePairs + ": " + Line)
+        Pairs.append((Fields[0], Fields[1]))
+    return Pairs
+
+def GetPairsFromPattern(Pattern, Replace):
+    "Finds the pol1 file for each pol0 file matching the pattern."
+    (Pol0, Sep, Pol1) = Replace.partition(":")
+    if (Sep != ":" or "" == Pol0):
+        raise ValueError("Invalid replacement " + Replace)
+    Pairs = []
+    for FilePol0 in sorted(glob.glob(Pattern)):
+        # replace the last occurrence, so that directory names are not changed
+        (Head, Sep, Tail) = FilePol0.rpartition(Pol0)
+        if (Sep != Pol0):
+            raise ValueError(FilePol0 + " does not contain " + Pol0)
+        Pairs.append((FilePol0, Head + Pol1 + Tail))
+    return Pairs
+
 # default
 showPlot = False        # plot flag
 writeStd = False        # write standard deviation in output file
+FilePairs = None        # manifest, for batch mode
+Pattern = None          # pattern of pol0 files, for batch mode
+Replace = "pol0:pol1"
+NJobs = multiprocessing.cpu_count()
 
 # get the command line arguments
 ProgName = sys.argv[0]
-OptsShort = "hg"
-OptsLong = ["help", "graphics"]
+OptsShort = "hgm:p:r:j:"
+OptsLong = ["help", "graphics", "manifest=", "pattern=", "replace=", "jobs="]
 
 # get the arguments using the getopt module
 try:
@@ -47,6 +106,18 @@ for o, a in Opts:
     elif o in ("-g", "--graphics"):
         showPlot = True
         optind = optind + 1
+    elif o in ("-m", "--manifest"):
+        FilePairs = a
+        optind = optind + 2
+    elif o in ("-p", "--pattern"):
+        Pattern = a
+        optind = optind + 2
+    elif o in ("-r", "--replace"):
+        Replace = a
+        optind = optind + 2
+    elif o in ("-j", "--jobs"):
+        NJobs = int(a)
+        optind = optind + 2
     else:
         PrintUsage(ProgName)
         sys.exit(1)
@@ -59,71 +130,63 @@ if (1 == len(sys.argv)):
     PrintUsage(ProgName)
     sys.exit(1)
 
-# count the number of header lines in the first file (assume to be the same for
-#    all files)
-HeaderLines = 0
-hdr = open(sys.argv[optind])
-for line in hdr:
-    if ("#" == line[0]):
-        HeaderLines = HeaderLines + 1
-hdr.close()
+if (FilePairs is not None or Pattern is not None):
+    # batch mode
+    try:
+        Pairs = []
+        if (FilePairs is not None):
+            Pairs.extend(ReadPairList(FilePairs))
+        if (Pattern is not None):
+            Pairs.extend(GetPairsFromPattern(Pattern, Replace))
+        # most of the time is spent reading and writing files, so use threads
+        #   rather than processes
+        pool = multiprocessing.pool.ThreadPool(max(1, NJobs))
+        try:
+            (FilesSum, Skipped) = yapp.AddPolProfFiles(Pairs, pool)
+        finally:
+            pool.close()
+            pool.join()
+    except (IOError, OSError, ValueError), ErrMsg:
+        sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+        sys.exit(1)
+    for (Pair, ErrMsg) in Skipped:
+        sys.stderr.write("ERROR: " + ErrMsg + "!\n")
+    print "Added %d pairs of profiles." % len(FilesSum)
+    if (len(Skipped) > 0):
+        sys.stderr.write("ERROR: Skipped %d pairs of profiles!\n"
+                         % len(Skipped))
+        sys.exit(1)
+    sys.exit()
+
+# read profiles
+(hdr0, prof0) = yapp.ReadProf(sys.argv[optind])
+(hdr1, prof1) = yapp.ReadProf(sys.argv[optind+1])
 
 # get the standard deviations from the two polarizations and compute that of the
 #   sum
-if (5 == HeaderLines):
-    # open pol0
-    hdr = open(sys.argv[optind])
-    for i, line in enumerate(hdr):
-        if (4 == i):
-            # read 1-sigma error in S and convert to Jy
-            DeltaS0 = float(line[37:-5]) * 1e-6
-    hdr.close()
-    # open pol1
-    hdr = open(sys.argv[optind+1])
-    for i, line in enumerate(hdr):
-        if (4 == i):
-            # read 1-sigma error in S and convert to Jy
-            DeltaS1 = float(line[37:-5]) * 1e-6
-    hdr.close()
+if (hdr0.DeltaS is not None and hdr1.DeltaS is not None):
     # compute standard deviation of the sum (assume the two polarizations are
     #   independent random variables, so that the covariance is 0)
-    DeltaS = math.sqrt((DeltaS0 * DeltaS0) + (DeltaS1 * DeltaS1))
+    DeltaS = math.sqrt((hdr0.DeltaS * hdr0.DeltaS)                            \
+                       + (hdr1.DeltaS * hdr1.DeltaS))
     writeStd = True
 
-NBins = len(open(sys.argv[optind]).readlines()) - HeaderLines
+NBins = hdr0.NBins
 x = numpy.array([float(i) / NBins for i in range(NBins)])
 
-# read profiles
-prof0 = numpy.loadtxt(sys.argv[optind], dtype=numpy.float32,                  \
-                      comments="#", delimiter="\n")
-prof1 = numpy.loadtxt(sys.argv[optind+1], dtype=numpy.float32,                \
-                      comments="#", delimiter="\n")
-
 profSum = prof0 + prof1
 
-# write the summed profiles to disk
-# build filename
+# write the summed profiles to disk, copying the header lines from the
+#   original file, with the new standard deviation if adding calibrated data
 fileSumProf = os.path.splitext(sys.argv[optind])[0] + ".sum.ypr"
-fsrc = open(sys.argv[optind], "r")
-fdest = open(fileSumProf, "w")
-# copy the header lines (- standard deviation) from the original file, if
-#   adding calibrated data, otherwise copy all header lines
 if (writeStd):
-    for  j in range(HeaderLines-1):
-        fdest.write(fsrc.readline())
-    # write the new standard deviation
-    fdest.write("# Standard deviation of S           : "
-                + str("%.3f" % (DeltaS * 1e6)) + " uJy\n")
+    yapp.WriteProf(fileSumProf, hdr0, profSum, DeltaS)
 else:
-    for  j in range(HeaderLines):
-        fdest.write(fsrc.readline())
-# write the calibrated profile
-profSum.tofile(fdest, "\n", "%.10f")
-fdest.close()
-fsrc.close()
+    yapp.WriteProf(fileSumProf, hdr0, profSum)
 
 # make plots
 if (showPlot):
+    import matplotlib.pyplot as plotter
     plotter.plot(x, prof0, label="pol0")
     plotter.plot(x, prof1, label="pol1")
     plotter.plot(x, profSum, label="pol0 + pol1")
@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+#
+# yapp_boxcar.py
+# Boxcar matched-filter functions, for single-pulse searches over many pulse
+#   widths
+#
+
+import numpy
+import yapp_stats as stats
+
+# minimum number of independent boxcar sums needed to measure the noise of a
+#   width, below which white noise is assumed
+MIN_NOISE_SAMPS = 16
+
+#
+# get a ladder of boxcar widths
+#
+def GetWidths(MaxWidth):
+    """Return the widths 1, 2, 4, ..., up to and including MaxWidth, in
+    samples. MaxWidth is included even if it is not a power of 2."""
+    if (MaxWidth < 1):
+        raise ValueError("Maximum boxcar width must be at least 1")
+    Widths = [1]
+    while (Widths[-1] * 2 <= MaxWidth):
+        Widths.append(Widths[-1] * 2)
+    if (Widths[-1] != MaxWidth):
+        Widths.append(MaxWidth)
+    return numpy.array(Widths)
+
+#
+# estimate the noise in boxcar sums
+#
+def _GetBoxcarStats(Sums, Width):
+    """Return the median and the MAD-based standard deviation of each row of
+    Sums, as yapp_stats.CalcRobustStats(), using every Width-th sum so that
+    the sums used do not overlap."""
+    Indep = Sums[:, ::Width]
+    if (Indep.shape[1] < MIN_NOISE_SAMPS):
+        # for unit-variance white noise
+        return (numpy.zeros(len(Sums)), numpy.ones(len(Sums))
+                * numpy.sqrt(Width))
+    return stats.CalcRobustStats(Indep)
+
+#
+# search a block of normalised time series with boxcars of several widths
+#
+def BoxcarSearch(Block, NSamps, Widths):
+    """Block is an (NRows, NSamps + max(Widths) - 1) array of time series,
+    normalised to zero median and unit standard deviation, where the extra
+    samples at the end are the start of the next block (or zeros at the end
+    of the data). The sums of all boxcars are taken from a single cumulative
+    sum, and each width is normalised by the noise in its sums. Returns
+    (S/N, width), each of shape (NRows, NSamps), for the width that gives the
+    highest S/N for the boxcar starting at each sample."""
+    Widths = numpy.asarray(Widths)
+    (NRows, NTotal) = Block.shape
+    if (NTotal < NSamps + Widths.max() - 1):
+        raise ValueError("Block is too short for a boxcar of width %d"        \
+                         % Widths.max())
+    Cum = numpy.zeros((NRows, NTotal + 1), dtype=numpy.float64)
+    numpy.cumsum(Block, axis=1, out=Cum[:, 1:])
+
+    BestSNR = numpy.empty((NRows, NSamps), dtype=numpy.float32)
+    BestSNR.fill(-numpy.inf)
+    BestWidth = numpy.zeros((NRows, NSamps), dtype=numpy.int32)
+    for Width in Widths:
+        Sums = Cum[:, Width:Width+NSamps] - Cum[:, :NSamps]
+        (Median, Sigma) = _GetBoxcarStats(Sums, Width)
+        SNR = (Sums - Median[:, numpy.newaxis]) / Sigma[:, numpy.newaxis]
+        Better = (SNR > BestSNR)
+        BestSNR[Better] = SNR[Better]
+        BestWidth[Better] = Width
+    return (BestSNR, BestWidth)
@@ -6,10 +6,11 @@
 import sys
 import os
 import getopt
-import math
+import multiprocessing
 import numpy
-import matplotlib.pyplot as plotter
 import yapp_common as yapp
+import yapp_fluxstore as fluxstore
+import yapp_profindex as profindex
 
 # function definitions
 def PrintUsage(ProgName):
@@ -33,18 +34,100 @@ def PrintUsage(ProgName):
           "with given order"
     print "    -l  --show-legend                    ",                        \
           "Show legend"
+    print "    -B  --batch                          ",                        \
+          "Non-interactive batch mode: process\n",                            \
+          "                                         ",                        \
+          "bands in parallel and do not plot"
+    print "    -j  --jobs <n>                       ",                        \
+          "Number of worker processes in batch\n",                            \
+          "                                         ",                        \
+          "mode (default is number of CPUs)"
+    print "    -o  --output <file>                  ",                        \
+          "Write flux densities and spectral index\n",                        \
+          "                                         ",                        \
+          "to file as JSON (.json) or CSV (other),\n",                        \
+          "                                         ",                        \
+          "or to standard output as CSV (-)"
+    print "    -S  --store <file>                   ",                        \
+          "Keep per-band results in a store, and\n",                          \
+          "                                         ",                        \
+          "only calibrate new or changed bands in\n",                         \
+          "                                         ",                        \
+          "batch mode"
+    print "    -F  --frange <low>:<high>            ",                        \
+          "Only use bands with centre frequencies\n",                         \
+          "                                         ",                        \
+          "in this range, in MHz"
     return
 
+def WriteResults(FileOut, Files, f, DeltaS, SMean, DeltaSMean, specIdx,     \
+                 specIdxErr):
+    "Writes flux densities (in uJy) and the spectral index as CSV or JSON."
+    if ("-" == FileOut):
+        fdest = sys.stdout
+    else:
+        fdest = open(FileOut, "w")
+    if (".json" == os.path.splitext(FileOut)[1]):
+        import json
+        # JSON has no NaN or infinity, so these are written as null
+        ToJSON = lambda Value: float(Value) if numpy.isfinite(Value) else None
+        Bands = []
+        for i in range(len(f)):
+            Bands.append({"file": Files[i],
+                          "freq_mhz": ToJSON(f[i]),
+                          "deltas_ujy": ToJSON(DeltaS[i]),
+                          "smean_ujy": ToJSON(SMean[i]),
+                          "deltasmean_ujy": ToJSON(DeltaSMean[i])})
+        json.dump({"specidx": ToJSON(specIdx),
+                   "specidx_err": ToJSON(specIdxErr), "bands": Bands}, fdest,
+                  indent=1, sort_keys=True, allow_nan=False)
+        fdest.write("\n")
+    else:
+        fdest.write("# Spectral index = " + str("%.6f" % specIdx)
+                    + " +/- " + str("%.6f" % specIdxErr) + "\n")
+        fdest.write("file,freq_mhz,deltas_ujy,smean_ujy,deltasmean_ujy\n")
+        for i in range(len(f)):
+            fdest.write(Files[i] + ","
+                        + str("%.10g" % f[i]) + ","
+                        + str("%.3f" % DeltaS[i]) + ","
+                        + str("%.3f" % SMean[i]) + ","
+                        + str("%.3f" % DeltaSMean[i]) + "\n")
+    if (fdest != sys.stdout):
+        fdest.close()
+    return
+
+def FitSpecIdx(f, SMean, DeltaSMean):
+    """Returns the spectral index, its fit and its error, warning about bands
+    that are left out of the fit."""
+    try:
+        (specIdx, specIdxFit, specIdxErr, NExcluded)                          \
+            = yapp.CalcSpecIdxWeighted(f, SMean, DeltaSMean)
+    except ValueError, ErrMsg:
+        sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+        sys.exit(1)
+    if (NExcluded > 0):
+        sys.stderr.write("WARNING: Left out %d of %d bands with a "
+                         "non-positive mean flux density!\n"
+                         % (NExcluded, len(SMean)))
+    return (specIdx, specIdxFit, specIdxErr)
+
 # defaults
 doCal = True
 Tsys = 0.0
 showLegend = False
+batchMode = False
+NJobs = multiprocessing.cpu_count()
+Output = None
+polyOrder = 0
+FileStore = None
+FRange = None
 
 # get the command line arguments
 ProgName = sys.argv[0]
-OptsShort = "hT:G:p:n:f:b:l"
+OptsShort = "hT:G:p:n:f:b:lBj:o:S:F:"
 OptsLong = ["help", "tsys=", "gain=", "npol=", "onstart=", "onstop=",         \
-            "basefit=", "show-legend"]
+            "basefit=", "show-legend", "batch", "jobs=", "output=", "store=", \
+            "frange="]
 
 # get the arguments using the getopt module
 try:
@@ -82,6 +165,27 @@ for o, a in Opts:
     elif o in ("-l", "--show-legend"):
         showLegend = True
         optind = optind + 1
+    elif o in ("-B", "--batch"):
+        batchMode = True
+        optind = optind + 1
+    elif o in ("-j", "--jobs"):
+        NJobs = int(a)
+        optind = optind + 2
+    elif o in ("-o", "--output"):
+        Output = a
+        optind = optind + 2
+    elif o in ("-S", "--store"):
+        FileStore = a
+        optind = optind + 2
+    elif o in ("-F", "--frange"):
+        try:
+            (FLow, FHigh) = [float(Freq) for Freq in a.split(":")]
+        except ValueError:
+            sys.stderr.write("ERROR: Invalid frequency range " + a + "!\n")
+            PrintUsage(ProgName)
+            sys.exit(1)
+        FRange = (FLow, FHigh)
+        optind = optind + 2
     else:
         PrintUsage(ProgName)
         sys.exit(1)
@@ -94,96 +198,150 @@ if (1 == len(sys.argv)):
     PrintUsage(ProgName)
     sys.exit(1)
 
+if (NJobs <= 0):
+    sys.stderr.write("ERROR: Number of jobs must be positive!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
 if (0.0 == Tsys):
     doCal = False
-    print "WARNING: No Tsys given. No calibration will be performed!"
+    sys.stderr.write("WARNING: No Tsys given. No calibration will be "         \
+                     "performed!\n")
 
-NBands = len(sys.argv) - optind
-SMean = numpy.zeros(NBands)
-
-# read the centre frequencies
-Bands = []
-for fileProf in sys.argv[optind:]:
-    Bands.append([float((open(fileProf).readline())[37:-5]), fileProf])
-Bands.sort()
-
-f = numpy.zeros(NBands)
-for i in range(NBands):
-    f[i] = Bands[i][0]
+# select and sort the bands using the header index of each directory, so that
+#   only the profiles of the selected bands are read
+Bands = profindex.SelectBands(sys.argv[optind:], FRange)
+NBands = len(Bands)
+if (0 == NBands):
+    sys.stderr.write("ERROR: No bands in the given frequency range!\n")
+    sys.exit(1)
 
-# read the bandwidth and duration of observation from the first file
-hdr = open(sys.argv[optind])
-# skip centre frequency
-hdr.readline()
+# read the bandwidth and duration of observation from the first band
+hdr = Bands[0][1]
 # read the original channel bandwidth in MHz
-ChanBW = float((hdr.readline())[37:-5])
+ChanBW = hdr.ChanBW
 # read the bandwidth in MHz and convert to Hz
-BW = float((hdr.readline())[37:-5]) * 1e6
+BW = hdr.BW * 1e6
 # read duration in seconds
-tObs = float((hdr.readline())[37:-3])
-hdr.close()
-
-# count the number of header lines in the first file (assume to be the same for
-#    all files)
-HeaderLines = 0
-hdr = open(sys.argv[optind])
-for line in hdr:
-    if ("#" == line[0]):
-        HeaderLines = HeaderLines + 1
-hdr.close()
-
-NBins = len(open(sys.argv[optind]).readlines()) - HeaderLines
-x = numpy.array([float(i) / NBins for i in range(NBins)])
+tObs = hdr.tObs
+
+# assume the number of bins to be the same for all files
+NBins = hdr.NBins
 
 onBin = int(on * NBins)
 offBin = int(off * NBins)
 
+if (FileStore is not None):
+    Store = fluxstore.OpenStore(FileStore)
+    if (doCal):
+        CalKey = fluxstore.GetCalKey(Tsys, G, NPol, onBin, offBin, NBins,     \
+                                     tObs, BW, polyOrder)
+    else:
+        CalKey = fluxstore.GetCalKey(0.0, 0.0, 0, onBin, offBin, NBins,       \
+                                     tObs, BW, 0)
+
+if (batchMode):
+    # split the bands into groups that are read, calibrated, and written by
+    #   worker processes, collecting the results as each group finishes
+    Files = [band[0] for band in Bands]
+    Results = []
+    if (FileStore is not None):
+        # re-use the stored results of bands that have not changed, and
+        #   process only the rest
+        Stored = fluxstore.LookupBands(Store, Files, CalKey, doCal)
+        Results.extend(Stored.values())
+        Files = [fileProf for fileProf in Files if fileProf not in Stored]
+        sys.stderr.write("Re-using stored results for %d of %d bands.\n"      \
+                         % (len(Stored), NBands))
+    if (doCal):
+        CalParams = (Tsys, G, NPol)
+    else:
+        # a zero Tsys tells the workers not to calibrate
+        (CalParams, polyOrder) = ((0.0, 0.0, 0), 0)
+    GroupSize = max(1, min(64, len(Files) // (4 * NJobs)))
+    Tasks = [(Files[i:i+GroupSize], onBin, offBin)                            \
+             + CalParams + (tObs, NBins, BW, polyOrder)                       \
+             for i in range(0, len(Files), GroupSize)]
+    NewResults = []
+    if (NJobs > 1 and len(Tasks) > 1):
+        pool = multiprocessing.Pool(NJobs)
+        for result in pool.imap_unordered(yapp.CalProfFiles, Tasks):
+            NewResults.extend(result)
+        pool.close()
+        pool.join()
+    else:
+        for task in Tasks:
+            NewResults.extend(yapp.CalProfFiles(task))
+    if (FileStore is not None):
+        fluxstore.SaveBands(Store, NewResults, CalKey)
+    Results.extend(NewResults)
+    Results.sort(key=lambda result: result[1])
+
+    Files = [result[0] for result in Results]
+    f = numpy.array([result[1] for result in Results])
+    # convert to microJy
+    DeltaS = numpy.array([result[2] for result in Results]) * 1e6
+    SMean = numpy.array([result[3] for result in Results]) * 1e6
+    DeltaSMean = numpy.array([result[4] for result in Results]) * 1e6
+    (specIdx, _, specIdxErr) = FitSpecIdx(f, SMean, DeltaSMean)
+
+    if (Output is None):
+        Output = "-"
+    WriteResults(Output, Files, f, DeltaS, SMean, DeltaSMean, specIdx,        \
+                 specIdxErr)
+    sys.exit()
+
+# batch mode never gets here, so it does not pay for importing matplotlib
+import matplotlib.pyplot as plotter
+
+# get the centre frequencies
+Bands = [[hdr.FCentre, fileProf] for (fileProf, hdr) in Bands]
+
+f = numpy.zeros(NBands)
+for i in range(NBands):
+    f[i] = Bands[i][0]
+
+x = numpy.array([float(i) / NBins for i in range(NBins)])
+
 # create calibrated folded profile subplot
 plotter.subplot(121)
 
-# create array to hold 1-sigma error values
-DeltaS = numpy.zeros(NBands)
-DeltaSMean = numpy.zeros(NBands)
-
+# read raw profiles
+hdrs = []
+profImg = numpy.zeros((NBands, NBins))
 for i in range(NBands):
-    # read raw profile
-    prof = numpy.loadtxt(Bands[i][1], dtype=numpy.float32,                    \
-                         comments="#", delimiter="\n")
+    (hdr, prof) = yapp.ReadProf(Bands[i][1])
+    hdrs.append(hdr)
+    profImg[i] = prof
 
-    if (doCal):
-        (prof, DeltaS[i]) = yapp.DoCal(prof, onBin, offBin,                   \
-                                       Tsys, G, NPol, tObs, NBins, BW,        \
-                                       polyOrder)
+if (doCal):
+    # calibrate all bands together
+    (profImg, DeltaS) = yapp.DoCalBatch(profImg, onBin, offBin,              \
+                                        Tsys, G, NPol, tObs, NBins, BW,      \
+                                        polyOrder)
+else:
+    # read 1-sigma error in S
+    DeltaS = numpy.array([0.0 if hdr.DeltaS is None else hdr.DeltaS       \
+                          for hdr in hdrs], dtype=numpy.float64)
+
+# calculate mean flux density
+(SMean, DeltaSMean) = yapp.CalcMeanFlux(profImg, onBin, offBin, NBins, DeltaS)
 
-        # write the calibrated profiles to disk
-        # build filename
+if (FileStore is not None):
+    fluxstore.SaveBands(Store,                                                \
+                        [(Bands[i][1], f[i], float(DeltaS[i]),                \
+                          float(SMean[i]), float(DeltaSMean[i]))              \
+                         for i in range(NBands)],                             \
+                        CalKey)
+
+for i in range(NBands):
+    prof = profImg[i]
+    if (doCal):
+        # write the calibrated profiles to disk, copying the header lines from
+        #   the original file and adding the 1-sigma error in S
         fileCalProf = os.path.splitext(Bands[i][1])[0] + ".cal.ypr"
-        fsrc = open(Bands[i][1], "r")
-        fdest = open(fileCalProf, "w")
-        # copy the header lines from the original file
-        for  j in range(HeaderLines):
-            fdest.write(fsrc.readline())
-        # add the 1-sigma error in S
-        fdest.write("# Standard deviation of S           : "
-                    + str("%.3f" % (DeltaS[i] * 1e6)) + " uJy\n")
-        fsrc.close()
-        # write the calibrated profile
-        prof.tofile(fdest, "\n", "%.10f")
-        fdest.close()
-    else:
-        hdr = open(Bands[i][1])
-        for h, line in enumerate(hdr):
-            if (4 == h):
-                # read 1-sigma error in S and convert to Jy
-                DeltaS[i] = float(line[37:-5]) * 1e-6
-        hdr.close()
-
-    # calculate peak and mean flux density
-    SPeak = numpy.max(prof)
-    SMean[i] = numpy.sum(prof[onBin:offBin]) / NBins
-    lenPulse = len(prof[onBin:offBin])
-    # derived using propagation of errors
-    DeltaSMean[i] = (DeltaS[i] * numpy.sqrt(lenPulse + 2)) / NBins
+        yapp.WriteProf(fileCalProf, hdrs[i], prof, DeltaS[i])
+
     print str("%.3f" % f[i]) + " MHz: "                                       \
           + "DeltaS = " + str("%.3f" % (DeltaS[i] * 1e6)) + " uJy; "          \
           + "SMean = " + str("%.3f" % (SMean[i] * 1e6))                       \
@@ -195,7 +353,6 @@ for i in range(NBands):
     plotter.yticks(ticks, map(lambda val: "%.1f" % val, ticks * 1e3))
     plotter.xlabel("Phase")
     plotter.ylabel("Flux Density (mJy)")
-    i = i + 1
 
 if showLegend:
     plotter.legend(loc="best")
@@ -208,12 +365,12 @@ SMean = SMean * 1e6
 DeltaSMean = DeltaSMean * 1e6
 
 # do a linear fit to the log10 values to calculate the spectral index
-specIdxFit = numpy.polyfit(numpy.log10(f), numpy.log10(SMean), 1)
-specIdxLine = specIdxFit[0] * numpy.log10(f) + specIdxFit[1]
-# compute the spectral index
-specIdx = (specIdxLine[0] - specIdxLine[-1])          \
-          / (math.log10(f[0]) - math.log10(f[-1]))
-print "Spectral index = ", specIdx
+(specIdx, specIdxFit, specIdxErr) = FitSpecIdx(f, SMean, DeltaSMean)
+print "Spectral index = ", specIdx, "+/-", specIdxErr
+
+if (Output is not None):
+    WriteResults(Output, [band[1] for band in Bands], f, DeltaS * 1e6,        \
+                 SMean, DeltaSMean, specIdx, specIdxErr)
 
 plotter.errorbar(f, SMean, yerr=DeltaSMean, fmt="bo")
 # get the y-axis tick labels in non-log10
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+
+# yapp_calcstats.py
+# Calculate the global and per-channel statistics of filterbank data or time
+#   series in a single pass, and cache them next to the data file for other
+#   tools.
+#
+#   Usage: yapp_calcstats.py [options] <data-files>
+
+import sys
+import getopt
+import multiprocessing
+import yapp_stats as stats
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-files>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -c  --channels                       ",                        \
+          "Print the statistics of each channel"
+    print "    -f  --force                          ",                        \
+          "Recalculate cached statistics"
+    print "    -j  --jobs <n>                       ",                        \
+          "Number of worker processes\n",                                     \
+          "                                         ",                        \
+          "(default is number of CPUs)"
+    return
+
+def PrintStats(Labels, FileStats):
+    "Prints one line of statistics per channel."
+    Columns = (FileStats.Mean, FileStats.GetRMS(), FileStats.Min,
+               FileStats.Max, FileStats.GetMedian(), FileStats.GetMAD())
+    for (i, Label) in enumerate(Labels):
+        print "%-8s %14.6g %14.6g %14.6g %14.6g %14.6g %14.6g"                \
+              % ((Label,) + tuple([Column[i] for Column in Columns]))
+    return
+
+# defaults
+PerChan = False
+Force = False
+NJobs = multiprocessing.cpu_count()
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "hcfj:"
+OptsLong = ["help", "channels", "force", "jobs="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-c", "--channels"):
+            PerChan = True
+        elif o in ("-f", "--force"):
+            Force = True
+        elif o in ("-j", "--jobs"):
+            NJobs = int(a)
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (0 == len(Args)):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+for FileSpec in Args:
+    try:
+        if (Force):
+            FileStats = stats.CalcStats(FileSpec, NJobs)
+            stats.WriteStats(FileSpec, FileStats)
+        else:
+            FileStats = stats.GetStats(FileSpec, NJobs)
+    except (IOError, ValueError), ErrMsg:
+        sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+        sys.exit(1)
+
+    print FileSpec + ":"
+    print "%-8s %14s %14s %14s %14s %14s %14s"                                \
+          % ("# Chan", "Mean", "RMS", "Min", "Max", "Median", "MAD")
+    PrintStats(["All"], FileStats.GetGlobal())
+    if (PerChan):
+        PrintStats([str(i) for i in range(FileStats.NChans)], FileStats)
@@ -0,0 +1,162 @@
+#!/usr/bin/python
+
+# yapp_channelise.py
+# Channelise 8-bit complex dual-polarisation baseband data with a polyphase
+#   filterbank (PFB), using the coefficients written by yapp_genpfbcoeff.py,
+#   and write the total power to a SIGPROC .fil file. Blocks of many spectra
+#   are channelised at once, by several processes in parallel.
+#
+#   Usage: yapp_channelise.py [options] <data-file>
+
+import sys
+import os
+import getopt
+import multiprocessing
+import numpy
+import yapp_sigproc as sp
+import yapp_pfb as pfb
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-file>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -l  --tsamp <tsamp>                  ",                        \
+          "Sampling time in s"
+    print "    -f  --centre-freq <freq>             ",                        \
+          "Centre frequency of observing band"
+    print "    -b  --pfb                            ",                        \
+          "Do polyphase filter bank"
+    print "    -t  --ntaps <ntaps>                  ",                        \
+          "Number of taps in the PFB\n",                                      \
+          "                                         ",                        \
+          "(default is 8)"
+    print "    -n  --nfft <nfft>                    ",                        \
+          "Number of points in FFT\n",                                        \
+          "                                         ",                        \
+          "(default is 1024)"
+    print "    -c  --coeff <file>                   ",                        \
+          "PFB coefficients file\n",                                          \
+          "                                         ",                        \
+          "(default is coeff_<ntaps>_<nfft>_1.dat,\n",                        \
+          "                                         ",                        \
+          "as written by yapp_genpfbcoeff.py)"
+    print "    -a  --nacc <acc-len>                 ",                        \
+          "Number of spectra to accumulate\n",                                \
+          "                                         ",                        \
+          "(default is 1)"
+    print "    -o  --obs-site <site-name>           ",                        \
+          "Observatory name"
+    print "    -r  --pulsar <psr-name>              ",                        \
+          "Pulsar name"
+    print "    -j  --jobs <n>                       ",                        \
+          "Number of worker processes\n",                                     \
+          "                                         ",                        \
+          "(default is number of CPUs)"
+    return
+
+def PrintProgress(Done, Total):
+    "Prints the fraction of data processed."
+    sys.stdout.write("\rWrote %d of %d spectra." % (Done, Total))
+    sys.stdout.flush()
+    return
+
+# defaults
+TSamp = 0.0
+FCentre = 0.0
+DoPFB = False
+NTaps = pfb.DEF_NTAPS
+NFFT = pfb.DEF_NFFT
+FileCoeff = None
+NAcc = 1
+Site = ""
+Pulsar = ""
+NJobs = multiprocessing.cpu_count()
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "hl:f:bt:n:c:a:o:r:j:"
+OptsLong = ["help", "tsamp=", "centre-freq=", "pfb", "ntaps=", "nfft=",     \
+            "coeff=", "nacc=", "obs-site=", "pulsar=", "jobs="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-l", "--tsamp"):
+            TSamp = float(a)
+        elif o in ("-f", "--centre-freq"):
+            FCentre = float(a)
+        elif o in ("-b", "--pfb"):
+            DoPFB = True
+        elif o in ("-t", "--ntaps"):
+            NTaps = int(a)
+        elif o in ("-n", "--nfft"):
+            NFFT = int(a)
+        elif o in ("-c", "--coeff"):
+            FileCoeff = a
+            DoPFB = True
+        elif o in ("-a", "--nacc"):
+            NAcc = int(a)
+        elif o in ("-o", "--obs-site"):
+            Site = a
+        elif o in ("-r", "--pulsar"):
+            Pulsar = a
+        elif o in ("-j", "--jobs"):
+            NJobs = int(a)
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (len(Args) != 1):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (TSamp <= 0.0 or 0.0 == FCentre):
+    sys.stderr.write("ERROR: Sampling time and centre frequency must be "
+                     "given!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (NFFT < 1 or NAcc < 1 or NTaps < 1):
+    sys.stderr.write("ERROR: Invalid number of points, taps or "
+                     "accumulations!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# write to the current directory, as yapp_ft does
+FileOut = os.path.basename(Args[0]) + sp.EXT_FIL
+
+try:
+    if (DoPFB):
+        if (FileCoeff is None):
+            FileCoeff = pfb.GetCoeffFilename(NTaps, NFFT)
+        Coeff = pfb.ReadCoeff(FileCoeff, NTaps, NFFT)
+    else:
+        # a single tap of ones gives a plain FFT
+        Coeff = numpy.ones((1, NFFT), dtype=numpy.float32)
+    pfb.ChanneliseFile(Args[0], FileOut, Coeff, TSamp, FCentre, NAcc, NJobs,
+                       Site=Site, Pulsar=Pulsar, Progress=PrintProgress)
+except (IOError, ValueError), ErrMsg:
+    sys.stderr.write("\nERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+
+print "\nWrote " + FileOut + "."
+print "DONE!"
@@ -5,37 +5,527 @@
 # Common functions
 #
 
+import os
+import tempfile
 import numpy
 
+# header labels written by yapp_fold and the calibration scripts
+PROF_LABEL_FCENTRE = "Centre frequency"
+PROF_LABEL_CHANBW = "Original channel bandwidth"
+PROF_LABEL_BW = "Bandwidth"
+PROF_LABEL_TOBS = "Duration of data"
+PROF_LABEL_DELTAS = "Standard deviation of S"
+
+# cache of parsed profiles, keyed by absolute path, holding
+#   (file key, header, profile)
+_ProfCache = {}
+
 #
-# perform calibration
+# get the key of a file, which changes whenever the file is modified
 #
-def DoCal(prof, onBin, offBin, Tsys, G, NPol, tObs, NBins, BW, polyOrder):
+def GetFileKey(FileSpec):
+    "Return (mtime, size) of a file, for telling whether it has changed."
+    st = os.stat(FileSpec)
+    return (st.st_mtime, st.st_size)
+
+#
+# write a file atomically
+#
+def WriteFileAtomic(FileSpec, WriteData, Mode="w"):
+    """Call WriteData with a file object open on a temporary file in the
+    directory of FileSpec, then rename the temporary file to FileSpec, so that
+    readers never see a partially written file. The temporary file is removed
+    if anything fails."""
+    Dir = os.path.dirname(os.path.abspath(FileSpec))
+    (FDTemp, FileTemp) = tempfile.mkstemp(dir=Dir)
+    Done = False
+    try:
+        fdest = os.fdopen(FDTemp, Mode)
+        try:
+            WriteData(fdest)
+        finally:
+            fdest.close()
+        os.chmod(FileTemp, 0o644)
+        os.rename(FileTemp, FileSpec)
+        Done = True
+    finally:
+        if (not Done):
+            os.remove(FileTemp)
+    return
+
+#
+# folded profile header
+#
+class ProfHeader(object):
+    "Metadata read from the comment lines at the top of a .ypr file."
+    def __init__(self):
+        self.FCentre = 0.0      # centre frequency in MHz
+        self.ChanBW = 0.0       # original channel bandwidth in MHz
+        self.BW = 0.0           # bandwidth in MHz
+        self.tObs = 0.0         # duration of data in seconds
+        self.DeltaS = None      # 1-sigma error in S in Jy, if calibrated
+        self.NBins = 0          # number of phase bins
+        self.Lines = []         # raw header lines, including newlines
+
+#
+# parse the header lines of a profile
+#
+def ParseProfHeader(lines):
+    hdr = ProfHeader()
+    for line in lines:
+        (label, sep, value) = line[1:].partition(":")
+        if (sep != ":"):
+            continue
+        label = label.strip()
+        value = value.split()
+        if (0 == len(value)):
+            continue
+        if (PROF_LABEL_FCENTRE == label):
+            hdr.FCentre = float(value[0])
+        elif (PROF_LABEL_CHANBW == label):
+            hdr.ChanBW = float(value[0])
+        elif (PROF_LABEL_BW == label):
+            hdr.BW = float(value[0])
+        elif (PROF_LABEL_TOBS == label):
+            hdr.tObs = float(value[0])
+        elif (PROF_LABEL_DELTAS == label):
+            # convert from uJy to Jy
+            hdr.DeltaS = float(value[0]) * 1e-6
+    hdr.Lines = list(lines)
+    return hdr
+
+#
+# read a folded profile (.ypr) in a single pass
+#
+def ReadProf(fileProf, useCache=True):
+    """Read a .ypr file and return (header, profile), where profile is a
+    read-only float32 array. Results are cached per process and re-used as
+    long as the file's mtime and size are unchanged. If useCache is False,
+    the file is read without adding it to the cache, as when reading many
+    files once each."""
+    key = os.path.abspath(fileProf)
+    fileKey = GetFileKey(key)
+    cached = _ProfCache.get(key)
+    if (cached is not None and cached[0] == fileKey):
+        return (cached[1], cached[2])
+
+    f = open(key, "r")
+    text = f.read()
+    f.close()
+
+    # the header is the block of comment lines at the top of the file
+    lines = []
+    start = 0
+    while (text.startswith("#", start)):
+        end = text.find("\n", start)
+        if (-1 == end):
+            end = len(text) - 1
+        lines.append(text[start:end+1])
+        start = end + 1
+
+    hdr = ParseProfHeader(lines)
+    # the separator " " matches any run of whitespace, including newlines
+    prof = numpy.fromstring(text[start:], dtype=numpy.float32, sep=" ")
+    prof.flags.writeable = False
+    hdr.NBins = len(prof)
+
+    if (useCache):
+        _ProfCache[key] = (fileKey, hdr, prof)
+    return (hdr, prof)
+
+#
+# read the header of a folded profile (.ypr), without parsing the profile
+#
+def ReadProfHeader(fileProf):
+    """Read the header lines of a .ypr file. The profile values are counted
+    to set NBins, but not converted."""
+    f = open(fileProf, "r")
+    lines = []
+    line = f.readline()
+    while (line.startswith("#")):
+        lines.append(line)
+        line = f.readline()
+    NBins = len(line.split()) + len(f.read().split())
+    f.close()
+    hdr = ParseProfHeader(lines)
+    hdr.NBins = NBins
+    return hdr
+
+#
+# write a folded profile (.ypr)
+#
+def WriteProf(fileProf, hdr, prof, DeltaS=None):
+    """Write a profile with the header lines from hdr. If DeltaS (in Jy) is
+    given, it replaces any existing standard deviation line."""
+    fdest = open(fileProf, "w")
+    for line in hdr.Lines:
+        if (DeltaS is not None                                                \
+            and line[1:].split(":")[0].strip() == PROF_LABEL_DELTAS):
+            continue
+        fdest.write(line)
+    if (DeltaS is not None):
+        # add the 1-sigma error in S
+        fdest.write("# Standard deviation of S           : "
+                    + str("%.3f" % (DeltaS * 1e6)) + " uJy\n")
+    prof.tofile(fdest, "\n", "%.10f")
+    fdest.close()
+    _ProfCache.pop(os.path.abspath(fileProf), None)
+    return
+
+#
+# build a header in the format written by yapp_fold
+#
+def MakeProfHeader(FCentre, ChanBW, BW, tObs, DeltaS=None):
+    lines = ["# Centre frequency                  : %.10g MHz\n" % FCentre,
+             "# Original channel bandwidth        : %.10g MHz\n" % ChanBW,
+             "# Bandwidth                         : %.10g MHz\n" % BW,
+             "# Duration of data                  : %g s\n" % tObs]
+    if (DeltaS is not None):
+        lines.append("# Standard deviation of S           : "
+                     + str("%.3f" % (DeltaS * 1e6)) + " uJy\n")
+    return ParseProfHeader(lines)
+
+#
+# binary profile stack (.yps)
+#
+# A profile stack is a fixed header, followed by one metadata record per band,
+# followed by a contiguous little-endian float32 array of shape
+# (NBands, NBins), so that the profiles can be memory-mapped in one go.
+#
+EXT_PROFSTACK = ".yps"
+PROFSTACK_MAGIC = b"YAPPPROF"
+PROFSTACK_VERSION = 1
+ProfStackHeaderType = numpy.dtype([("Magic", "S8"),
+                                   ("Version", "<i4"),
+                                   ("NBands", "<i4"),
+                                   ("NBins", "<i4"),
+                                   ("Reserved", "<i4")])
+# frequencies and bandwidths in MHz, tObs in s, DeltaS in Jy (NaN if the band
+#   is not calibrated)
+ProfStackBandType = numpy.dtype([("FCentre", "<f8"),
+                                 ("ChanBW", "<f8"),
+                                 ("BW", "<f8"),
+                                 ("tObs", "<f8"),
+                                 ("DeltaS", "<f8")])
+
+#
+# write a profile stack
+#
+def WriteProfStack(fileStack, hdrs, profs):
+    profs = numpy.asarray(profs, dtype="<f4")
+    (NBands, NBins) = profs.shape
+    if (len(hdrs) != NBands):
+        raise ValueError("Number of headers (%d) does not match number of "  \
+                         "bands (%d)" % (len(hdrs), NBands))
+
+    header = numpy.zeros(1, dtype=ProfStackHeaderType)
+    header["Magic"] = PROFSTACK_MAGIC
+    header["Version"] = PROFSTACK_VERSION
+    header["NBands"] = NBands
+    header["NBins"] = NBins
+
+    bands = numpy.zeros(NBands, dtype=ProfStackBandType)
+    for i, hdr in enumerate(hdrs):
+        bands[i] = (hdr.FCentre, hdr.ChanBW, hdr.BW, hdr.tObs,               \
+                    numpy.nan if hdr.DeltaS is None else hdr.DeltaS)
+
+    fdest = open(fileStack, "wb")
+    header.tofile(fdest)
+    bands.tofile(fdest)
+    profs.tofile(fdest)
+    fdest.close()
+    return
+
+#
+# read a profile stack
+#
+def ReadProfStack(fileStack):
+    """Return (headers, profiles) for a .yps file, where profiles is a
+    read-only numpy.memmap of shape (NBands, NBins)."""
+    fsrc = open(fileStack, "rb")
+    header = numpy.fromfile(fsrc, dtype=ProfStackHeaderType, count=1)
+    if (len(header) != 1 or header["Magic"][0] != PROFSTACK_MAGIC):
+        fsrc.close()
+        raise ValueError("%s is not a YAPP profile stack" % fileStack)
+    if (header["Version"][0] != PROFSTACK_VERSION):
+        fsrc.close()
+        raise ValueError("Unsupported profile stack version %d"              \
+                         % header["Version"][0])
+    NBands = int(header["NBands"][0])
+    NBins = int(header["NBins"][0])
+    bands = numpy.fromfile(fsrc, dtype=ProfStackBandType, count=NBands)
+    fsrc.close()
+
+    hdrs = []
+    for band in bands:
+        DeltaS = float(band["DeltaS"])
+        hdr = MakeProfHeader(float(band["FCentre"]), float(band["ChanBW"]),   \
+                             float(band["BW"]), float(band["tObs"]),          \
+                             None if numpy.isnan(DeltaS) else DeltaS)
+        hdr.NBins = NBins
+        hdrs.append(hdr)
+
+    offset = ProfStackHeaderType.itemsize + NBands * ProfStackBandType.itemsize
+    profs = numpy.memmap(fileStack, dtype="<f4", mode="r", offset=offset,    \
+                         shape=(NBands, NBins))
+    return (hdrs, profs)
+
+#
+# pack .ypr files into a profile stack, sorted by centre frequency
+#
+def ImportProfs(filesProf, fileStack):
+    Bands = []
+    for fileProf in filesProf:
+        (hdr, prof) = ReadProf(fileProf)
+        Bands.append((hdr.FCentre, hdr, prof))
+    Bands.sort(key=lambda band: band[0])
+    NBins = Bands[0][1].NBins
+    for band in Bands:
+        if (band[1].NBins != NBins):
+            raise ValueError("All profiles must have the same number of bins")
+    WriteProfStack(fileStack,
+                   [band[1] for band in Bands],
+                   numpy.array([band[2] for band in Bands]))
+    return len(Bands)
+
+#
+# unpack a profile stack into .ypr files named <base>.band<i>.ypr
+#
+def ExportProfs(fileStack, base=None):
+    if (base is None):
+        base = os.path.splitext(fileStack)[0]
+    (hdrs, profs) = ReadProfStack(fileStack)
+    width = len(str(len(hdrs) - 1))
+    filesProf = []
+    for i, hdr in enumerate(hdrs):
+        fileProf = base + ".band" + str(i).zfill(width) + ".ypr"
+        WriteProf(fileProf, hdr, profs[i])
+        filesProf.append(fileProf)
+    return filesProf
+
+# cache of (Vandermonde matrix, pseudo-inverse) pairs used for baseline fitting,
+#   keyed by (NBins, polyOrder)
+_VanderCache = {}
+
+#
+# get the Vandermonde matrix for phase bins, and its pseudo-inverse
+#
+def GetVander(NBins, polyOrder):
+    key = (NBins, polyOrder)
+    if key not in _VanderCache:
+        x = numpy.arange(NBins) / float(NBins)
+        V = numpy.vander(x, polyOrder + 1)
+        _VanderCache[key] = (V, numpy.linalg.pinv(V))
+    return _VanderCache[key]
+
+#
+# perform calibration of multiple profiles at once
+#
+def DoCalBatch(profs, onBin, offBin, Tsys, G, NPol, tObs, NBins, BW,          \
+               polyOrder):
+    """Calibrate an (NBands, NBins) array of profiles. tObs and BW may be
+    scalars or per-band arrays. Returns the calibrated profiles and the
+    per-band 1-sigma error in S."""
+    profs = numpy.atleast_2d(numpy.asarray(profs, dtype=numpy.float64))
+
     # extract the off-pulse regions
-    baseline = prof.copy()
-    baseline[onBin:offBin] = numpy.median(prof)
+    baseline = profs.copy()
+    baseline[:, onBin:offBin] = numpy.median(profs, axis=1)[:, numpy.newaxis]
 
-    x = numpy.array([float(i) / NBins for i in range(NBins)])
-    y = numpy.zeros(NBins)
     if (polyOrder != 0.0):  # do polynomial fitting
-        fit = numpy.polyfit(x, baseline, polyOrder)
-        for i in range(polyOrder + 1):
-            y = y + fit[i] * x**(polyOrder - i)
+        # fit the baselines of all bands with a single least-squares solve
+        (V, VInv) = GetVander(NBins, polyOrder)
+        y = numpy.dot(numpy.dot(baseline, VInv.T), V.T)
     else:                   # just calculate the median
-        y = numpy.median(baseline)
+        y = numpy.median(baseline, axis=1)[:, numpy.newaxis]
 
     # calculate the RMS of the off-pulse region
     baseline = baseline - y
-    offRMS = numpy.std(baseline)
+    offRMS = numpy.std(baseline, axis=1)
 
     # compute the calibration factor using eq. (7.12), Lorimer & Kramer
     C = Tsys / (offRMS * G * numpy.sqrt(NPol * (tObs / NBins) * BW))
     DeltaS = C * offRMS
 
-    # calibrate the profile
+    # calibrate the profiles
     # NOTE: instead of subtracting the mean, we subtract either a baseline or
     #       the median
-    prof = (prof - y) * C
+    profs = (profs - y) * C[:, numpy.newaxis]
+
+    return (profs, DeltaS)
+
+#
+# perform calibration
+#
+def DoCal(prof, onBin, offBin, Tsys, G, NPol, tObs, NBins, BW, polyOrder):
+    (profs, DeltaS) = DoCalBatch(prof[numpy.newaxis], onBin, offBin,          \
+                                 Tsys, G, NPol, tObs, NBins, BW, polyOrder)
+    return (profs[0], DeltaS[0])
+
+#
+# calculate the mean flux density of calibrated profiles
+#
+def CalcMeanFlux(profs, onBin, offBin, NBins, DeltaS):
+    """Return (SMean, DeltaSMean) for an (NBands, NBins) array of calibrated
+    profiles and the per-band 1-sigma error in S."""
+    profs = numpy.atleast_2d(profs)
+    SMean = numpy.sum(profs[:, onBin:offBin], axis=1) / NBins
+    lenPulse = profs[:, onBin:offBin].shape[1]
+    # derived using propagation of errors
+    DeltaSMean = (DeltaS * numpy.sqrt(lenPulse + 2)) / NBins
+    return (SMean, DeltaSMean)
+
+#
+# calibrate .ypr files and write the calibrated profiles
+#
+def CalProfFiles(args):
+    """Calibrate a group of .ypr files together, writing each calibrated
+    profile to <name>.cal.ypr. Meant to be mapped over a process pool, so all
+    parameters are passed as one tuple:
+    (filesProf, onBin, offBin, Tsys, G, NPol, tObs, NBins, BW, polyOrder).
+    If Tsys is 0, the profiles are assumed to be calibrated already. Returns a
+    list of (fileProf, FCentre, DeltaS, SMean, DeltaSMean) in Jy."""
+    (filesProf, onBin, offBin, Tsys, G, NPol, tObs, NBins, BW, polyOrder)    \
+        = args
+    hdrs = []
+    profs = numpy.zeros((len(filesProf), NBins))
+    for i, fileProf in enumerate(filesProf):
+        (hdr, prof) = ReadProf(fileProf)
+        hdrs.append(hdr)
+        profs[i] = prof
+
+    if (Tsys != 0.0):
+        (profs, DeltaS) = DoCalBatch(profs, onBin, offBin,                    \
+                                     Tsys, G, NPol, tObs, NBins, BW,          \
+                                     polyOrder)
+        for i, fileProf in enumerate(filesProf):
+            fileCalProf = os.path.splitext(fileProf)[0] + ".cal.ypr"
+            WriteProf(fileCalProf, hdrs[i], profs[i], DeltaS[i])
+    else:
+        # profiles that are not calibrated have no error in S
+        DeltaS = numpy.array([0.0 if hdr.DeltaS is None else hdr.DeltaS     \
+                              for hdr in hdrs], dtype=numpy.float64)
 
-    return (prof, DeltaS)
+    (SMean, DeltaSMean) = CalcMeanFlux(profs, onBin, offBin, NBins, DeltaS)
+    return [(filesProf[i], hdrs[i].FCentre, float(DeltaS[i]),                \
+             float(SMean[i]), float(DeltaSMean[i]))                          \
+            for i in range(len(filesProf))]
 
+#
+# add profiles from two polarisations, for many pairs of files
+#
+def AddPolProfFiles(pairs, pool=None, chunkSize=1024):
+    """Sum the profiles of each (filePol0, filePol1) pair and write the sum to
+    <filePol0 without extension>.sum.ypr, with the header lines of filePol0.
+    If both profiles are calibrated, the 1-sigma error in S of the sum is
+    written too, assuming that the two polarisations are independent. Pairs
+    are read, summed as stacked arrays, and written chunkSize at a time; if
+    pool (e.g., a multiprocessing.pool.ThreadPool) is given, the files of a
+    chunk are read and written concurrently. The profiles are not kept in the
+    cache of ReadProf(). A pair that cannot be read or written, or whose
+    profiles have different numbers of bins, is skipped. Returns (output file
+    names, skipped), where skipped is a list of (pair, error message)."""
+    if (pool is None):
+        mapper = map
+    else:
+        mapper = pool.map
+    filesSum = []
+    skipped = []
+    for start in range(0, len(pairs), chunkSize):
+        chunk = pairs[start:start+chunkSize]
+        profs = mapper(_ReadPairTask, chunk)
+        pol0 = [prof[0] for prof in profs]
+        pol1 = [prof[1] for prof in profs]
+        # stack the pairs with the same number of bins together
+        groups = {}
+        for i in range(len(chunk)):
+            if (profs[i][2] is not None):
+                skipped.append((chunk[i], profs[i][2]))
+                continue
+            groups.setdefault(pol0[i][0].NBins, []).append(i)
+        tasks = []
+        for idx in groups.values():
+            profSum = numpy.array([pol0[i][1] for i in idx])                 \
+                      + numpy.array([pol1[i][1] for i in idx])
+            DeltaS0 = numpy.array([numpy.nan if pol0[i][0].DeltaS is None    \
+                                   else pol0[i][0].DeltaS for i in idx])
+            DeltaS1 = numpy.array([numpy.nan if pol1[i][0].DeltaS is None    \
+                                   else pol1[i][0].DeltaS for i in idx])
+            # standard deviation of the sum (the covariance is 0); NaN if
+            #   either polarisation is not calibrated
+            DeltaS = numpy.sqrt((DeltaS0 * DeltaS0) + (DeltaS1 * DeltaS1))
+            for (j, i) in enumerate(idx):
+                fileSum = os.path.splitext(chunk[i][0])[0] + ".sum.ypr"
+                tasks.append((chunk[i], fileSum, pol0[i][0], profSum[j],      \
+                              None if numpy.isnan(DeltaS[j])                 \
+                              else float(DeltaS[j])))
+        for (task, errMsg) in zip(tasks, mapper(_WriteProfTask, tasks)):
+            if (errMsg is None):
+                filesSum.append(task[1])
+            else:
+                skipped.append((task[0], errMsg))
+    return (filesSum, skipped)
+
+def _ReadPairTask(pair):
+    try:
+        prof0 = ReadProf(pair[0], False)
+        prof1 = ReadProf(pair[1], False)
+    except (IOError, OSError, ValueError), errMsg:
+        return (None, None, str(errMsg))
+    if (prof0[0].NBins != prof1[0].NBins):
+        return (None, None,
+                "%s and %s have different numbers of bins" % tuple(pair))
+    return (prof0, prof1, None)
+
+def _WriteProfTask(task):
+    try:
+        WriteProf(*task[1:])
+    except (IOError, OSError), errMsg:
+        return str(errMsg)
+    return None
+
+#
+# fit a power law to mean flux density versus frequency
+#
+def CalcSpecIdx(f, SMean):
+    """Return (specIdx, fit), where fit is the linear fit to log10(SMean)
+    versus log10(f). SMean must be positive."""
+    fit = numpy.polyfit(numpy.log10(f), numpy.log10(SMean), 1)
+    return (fit[0], fit)
+
+#
+# fit a power law to mean flux density versus frequency, weighted by the
+#   errors in the mean flux density
+#
+def CalcSpecIdxWeighted(f, SMean, DeltaSMean):
+    """Return (specIdx, fit, specIdxErr, NExcluded), where fit is the
+    weighted linear fit to log10(SMean) versus log10(f), specIdxErr is the
+    1-sigma error in the spectral index, and NExcluded is the number of bands
+    left out for having a non-positive SMean. Each band is weighted by the
+    inverse variance of log10(SMean). If any error is missing or zero, the
+    fit is unweighted and specIdxErr is NaN. Raises ValueError if fewer than
+    2 bands are left."""
+    (f, SMean, DeltaSMean) = [numpy.asarray(a, dtype=numpy.float64)         \
+                              for a in (f, SMean, DeltaSMean)]
+    Good = (SMean > 0.0)
+    NExcluded = len(SMean) - numpy.count_nonzero(Good)
+    if (len(SMean) - NExcluded < 2):
+        raise ValueError("Need at least 2 bands with a positive mean flux "
+                         "density, but %d of %d bands are not positive"
+                         % (NExcluded, len(SMean)))
+    x = numpy.log10(f[Good])
+    y = numpy.log10(SMean[Good])
+    # propagate the error in SMean to log10(SMean)
+    SigmaY = DeltaSMean[Good] / (SMean[Good] * numpy.log(10))
+    if (not numpy.all(numpy.isfinite(SigmaY)) or numpy.any(SigmaY <= 0.0)):
+        fit = numpy.polyfit(x, y, 1)
+        return (fit[0], fit, numpy.nan, NExcluded)
+    # solve the normal equations from the weighted sums
+    w = 1.0 / (SigmaY * SigmaY)
+    (Sw, Sx, Sy, Sxx, Sxy) = (w.sum(), (w * x).sum(), (w * y).sum(),         \
+                              (w * x * x).sum(), (w * x * y).sum())
+    Delta = (Sw * Sxx) - (Sx * Sx)
+    Slope = ((Sw * Sxy) - (Sx * Sy)) / Delta
+    Intercept = ((Sxx * Sy) - (Sx * Sxy)) / Delta
+    return (Slope, numpy.array([Slope, Intercept]), numpy.sqrt(Sw / Delta),
+            NExcluded)
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+
+# yapp_convprof.py
+# Convert between ASCII folded profiles (.ypr) and binary profile stacks
+#   (.yps). Multiple .ypr files are packed into one .yps file, sorted by centre
+#   frequency, and a .yps file is unpacked into one .ypr file per band.
+
+import sys
+import os
+import getopt
+import yapp_common as yapp
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-files>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -o  --output <name>                  ",                        \
+          "Output .yps file when packing, or base\n",                         \
+          "                                         ",                        \
+          "name of output .ypr files when unpacking"
+    return
+
+# defaults
+Output = None
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "ho:"
+OptsLong = ["help", "output="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+for o, a in Opts:
+    if o in ("-h", "--help"):
+        PrintUsage(ProgName)
+        sys.exit()
+    elif o in ("-o", "--output"):
+        Output = a
+    else:
+        PrintUsage(ProgName)
+        sys.exit(1)
+
+# user input validation
+if (0 == len(Args)):
+    ErrMsg = "No input given"
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    # print usage information and exit
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (yapp.EXT_PROFSTACK == os.path.splitext(Args[0])[1]):
+    # unpack each profile stack
+    if (Output is not None and len(Args) > 1):
+        ErrMsg = "Output base name can only be given with a single stack"
+        sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+        sys.exit(1)
+    for fileStack in Args:
+        filesProf = yapp.ExportProfs(fileStack, Output)
+        print "Wrote " + str(len(filesProf)) + " profiles from " + fileStack
+else:
+    # pack all profiles into one stack
+    if (Output is None):
+        Output = os.path.splitext(Args[0])[0] + yapp.EXT_PROFSTACK
+    NBands = yapp.ImportProfs(Args, Output)
+    print "Wrote " + str(NBands) + " profiles to " + Output
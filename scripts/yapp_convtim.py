@@ -0,0 +1,148 @@
+#!/usr/bin/python
+
+# yapp_convtim.py
+# Convert between SIGPROC .tim and PRESTO .dat time series, and optionally
+#   split them into time sections, rewriting only the headers. The samples are
+#   copied within the kernel where possible, or hard-linked when a .dat file is
+#   re-used as a whole.
+#
+#   Usage: yapp_convtim.py [options] <data-files>
+
+import sys
+import os
+import getopt
+import yapp_sigproc as sp
+import yapp_presto as presto
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-files>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -f  --format <tim|dat>               ",                        \
+          "Output format\n",                                                  \
+          "                                         ",                        \
+          "(default is .dat for .tim input, and\n",                           \
+          "                                         ",                        \
+          ".tim for .dat input)"
+    print "    -t  --time <time>                    ",                        \
+          "Split into time sections of this\n",                               \
+          "                                         ",                        \
+          "duration in minutes, rounded up to a\n",                           \
+          "                                         ",                        \
+          "power of 2 samples, as yapp_split does"
+    print "    -n  --nsamp <samples>                ",                        \
+          "Split into time sections of this many\n",                          \
+          "                                         ",                        \
+          "samples"
+    print "    -o  --outdir <dir>                   ",                        \
+          "Output directory\n",                                               \
+          "                                         ",                        \
+          "(default is the current directory)"
+    return
+
+def GetNextPowerOf2(Val):
+    "Returns the smallest power of 2 that is not less than Val."
+    Power = 1
+    while (Power < Val):
+        Power = Power * 2
+    return Power
+
+# defaults
+Format = None
+SplitTime = None
+SampsPerSect = None
+OutDir = ""
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "hf:t:n:o:"
+OptsLong = ["help", "format=", "time=", "nsamp=", "outdir="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-f", "--format"):
+            Format = "." + a.lstrip(".")
+            if (Format not in (sp.EXT_TIM, presto.EXT_DAT)):
+                raise ValueError("Invalid output format " + a)
+        elif o in ("-t", "--time"):
+            SplitTime = float(a)
+        elif o in ("-n", "--nsamp"):
+            SampsPerSect = int(a)
+        elif o in ("-o", "--outdir"):
+            OutDir = a
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (0 == len(Args)):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if ((SplitTime is not None and SplitTime <= 0.0)                              \
+    or (SampsPerSect is not None and SampsPerSect <= 0)):
+    sys.stderr.write("ERROR: Duration of time sections must be positive!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+for FileSpec in Args:
+    Ext = os.path.splitext(FileSpec)[1]
+    if (Ext not in (sp.EXT_TIM, presto.EXT_DAT)):
+        sys.stderr.write("ERROR: Invalid file type of " + FileSpec + "!\n")
+        sys.exit(1)
+    if (Format is not None):
+        ExtOut = Format
+    elif (sp.EXT_TIM == Ext):
+        ExtOut = presto.EXT_DAT
+    else:
+        ExtOut = sp.EXT_TIM
+
+    try:
+        hdr = presto.ReadSeriesHeader(FileSpec)
+        if (SplitTime is not None):
+            # NOTE: SplitTime is in minutes and TSamp is in seconds
+            NSamps = GetNextPowerOf2(int(round((SplitTime * 60)
+                                               / hdr.TSamp)))
+            print "Updating requested time duration %g min. to %g min."       \
+                  % (SplitTime, (NSamps * hdr.TSamp) / 60)
+        elif (SampsPerSect is not None):
+            NSamps = SampsPerSect
+        else:
+            NSamps = hdr.NTimeSamps
+
+        Sects = presto.GetSections(hdr, NSamps)
+        for (i, (Start, NSampsSect)) in enumerate(Sects):
+            if (1 == len(Sects) and NSampsSect == hdr.NTimeSamps):
+                FileOut = presto.GetSeriesFilename(FileSpec, ExtOut,
+                                                   OutDir=OutDir)
+            else:
+                FileOut = presto.GetSeriesFilename(FileSpec, ExtOut, i,
+                                                   OutDir)
+            hdrOut = presto.GetSectionHeader(hdr, Start, NSampsSect)
+            presto.WriteSeries(FileOut, hdrOut, FileSpec, hdr, Start,
+                               NSampsSect)
+            print "Wrote " + FileOut + "."
+    except (IOError, OSError, ValueError), ErrMsg:
+        sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+        sys.exit(1)
+
+print "DONE!"
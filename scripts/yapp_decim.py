@@ -0,0 +1,215 @@
+#!/usr/bin/python
+
+#
+# yapp_decim.py
+# Decimation functions, for averaging filterbank data and time series over
+#   boxcar windows in time and frequency, one block at a time
+#
+
+import os
+import copy
+import numpy
+import yapp_sigproc as sp
+import yapp_stats as stats
+
+INFIX_DECIMATE = "dec"
+INFIX_DECIMATE_FREQ = "f"
+INFIX_DECIMATE_TIME = "t"
+INFIX_DECIMATE_BITS = "b"
+
+# number of time samples read in one block
+DEF_SIZE_BLOCK = 65536
+
+# types of the requantised samples, as written by YAPP_Float2Byte() and
+#   YAPP_Float2Short()
+OUT_SAMP_TYPES = {8: numpy.dtype(numpy.uint8),
+                  16: numpy.dtype("<u2"),
+                  32: numpy.dtype("<f4")}
+
+#
+# requantise floating-point samples
+#
+def Requantise(Data, NBits, Min, Max):
+    """Return Data as samples of NBits bits. As in YAPP_Float2Byte() and
+    YAPP_Float2Short(), the range Min to Max is mapped to the full range of
+    the integer type, with rounding. Samples outside the range are clipped.
+    32-bit samples are returned as float32, without scaling."""
+    if (NBits not in OUT_SAMP_TYPES):
+        raise ValueError("Unsupported number of output bits %d" % NBits)
+    if (32 == NBits):
+        return numpy.asarray(Data, dtype=numpy.float32)
+    IntMax = float((1 << NBits) - 1)
+    Range = float(Max - Min)
+    if (Range <= 0.0):
+        Range = 1.0
+    Out = (numpy.asarray(Data, dtype=numpy.float32) - numpy.float32(Min))    \
+          * numpy.float32(IntMax / Range)
+    numpy.clip(Out, 0.0, IntMax, out=Out)
+    numpy.rint(Out, out=Out)
+    return Out.astype(OUT_SAMP_TYPES[NBits])
+
+#
+# get the range of the samples of a file
+#
+def GetDataRange(FileSpec, hdr, NBits=8):
+    """Return (Min, Max) for requantising averages of the data. For integer
+    samples, this is the range of the sample type, so that averages keep their
+    scale; for floating-point samples requantised to NBits < 32 bits, it is
+    the minimum and maximum of the data, as YAPP_CalcStats() calculates,
+    taken from the statistics cached by yapp_stats if they are up to
+    date."""
+    if (hdr.NBits < 32):
+        return (0.0, float((1 << hdr.NBits) - 1))
+    if (32 == NBits):
+        # floating-point output is not scaled
+        return (0.0, 1.0)
+    Global = stats.GetStats(FileSpec).GetGlobal()
+    return (float(Global.Min[0]), float(Global.Max[0]))
+
+#
+# block-wise boxcar averaging
+#
+class Decimator(object):
+    """Averages (time sample, channel) blocks over windows of TFactor time
+    samples by CFactor channels, with a single reshape and sum per block. The
+    time samples that do not fill a window at the end of a block are kept
+    and completed with the start of the next block, so a file decimates
+    exactly the same whatever its length and the block size. As with
+    yapp_decimate, channels that do not fill a window are dropped from the
+    end of the band, in file order, as is an incomplete window at the end of
+    the data."""
+    def __init__(self, NChans, TFactor, CFactor=1):
+        if (TFactor < 1 or CFactor < 1):
+            raise ValueError("Decimation factors must be at least 1")
+        if (CFactor > NChans):
+            raise ValueError("Cannot decimate %d channels by %d"              \
+                             % (NChans, CFactor))
+        self.NChans = NChans
+        self.TFactor = TFactor
+        self.CFactor = CFactor
+        self.NOutChans = NChans // CFactor
+        self.NUsedChans = self.NOutChans * CFactor
+        self.Scale = numpy.float32(1.0 / (TFactor * CFactor))
+        self.Tail = numpy.empty((TFactor, self.NUsedChans),
+                                dtype=numpy.float32)
+        self.NTail = 0
+
+    def _Average(self, Block):
+        NOut = len(Block) // self.TFactor
+        Sums = Block.reshape(NOut, self.TFactor, self.NOutChans,
+                             self.CFactor).sum(axis=(1, 3),
+                                               dtype=numpy.float32)
+        Sums *= self.Scale
+        return Sums
+
+    def Process(self, Block):
+        """Return the averages of the windows completed by Block, a
+        (time sample, channel) array or memory map, as a float32 array of
+        shape (time sample, NOutChans)."""
+        Block = Block[:, :self.NUsedChans]
+        Outs = []
+        Start = 0
+        if (self.NTail > 0):
+            # complete the window carried over from the previous block
+            Start = min(self.TFactor - self.NTail, len(Block))
+            self.Tail[self.NTail:self.NTail+Start] = Block[:Start]
+            self.NTail = self.NTail + Start
+            if (self.NTail < self.TFactor):
+                return numpy.empty((0, self.NOutChans), dtype=numpy.float32)
+            Outs.append(self._Average(self.Tail))
+            self.NTail = 0
+        Stop = Start + (((len(Block) - Start) // self.TFactor) * self.TFactor)
+        if (Stop > Start):
+            Outs.append(self._Average(numpy.asarray(Block[Start:Stop])))
+        self.NTail = len(Block) - Stop
+        self.Tail[:self.NTail] = Block[Stop:]
+        if (1 == len(Outs)):
+            return Outs[0]
+        elif (0 == len(Outs)):
+            return numpy.empty((0, self.NOutChans), dtype=numpy.float32)
+        return numpy.concatenate(Outs)
+
+#
+# get the header of decimated data
+#
+def GetDecimHeader(hdr, TFactor, CFactor=1, NBits=None):
+    """Return a copy of hdr for the data decimated by TFactor in time and
+    CFactor in frequency, requantised to NBits bits (the input number of bits
+    if None)."""
+    hdrDec = copy.copy(hdr)
+    hdrDec.Fields = dict(hdr.Fields)
+    hdrDec.TSamp = hdr.TSamp * TFactor
+    hdrDec.NTimeSamps = hdr.NTimeSamps // TFactor
+    if (NBits is not None):
+        hdrDec.NBits = NBits
+    if (1 == CFactor):
+        return hdrDec
+    NChans = hdr.NChans // CFactor
+    hdrDec.NChans = NChans
+    hdrDec.ChanBW = hdr.ChanBW * CFactor
+    # the first output channel is centred on the first CFactor channels
+    hdrDec.FChan1 = hdr.FChan1 + (((CFactor - 1) / 2.0) * hdr.ChanBW)
+    if (hdr.Freqs is not None):
+        hdrDec.Freqs = numpy.asarray(hdr.Freqs)[:NChans*CFactor]             \
+                       .reshape(NChans, CFactor).mean(axis=1)
+    sp.SetBandFromFChan1(hdrDec)
+    return hdrDec
+
+#
+# get the name of a decimated file
+#
+def GetDecimFilename(FileSpec, hdrDec, OutDir=None):
+    """Return the name used by yapp_decimate, such as
+    data.decf64t1024b8.fil, in OutDir (the current directory if None)."""
+    (Base, Ext) = os.path.splitext(os.path.basename(FileSpec))
+    if (sp.EXT_TIM == Ext):
+        Infix = INFIX_DECIMATE + INFIX_DECIMATE_TIME + str(hdrDec.NTimeSamps)
+    else:
+        Infix = INFIX_DECIMATE + INFIX_DECIMATE_FREQ + str(hdrDec.NChans)    \
+                + INFIX_DECIMATE_TIME + str(hdrDec.NTimeSamps)
+    Infix = Infix + INFIX_DECIMATE_BITS + str(hdrDec.NBits)
+    FileDec = Base + "." + Infix + Ext
+    if (OutDir is not None):
+        FileDec = os.path.join(OutDir, FileDec)
+    return FileDec
+
+#
+# decimate a SIGPROC file
+#
+def DecimateFile(FileSpec, TFactor, CFactor=1, NBits=None, Range=None,        \
+                 FileOut=None, BlockSize=DEF_SIZE_BLOCK, Progress=None):
+    """Decimate a .fil or .tim file in one pass, writing each block as soon
+    as it is averaged and requantised. Range is the (Min, Max) mapped to the
+    full range of 8- and 16-bit output (see GetDataRange() for the default).
+    Returns the output file name."""
+    (hdr, Data) = sp.ReadSIGPROCData(FileSpec)
+    IsTim = FileSpec.endswith(sp.EXT_TIM)
+    if (NBits is None):
+        # 1-, 2- and 4-bit data is unpacked to bytes
+        NBits = max(hdr.NBits, 8)
+    if (NBits not in OUT_SAMP_TYPES):
+        raise ValueError("Unsupported number of output bits %d" % NBits)
+    if (hdr.NTimeSamps < TFactor):
+        raise ValueError("Cannot decimate %d time samples by %d"              \
+                         % (hdr.NTimeSamps, TFactor))
+    Dec = Decimator(hdr.NChans, TFactor, CFactor)
+    if (Range is None):
+        Range = GetDataRange(FileSpec, hdr, NBits)
+    hdrDec = GetDecimHeader(hdr, TFactor, CFactor, NBits)
+    if (FileOut is None):
+        FileOut = GetDecimFilename(FileSpec, hdrDec)
+
+    fdest = open(FileOut, "wb")
+    try:
+        sp.WriteSIGPROCHeader(fdest, hdrDec, IsTim)
+        # read whole windows at a time where possible
+        BlockSize = max(1, BlockSize // TFactor) * TFactor
+        for Start in range(0, hdr.NTimeSamps, BlockSize):
+            Out = Dec.Process(Data[Start:Start+BlockSize])
+            Requantise(Out, NBits, Range[0], Range[1]).tofile(fdest)
+            if (Progress is not None):
+                Progress(min(Start + BlockSize, hdr.NTimeSamps),
+                         hdr.NTimeSamps)
+    finally:
+        fdest.close()
+    return FileOut
@@ -0,0 +1,125 @@
+#!/usr/bin/python
+
+# yapp_decimate.py
+# Decimate filterbank data or time series by averaging over boxcar windows of
+#   a given number of time samples and channels, in one streaming pass.
+#
+#   Usage: yapp_decimate.py [options] <data-file>
+
+import sys
+import os
+import getopt
+import yapp_sigproc as sp
+import yapp_decim as decim
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-file>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -t  --tfactor <samples>              ",                        \
+          "Number of time samples to average\n",                              \
+          "                                         ",                        \
+          "(default is 1)"
+    print "    -f  --ffactor <channels>             ",                        \
+          "Number of channels to average\n",                                  \
+          "                                         ",                        \
+          "(default is 1)"
+    print "    -b  --out-bits <bits>                ",                        \
+          "Number of bits in output, 8, 16 or 32\n",                          \
+          "                                         ",                        \
+          "(default is same as input)"
+    print "    -r  --range <min>:<max>              ",                        \
+          "Range of input values mapped to the\n",                            \
+          "                                         ",                        \
+          "8- or 16-bit output (default is the\n",                            \
+          "                                         ",                        \
+          "range of the input sample type, or\n",                             \
+          "                                         ",                        \
+          "of the data for 32-bit input)"
+    print "    -o  --output <file>                  ",                        \
+          "Output file\n",                                                    \
+          "                                         ",                        \
+          "(default is named as by yapp_decimate,\n",                         \
+          "                                         ",                        \
+          "in the current directory)"
+    return
+
+def PrintProgress(Done, Total):
+    "Prints the fraction of data processed."
+    sys.stdout.write("\rProcessed %d of %d time samples." % (Done, Total))
+    sys.stdout.flush()
+    return
+
+# defaults
+TFactor = 1
+CFactor = 1
+NBits = None
+Range = None
+FileOut = None
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "ht:f:b:r:o:"
+OptsLong = ["help", "tfactor=", "ffactor=", "out-bits=", "range=", "output="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-t", "--tfactor"):
+            TFactor = int(a)
+        elif o in ("-f", "--ffactor"):
+            CFactor = int(a)
+        elif o in ("-b", "--out-bits"):
+            NBits = int(a)
+            if (NBits not in decim.OUT_SAMP_TYPES):
+                raise ValueError("Invalid number of output bits " + a)
+        elif o in ("-r", "--range"):
+            Range = [float(Val) for Val in a.split(":")]
+            if (len(Range) != 2 or Range[0] >= Range[1]):
+                raise ValueError("Invalid range " + a)
+        elif o in ("-o", "--output"):
+            FileOut = a
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (len(Args) != 1):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (os.path.splitext(Args[0])[1] not in (sp.EXT_FIL, sp.EXT_TIM)):
+    sys.stderr.write("ERROR: Invalid file type!\n")
+    sys.exit(1)
+
+if (Args[0].endswith(sp.EXT_TIM) and CFactor != 1):
+    sys.stderr.write("ERROR: Time series cannot be decimated in frequency!\n")
+    sys.exit(1)
+
+try:
+    FileOut = decim.DecimateFile(Args[0], TFactor, CFactor, NBits, Range,
+                                 FileOut, Progress=PrintProgress)
+except (IOError, ValueError), ErrMsg:
+    sys.stderr.write("\nERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+
+print "\nWrote " + FileOut + "."
+print "DONE!"
@@ -0,0 +1,317 @@
+#!/usr/bin/python
+
+#
+# yapp_dedisp.py
+# Dedispersion functions, for multiple DMs in one pass over a filterbank file
+#
+
+import os
+import copy
+import multiprocessing
+import time
+import numpy
+import yapp_sigproc as sp
+
+# dispersion constant, for delays in ms with frequencies in MHz
+DISP_CONST = 4.148741601e6
+DEF_LAW = 2.0
+
+# default tolerance on the dispersion smearing introduced by the choice of DM
+#   trials, in samples
+DEF_DM_TOL = 1.0
+
+INFIX_DEDISPERSE = "dm"
+
+#
+# get the centre frequency of each channel, in file order
+#
+def GetChanFreqs(hdr):
+    if (hdr.Freqs is not None):
+        return numpy.asarray(hdr.Freqs, dtype=numpy.float64)
+    Idx = numpy.arange(hdr.NChans, dtype=numpy.float64)
+    if (hdr.IsBandFlipped):
+        return hdr.FMax - (Idx * abs(hdr.ChanBW))
+    return hdr.FMin + (Idx * abs(hdr.ChanBW))
+
+# per-DM offset tables, keyed by (DM, law, sampling time, frequencies)
+_OffsetCache = {}
+
+#
+# calculate the channel offsets for a set of DMs
+#
+def CalcDelays(DMs, Freqs, TSamp, Law=DEF_LAW):
+    """Return an (NDMs, NChans) table of the number of samples by which each
+    channel is delayed with respect to the highest frequency, as calculated by
+    YAPP_CalcDelays(), for TSamp in seconds. Tables are cached per DM."""
+    DMs = numpy.atleast_1d(numpy.asarray(DMs, dtype=numpy.float64))
+    if (numpy.any(DMs < 0.0)):
+        raise ValueError("DMs must be non-negative")
+    Freqs = numpy.asarray(Freqs, dtype=numpy.float64)
+    FreqKey = (Freqs.tobytes(), float(TSamp), float(Law))
+    Missing = [DM for DM in numpy.unique(DMs)
+               if (DM, FreqKey) not in _OffsetCache]
+    if (len(Missing) > 0):
+        Dispersion = (1.0 / numpy.power(Freqs, Law))                         \
+                     - (1.0 / numpy.power(Freqs.max(), Law))
+        Delays = DISP_CONST * numpy.outer(Missing, Dispersion)  # in ms
+        Offsets = (Delays / (TSamp * 1e3)).astype(numpy.int64)
+        for (DM, DMOffsets) in zip(Missing, Offsets):
+            DMOffsets.flags.writeable = False
+            _OffsetCache[(DM, FreqKey)] = DMOffsets
+    return numpy.array([_OffsetCache[(DM, FreqKey)] for DM in DMs])
+
+#
+# dedisperse a block of data
+#
+def DedisperseBlock(Block, Offsets, NSamps):
+    """Block is an (NChans, NSamps + max. offset) array, with channels along
+    the first axis. Returns the (NDMs, NSamps) sums over channels of the
+    delayed samples, for each row of Offsets."""
+    Out = numpy.zeros((len(Offsets), NSamps), dtype=numpy.float32)
+    for (i, DMOffsets) in enumerate(Offsets):
+        # offsets change monotonically with channel number, so sum each run
+        #   of channels with the same offset in one go
+        Edges = numpy.flatnonzero(numpy.diff(DMOffsets)) + 1
+        Starts = numpy.concatenate(([0], Edges))
+        Stops = numpy.concatenate((Edges, [len(DMOffsets)]))
+        for (Start, Stop) in zip(Starts, Stops):
+            Offset = DMOffsets[Start]
+            Out[i] += Block[Start:Stop, Offset:Offset+NSamps].sum(axis=0)
+    return Out
+
+#
+# build the name of a dedispersed time series
+#
+def GetDedispFilename(FileSpec, DM, OutDir=None):
+    (Base, Ext) = os.path.splitext(os.path.basename(FileSpec))
+    Name = Base + "." + INFIX_DEDISPERSE + ("%g" % DM) + sp.EXT_TIM
+    if (OutDir is None):
+        OutDir = os.path.dirname(FileSpec)
+    return os.path.join(OutDir, Name)
+
+#
+# build the header of a dedispersed time series
+#
+def GetDedispHeader(hdr, DM, Law=DEF_LAW):
+    """The start time is corrected to infinite frequency, as in
+    yapp_dedisperse."""
+    hdrOut = copy.copy(hdr)
+    hdrOut.NBits = 32
+    hdrOut.DM = DM
+    hdrOut.IsBandFlipped = False
+    Delay = DISP_CONST * (1.0 / (hdr.FMax ** Law)) * DM    # in ms
+    StartOffset = int(Delay / (hdr.TSamp * 1e3))
+    hdrOut.TStart = hdr.TStart - ((StartOffset * hdr.TSamp) / 86400)
+    return hdrOut
+
+#
+# sub-band (two-stage) dedispersion
+#
+def GetDMStep(Freqs, TSamp, Tol=DEF_DM_TOL, Law=DEF_LAW):
+    """Return the DM step over which the dispersion delay between the
+    extremes of Freqs changes by Tol samples."""
+    Freqs = numpy.asarray(Freqs, dtype=numpy.float64)
+    Dispersion = (1.0 / numpy.power(Freqs.min(), Law))                        \
+                 - (1.0 / numpy.power(Freqs.max(), Law))
+    return (Tol * TSamp * 1e3) / (DISP_CONST * Dispersion)
+
+def GetDMGrid(Freqs, TSamp, DMLow, DMHigh, Tol=DEF_DM_TOL, Law=DEF_LAW):
+    """Return DM trials from DMLow to at least DMHigh, spaced so that the
+    delay across the band changes by Tol samples between trials."""
+    DMStep = GetDMStep(Freqs, TSamp, Tol, Law)
+    NDMs = int(numpy.ceil(((DMHigh - DMLow) / DMStep) - 1e-6)) + 1
+    return DMLow + (numpy.arange(NDMs) * DMStep)
+
+def GetSubBandPlan(Freqs, TSamp, DMs, NSubBands, Tol=DEF_DM_TOL,          \
+                   Law=DEF_LAW):
+    """Plan two-stage dedispersion of DMs. Channels are first dedispersed
+    within each sub-band at a coarse grid of DMs, chosen so that using the
+    nearest coarse DM instead of the actual one smears no sub-band by more
+    than Tol samples. The sub-bands are then dedispersed at each DM. Returns
+    (CoarseDMs, CoarseIdx, SubOffsets, BandOffsets), where CoarseIdx maps each
+    DM to its coarse DM, SubOffsets is the (NCoarse, NChans) table of offsets
+    within sub-bands and BandOffsets the (NDMs, NSubBands) table of offsets of
+    the sub-bands."""
+    Freqs = numpy.asarray(Freqs, dtype=numpy.float64)
+    DMs = numpy.atleast_1d(numpy.asarray(DMs, dtype=numpy.float64))
+    NChans = len(Freqs)
+    if (NSubBands <= 0 or NChans % NSubBands != 0):
+        raise ValueError("Number of sub-bands must be a factor of the number "
+                         "of channels")
+    SubFreqs = Freqs.reshape(NSubBands, NChans // NSubBands)
+    # the coarse DM is at most half a step away from the actual one
+    CoarseStep = 2 * min([GetDMStep(Sub, TSamp, Tol, Law)
+                          for Sub in SubFreqs])
+    Steps = numpy.round((DMs - DMs.min()) / CoarseStep).astype(numpy.int64)
+    (Steps, CoarseIdx) = numpy.unique(Steps, return_inverse=True)
+    CoarseDMs = DMs.min() + (Steps * CoarseStep)
+    SubOffsets = numpy.hstack([CalcDelays(CoarseDMs, Sub, TSamp, Law)
+                               for Sub in SubFreqs])
+    BandOffsets = CalcDelays(DMs, SubFreqs.max(axis=1), TSamp, Law)
+    return (CoarseDMs, CoarseIdx, SubOffsets, BandOffsets)
+
+def SubBandDedisperseBlock(Block, Plan, DMIdx, NSamps):
+    """Dedisperse Block, an (NChans, NSamps + max. offset) array, at the DMs
+    with indices DMIdx in Plan, as returned by GetSubBandPlan(). The sub-band
+    sums for each coarse DM are computed once and shared by all the DMs that
+    map to it. Returns an (len(DMIdx), NSamps) array."""
+    (CoarseDMs, CoarseIdx, SubOffsets, BandOffsets) = Plan
+    NSubBands = BandOffsets.shape[1]
+    ChansPerSub = SubOffsets.shape[1] // NSubBands
+    Out = numpy.zeros((len(DMIdx), NSamps), dtype=numpy.float32)
+    DMIdx = numpy.asarray(DMIdx)
+    for c in numpy.unique(CoarseIdx[DMIdx]):
+        Fine = numpy.flatnonzero(CoarseIdx[DMIdx] == c)
+        NSubSamps = NSamps + int(BandOffsets[DMIdx[Fine]].max())
+        SubSeries = numpy.empty((NSubBands, NSubSamps), dtype=numpy.float32)
+        for b in range(NSubBands):
+            Chans = slice(b * ChansPerSub, (b + 1) * ChansPerSub)
+            SubSeries[b] = DedisperseBlock(Block[Chans],
+                                           SubOffsets[c:c+1, Chans],
+                                           NSubSamps)[0]
+        Out[Fine] = DedisperseBlock(SubSeries, BandOffsets[DMIdx[Fine]],
+                                    NSamps)
+    return Out
+
+def GetMaxSubBandOffset(Plan):
+    "Return the largest total offset of any channel in a sub-band plan."
+    (CoarseDMs, CoarseIdx, SubOffsets, BandOffsets) = Plan
+    return int((BandOffsets.max(axis=1)                                        \
+                + SubOffsets.max(axis=1)[CoarseIdx]).max())
+
+# state shared with worker processes, set up before the pool is created so
+#   that it is inherited rather than pickled
+_Shared = {}
+
+def _DedisperseGroup(Args):
+    (DMIdx, NSamps) = Args
+    Block = numpy.frombuffer(_Shared["Block"], dtype=numpy.float32)         \
+            .reshape(_Shared["Shape"])
+    if (_Shared["Plan"] is None):
+        Out = DedisperseBlock(Block, _Shared["Offsets"][DMIdx], NSamps)
+    else:
+        Out = SubBandDedisperseBlock(Block, _Shared["Plan"], DMIdx, NSamps)
+    for (i, Series) in zip(DMIdx, Out):
+        fdest = open(_Shared["Files"][i], "ab")
+        Series.tofile(fdest)
+        fdest.close()
+    return len(DMIdx)
+
+#
+# dedisperse a filterbank file at a set of DMs
+#
+def DedisperseFile(FileSpec, DMs, Law=DEF_LAW, BlockSize=16384, NJobs=1,   \
+                   OutDir=None, Progress=None, NSubBands=0,                \
+                   Tol=DEF_DM_TOL, RFIMask=None):
+    """Read the file once, in blocks of BlockSize time samples that overlap by
+    the maximum delay, and write one .tim file per DM. If NSubBands is given,
+    two-stage dedispersion is used, with a DM tolerance of Tol samples (see
+    GetSubBandPlan()). The DMs are split into NJobs groups that are
+    dedispersed in parallel. If RFIMask, from yapp_rfi, is given, it is
+    applied to each block as it is read. As with yapp_dedisperse, the last
+    maximum delay's worth of samples, which would miss the lowest channels,
+    is not written, so each series has NTimeSamps - max. offset samples.
+    Returns the output file names."""
+    (hdr, Data) = sp.ReadSIGPROCData(FileSpec)
+    if (RFIMask is not None):
+        RFIMask.Check(hdr)
+    DMs = numpy.atleast_1d(numpy.asarray(DMs, dtype=numpy.float64))
+    Freqs = GetChanFreqs(hdr)
+    if (NSubBands > 0):
+        Offsets = None
+        Plan = GetSubBandPlan(Freqs, hdr.TSamp, DMs, NSubBands, Tol, Law)
+        MaxOffset = GetMaxSubBandOffset(Plan)
+        # keep the DMs that share sub-band sums in the same group
+        CoarseGroups = numpy.array_split(numpy.arange(len(Plan[0])), NJobs)
+        Groups = [numpy.flatnonzero(numpy.in1d(Plan[1], Group))
+                  for Group in CoarseGroups]
+    else:
+        Offsets = CalcDelays(DMs, Freqs, hdr.TSamp, Law)
+        Plan = None
+        MaxOffset = int(Offsets.max())
+        Groups = numpy.array_split(numpy.arange(len(DMs)), NJobs)
+    Groups = [Group for Group in Groups if len(Group) > 0]
+    NOutSamps = hdr.NTimeSamps - MaxOffset
+    if (NOutSamps <= 0):
+        raise ValueError("Maximum delay of %d samples is not shorter than "
+                         "the data" % MaxOffset)
+
+    Files = [GetDedispFilename(FileSpec, DM, OutDir) for DM in DMs]
+    for (File, DM) in zip(Files, DMs):
+        fdest = open(File, "wb")
+        sp.WriteSIGPROCHeader(fdest, GetDedispHeader(hdr, DM, Law), True)
+        fdest.close()
+
+    Shape = (hdr.NChans, BlockSize + MaxOffset)
+    _Shared["Block"] = multiprocessing.RawArray("f", Shape[0] * Shape[1])
+    _Shared["Shape"] = Shape
+    _Shared["Offsets"] = Offsets
+    _Shared["Plan"] = Plan
+    _Shared["Files"] = Files
+    Block = numpy.frombuffer(_Shared["Block"], dtype=numpy.float32)         \
+            .reshape(Shape)
+    Pool = None
+    if (len(Groups) > 1):
+        Pool = multiprocessing.Pool(len(Groups))
+    try:
+        for Start in range(0, NOutSamps, BlockSize):
+            NSamps = min(BlockSize, NOutSamps - Start)
+            Stop = Start + NSamps + MaxOffset
+            if (RFIMask is None):
+                Block[:, :Stop-Start] = numpy.asarray(Data[Start:Stop]).T
+            else:
+                Block[:, :Stop-Start] = RFIMask.Apply(Data[Start:Stop],
+                                                      Start).T
+            Tasks = [(Group, NSamps) for Group in Groups]
+            if (Pool is None):
+                map(_DedisperseGroup, Tasks)
+            else:
+                Pool.map(_DedisperseGroup, Tasks)
+            if (Progress is not None):
+                Progress(Start + NSamps, NOutSamps)
+    finally:
+        if (Pool is not None):
+            Pool.close()
+            Pool.join()
+        _Shared.clear()
+    return Files
+
+#
+# compare the throughput of brute-force and sub-band dedispersion
+#
+def CompareThroughput(FileSpec, DMs, NSubBands, Law=DEF_LAW,                 \
+                      BlockSize=16384, Tol=DEF_DM_TOL):
+    """Dedisperse the first block of the file at DMs both ways, in a single
+    process. Returns (brute-force DM trials per second, sub-band DM trials per
+    second, brute-force peak S/N, sub-band peak S/N), where the peak S/N is
+    the largest over all DM trials."""
+    (hdr, Data) = sp.ReadSIGPROCData(FileSpec)
+    DMs = numpy.atleast_1d(numpy.asarray(DMs, dtype=numpy.float64))
+    Freqs = GetChanFreqs(hdr)
+    Offsets = CalcDelays(DMs, Freqs, hdr.TSamp, Law)
+    Plan = GetSubBandPlan(Freqs, hdr.TSamp, DMs, NSubBands, Tol, Law)
+    MaxOffset = max(int(Offsets.max()), GetMaxSubBandOffset(Plan))
+    NSamps = min(BlockSize, hdr.NTimeSamps)
+    Block = numpy.zeros((hdr.NChans, NSamps + MaxOffset), dtype=numpy.float32)
+    Stop = min(NSamps + MaxOffset, hdr.NTimeSamps)
+    Block[:, :Stop] = numpy.asarray(Data[:Stop]).T
+
+    tStart = time.time()
+    Brute = DedisperseBlock(Block, Offsets, NSamps)
+    tBrute = time.time() - tStart
+    tStart = time.time()
+    SubBand = SubBandDedisperseBlock(Block, Plan, numpy.arange(len(DMs)),
+                                     NSamps)
+    tSubBand = time.time() - tStart
+    # leave out the samples at the end that miss channels beyond the end of
+    #   the data, as they would bias the statistics
+    NValid = min(NSamps, Stop - MaxOffset)
+    if (NValid <= 0):
+        NValid = NSamps
+    return (len(DMs) / tBrute, len(DMs) / tSubBand,
+            _GetPeakSNR(Brute[:, :NValid]), _GetPeakSNR(SubBand[:, :NValid]))
+
+def _GetPeakSNR(Series):
+    RMS = Series.std(axis=1)
+    RMS[0.0 == RMS] = 1.0
+    return ((Series.max(axis=1) - Series.mean(axis=1)) / RMS).max()
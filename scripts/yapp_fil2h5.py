@@ -0,0 +1,114 @@
+#!/usr/bin/python
+
+# yapp_fil2h5.py
+# Convert a SIGPROC .fil file to HDF5, in the layout written by yapp_fil2h5,
+#   with a given chunk shape and optional lossless compression.
+#
+#   Usage: yapp_fil2h5.py [options] <data-file>
+
+import sys
+import os
+import getopt
+import yapp_sigproc as sp
+import yapp_hdf5 as hdf5
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-file>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -t  --chunktime <samples>            ",                        \
+          "Number of time samples in a chunk\n",                              \
+          "                                         ",                        \
+          "(default is 1024)"
+    print "    -c  --chunkchans <channels>          ",                        \
+          "Number of channels in a chunk\n",                                  \
+          "                                         ",                        \
+          "(default is all channels)"
+    print "    -z  --compress <method>              ",                        \
+          "Lossless compression, one of none,\n",                             \
+          "                                         ",                        \
+          "gzip, lzf, or bitshuffle (default is\n",                           \
+          "                                         ",                        \
+          "none)"
+    print "    -o  --output <file>                  ",                        \
+          "Output file\n",                                                    \
+          "                                         ",                        \
+          "(default is <base>.h5 in the current\n",                           \
+          "                                         ",                        \
+          "directory)"
+    return
+
+def PrintProgress(Done, Total):
+    "Prints the fraction of data processed."
+    sys.stdout.write("\rProcessed %d of %d time samples." % (Done, Total))
+    sys.stdout.flush()
+    return
+
+# defaults
+ChunkTime = hdf5.DEF_CHUNK_TIME
+ChunkChans = 0
+Compression = "none"
+FileH5 = None
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "ht:c:z:o:"
+OptsLong = ["help", "chunktime=", "chunkchans=", "compress=", "output="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-t", "--chunktime"):
+            ChunkTime = int(a)
+        elif o in ("-c", "--chunkchans"):
+            ChunkChans = int(a)
+        elif o in ("-z", "--compress"):
+            if (a not in hdf5.COMPRESSIONS):
+                raise ValueError("Invalid compression method " + a)
+            Compression = a
+        elif o in ("-o", "--output"):
+            FileH5 = a
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (len(Args) != 1):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (os.path.splitext(Args[0])[1] != sp.EXT_FIL):
+    sys.stderr.write("ERROR: Invalid file type!\n")
+    sys.exit(1)
+
+if (FileH5 is None):
+    FileH5 = os.path.splitext(os.path.basename(Args[0]))[0] + hdf5.EXT_HDF5
+
+try:
+    (hdr, Data) = sp.ReadSIGPROCData(Args[0])
+    hdf5.WriteHDF5(FileH5, hdr, Data, ChunkTime, ChunkChans, Compression,
+                   Progress=PrintProgress)
+except (IOError, ImportError, ValueError), ErrMsg:
+    sys.stderr.write("\nERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+
+print "\nWrote " + FileH5 + "."
+print "DONE!"
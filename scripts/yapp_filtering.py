@@ -0,0 +1,162 @@
+#!/usr/bin/python
+
+#
+# yapp_filtering.py
+# Frequency-domain filtering functions, for applying the masks used by
+#   yapp_filter to many time series at once
+#
+
+import os
+import hashlib
+import numpy
+import yapp_sigproc as sp
+
+INFIX_FILTER = "filt"
+
+# default length of the FFT used to filter a block, as a multiple of the
+#   length of the FFT the mask was made for
+DEF_BLOCK_FACTOR = 8
+
+#
+# read a filter mask
+#
+def ReadMask(FileMask, IsFloat=False):
+    """Return the (NFFT / 2) + 1 point frequency response in a mask file
+    written by yapp_genfiltermask.py, as float32. As with yapp_filter, the
+    mask is single-precision floating-point if IsFloat, and bytes
+    otherwise."""
+    if (IsFloat):
+        Mask = numpy.fromfile(FileMask, dtype=numpy.float32)
+    else:
+        Mask = numpy.fromfile(FileMask, dtype=numpy.uint8)
+    if (len(Mask) < 2):
+        raise ValueError(FileMask + " is not a filter mask")
+    return Mask.astype(numpy.float32)
+
+#
+# get the impulse response of a mask
+#
+def GetImpulseResponse(Mask):
+    """Return the NFFT-tap FIR filter whose frequency response at the NFFT
+    frequencies of the mask is exactly the mask. As the mask is real, the
+    filter is symmetric about tap NFFT / 2, which is the delay of the
+    filter."""
+    NFFT = 2 * (len(Mask) - 1)
+    return numpy.fft.fftshift(numpy.fft.irfft(Mask, NFFT))
+
+# frequency responses, keyed by (mask, FFT length)
+_ResponseCache = {}
+
+#
+# get the response of a mask for a given FFT length
+#
+def GetResponse(Mask, NBlock):
+    """Return the (NBlock / 2) + 1 point frequency response of the FIR filter
+    of a mask (see GetImpulseResponse()), for filtering blocks of NBlock
+    samples by overlap-save. Responses are cached, so each is computed once
+    per mask and block length."""
+    Mask = numpy.asarray(Mask, dtype=numpy.float32)
+    Key = (hashlib.sha1(Mask.tobytes()).hexdigest(), NBlock)
+    if (Key not in _ResponseCache):
+        Taps = GetImpulseResponse(Mask)
+        if (NBlock <= len(Taps)):
+            raise ValueError("Block length %d is too short for a %d-tap "
+                             "filter" % (NBlock, len(Taps)))
+        Response = numpy.fft.rfft(Taps, NBlock)
+        Response.flags.writeable = False
+        _ResponseCache[Key] = Response
+    return _ResponseCache[Key]
+
+#
+# filter a block of time series
+#
+def FilterBlock(Block, Response, NTaps):
+    """Block is an (NSeries, NBlock) array of time series, and Response is
+    from GetResponse(). All series are transformed together, in one batched
+    real FFT and inverse FFT. Returns the NBlock - NTaps + 1 samples of each
+    series that are not affected by the wrap-around of the FFT, as float32,
+    where output sample i is centred on input sample i + (NTaps / 2) - 1."""
+    Spectra = numpy.fft.rfft(Block, axis=1)
+    Spectra *= Response
+    Filtered = numpy.fft.irfft(Spectra, Block.shape[1], axis=1)
+    return Filtered[:, NTaps-1:].astype(numpy.float32)
+
+#
+# get the name of a filtered file
+#
+def GetFilterFilename(FileSpec, OutDir=None):
+    """Return the name used by yapp_filter, such as data.filt.tim, in OutDir
+    (the current directory if None)."""
+    Base = os.path.splitext(os.path.basename(FileSpec))[0]
+    FileFilt = Base + "." + INFIX_FILTER + sp.EXT_TIM
+    if (OutDir is not None):
+        FileFilt = os.path.join(OutDir, FileFilt)
+    return FileFilt
+
+#
+# filter a set of time series files with a mask
+#
+def FilterFiles(FilesSpec, Mask, NBlock=None, OutDir=None, Progress=None):
+    """Filter .tim files with the same sampling interval, such as the
+    dedispersed time series of many DMs or beams, with a mask from
+    ReadMask(), by overlap-save. The files are read through memory maps, and
+    each block of all of them is filtered in one batch and appended to the
+    outputs before the next is read. The result does not depend on the block
+    length NBlock (DEF_BLOCK_FACTOR times the length of the FFT of the mask
+    if None): it is the linear convolution of each series, with zeros beyond
+    its ends, with the filter of the mask. Returns the output file names."""
+    NTaps = 2 * (len(Mask) - 1)
+    if (NBlock is None):
+        NBlock = DEF_BLOCK_FACTOR * NTaps
+    Response = GetResponse(Mask, NBlock)
+    NValid = NBlock - NTaps + 1
+    # offset of the input of a block from its first output sample
+    Lead = (NTaps // 2) - 1
+
+    Hdrs = []
+    Series = []
+    for FileSpec in FilesSpec:
+        if (not FileSpec.endswith(sp.EXT_TIM)):
+            raise ValueError(FileSpec + " is not a .tim file")
+        (hdr, Data) = sp.ReadSIGPROCData(FileSpec)
+        if (hdr.NBits != 32):
+            raise ValueError(FileSpec + " is not a 32-bit time series")
+        if (len(Hdrs) > 0 and hdr.TSamp != Hdrs[0].TSamp):
+            raise ValueError("Sampling interval of " + FileSpec + " differs "
+                             "from that of " + FilesSpec[0])
+        Hdrs.append(hdr)
+        Series.append(Data[:, 0])
+    NSamps = numpy.array([hdr.NTimeSamps for hdr in Hdrs])
+    NMax = NSamps.max()
+
+    # copy the headers as they are, as yapp_filter does
+    Files = [GetFilterFilename(FileSpec, OutDir) for FileSpec in FilesSpec]
+    for (File, FileSpec, hdr) in zip(Files, FilesSpec, Hdrs):
+        fsrc = open(FileSpec, "rb")
+        Header = fsrc.read(hdr.HeaderLen)
+        fsrc.close()
+        fdest = open(File, "wb")
+        fdest.write(Header)
+        fdest.close()
+
+    Block = numpy.zeros((len(Series), NBlock), dtype=numpy.float64)
+    for Start in range(0, NMax, NValid):
+        # output sample Start needs the input from Start - Lead onwards
+        First = Start - Lead
+        for (i, Data) in enumerate(Series):
+            Lo = max(First, 0)
+            Hi = min(First + NBlock, NSamps[i])
+            Block[i] = 0.0
+            if (Hi > Lo):
+                Block[i, Lo-First:Hi-First] = Data[Lo:Hi]
+        Filtered = FilterBlock(Block, Response, NTaps)
+        for (i, File) in enumerate(Files):
+            NOut = min(NValid, NSamps[i] - Start)
+            if (NOut <= 0):
+                continue
+            fdest = open(File, "ab")
+            Filtered[i, :NOut].tofile(fdest)
+            fdest.close()
+        if (Progress is not None):
+            Progress(min(Start + NValid, NMax), NMax)
+    return Files
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+
+# yapp_findrfi.py
+# Find RFI in filterbank data, by the spectral kurtosis and the median
+#   absolute deviation of each channel in blocks of time samples, and write a
+#   channel by time block mask that yapp_multidedisperse.py and
+#   yapp_multifold.py apply as they read the data, optionally with zero-DM
+#   subtraction.
+#
+#   Usage: yapp_findrfi.py [options] <data-file>
+
+import sys
+import getopt
+import multiprocessing
+import time
+import numpy
+import yapp_sigproc as sp
+import yapp_rfi as rfi
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-file>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -n  --nsamp <samples>                ",                        \
+          "Number of samples in a block of the\n",                            \
+          "                                         ",                        \
+          "mask (default is 2048 samples)"
+    print "    -k  --sk-threshold <sigma>           ",                        \
+          "Spectral kurtosis threshold\n",                                    \
+          "                                         ",                        \
+          "(default is 5.0)"
+    print "    -m  --mad-threshold <sigma>          ",                        \
+          "Threshold on the mean of a block\n",                               \
+          "                                         ",                        \
+          "(default is 5.0)"
+    print "    -z  --zerodm                         ",                        \
+          "Subtract the zero-DM time series when\n",                          \
+          "                                         ",                        \
+          "the mask is applied"
+    print "    -c  --channels                       ",                        \
+          "Print the fraction of each channel\n",                             \
+          "                                         ",                        \
+          "that is flagged"
+    print "    -j  --jobs <n>                       ",                        \
+          "Number of worker processes\n",                                     \
+          "                                         ",                        \
+          "(default is number of CPUs)"
+    print "    -o  --outdir <dir>                   ",                        \
+          "Output directory\n",                                               \
+          "                                         ",                        \
+          "(default is the current directory)"
+    return
+
+def PrintProgress(Done, Total):
+    "Prints the fraction of data processed."
+    sys.stdout.write("\rProcessed %d of %d time samples." % (Done, Total))
+    sys.stdout.flush()
+    return
+
+# defaults
+BlockSize = rfi.DEF_SIZE_BLOCK
+SKThresh = rfi.DEF_SK_THRESH
+MADThresh = rfi.DEF_MAD_THRESH
+ZeroDM = False
+PerChan = False
+NJobs = multiprocessing.cpu_count()
+OutDir = None
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "hn:k:m:zcj:o:"
+OptsLong = ["help", "nsamp=", "sk-threshold=", "mad-threshold=", "zerodm",
+            "channels", "jobs=", "outdir="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-n", "--nsamp"):
+            BlockSize = int(a)
+        elif o in ("-k", "--sk-threshold"):
+            SKThresh = float(a)
+        elif o in ("-m", "--mad-threshold"):
+            MADThresh = float(a)
+        elif o in ("-z", "--zerodm"):
+            ZeroDM = True
+        elif o in ("-c", "--channels"):
+            PerChan = True
+        elif o in ("-j", "--jobs"):
+            NJobs = int(a)
+        elif o in ("-o", "--outdir"):
+            OutDir = a
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (len(Args) != 1):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (SKThresh <= 0.0 or MADThresh <= 0.0 or NJobs <= 0):
+    sys.stderr.write("ERROR: Thresholds and number of jobs must be "
+                     + "positive!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+tStart = time.time()
+try:
+    hdr = sp.ReadSIGPROCHeader(Args[0])
+    Mask = rfi.FindRFI(Args[0], BlockSize, SKThresh, MADThresh, ZeroDM,
+                       NJobs, PrintProgress)
+    FileMask = rfi.GetRFIMaskFilename(Args[0], OutDir)
+    rfi.WriteRFIMask(FileMask, Mask)
+except (IOError, OSError, ValueError), ErrMsg:
+    sys.stderr.write("\nERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+tElapsed = time.time() - tStart
+
+print "\nProcessed %.3f s of data in %.3f s."                                 \
+      % (hdr.NTimeSamps * hdr.TSamp, tElapsed)
+ChanFrac = Mask.GetChanFraction()
+print "Flagged %.2f%% of the data, and %d of %d channels throughout."         \
+      % (100.0 * Mask.GetFraction(), numpy.sum(ChanFrac >= 1.0), hdr.NChans)
+if (PerChan):
+    print "%-8s %10s" % ("# Chan", "Flagged")
+    for (i, Frac) in enumerate(ChanFrac):
+        print "%-8d %9.2f%%" % (i, 100.0 * Frac)
+print "Wrote " + FileMask + "."
+print "DONE!"
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+
+#
+# yapp_fluxstore.py
+# Store of per-band mean flux densities, so that spectral index calculations
+#   only need to calibrate bands that are new or have changed
+#
+
+import os
+import sqlite3
+import yapp_common as yapp
+
+FLUXSTORE_VERSION = 1
+
+#
+# build the key of a set of calibration parameters
+#
+def GetCalKey(Tsys, G, NPol, onBin, offBin, NBins, tObs, BW, polyOrder):
+    """Everything other than the profile itself that determines the results
+    of yapp_common.CalProfFiles(). A zero Tsys means that the profiles are
+    already calibrated."""
+    if (0.0 == Tsys):
+        return "%d %d %d" % (onBin, offBin, NBins)
+    return "%r %r %d %d %d %d %r %r %d"                                       \
+           % (float(Tsys), float(G), NPol, onBin, offBin, NBins, float(tObs),
+              float(BW), polyOrder)
+
+#
+# open a store, creating it if need be
+#
+def OpenStore(FileStore):
+    Conn = sqlite3.connect(FileStore)
+    Conn.execute("CREATE TABLE IF NOT EXISTS bands ("
+                 "path TEXT NOT NULL, "
+                 "calkey TEXT NOT NULL, "
+                 "mtime REAL NOT NULL, "
+                 "size INTEGER NOT NULL, "
+                 "freq REAL NOT NULL, "
+                 "deltas REAL, "
+                 "smean REAL NOT NULL, "
+                 "deltasmean REAL, "
+                 "PRIMARY KEY (path, calkey))")
+    Conn.execute("PRAGMA user_version = %d" % FLUXSTORE_VERSION)
+    Conn.commit()
+    return Conn
+
+#
+# get the key of a profile file
+#
+def _GetFileKey(fileProf):
+    return (os.path.abspath(fileProf),) + yapp.GetFileKey(fileProf)
+
+#
+# look up the results of a set of profile files
+#
+def LookupBands(Conn, filesProf, CalKey, NeedCalFiles=False):
+    """Return a dictionary mapping each file name in filesProf that has
+    stored results for CalKey, and has not been modified since, to
+    (fileProf, FCentre, DeltaS, SMean, DeltaSMean), as returned by
+    yapp_common.CalProfFiles(). If NeedCalFiles is True, files whose .cal.ypr
+    file no longer exists are left out."""
+    Found = {}
+    for fileProf in filesProf:
+        (Path, MTime, Size) = _GetFileKey(fileProf)
+        Row = Conn.execute("SELECT freq, deltas, smean, deltasmean FROM "
+                           "bands WHERE path = ? AND calkey = ? AND "
+                           "mtime = ? AND size = ?",
+                           (Path, CalKey, MTime, Size)).fetchone()
+        if (Row is None):
+            continue
+        if (NeedCalFiles                                                      \
+            and not os.path.exists(os.path.splitext(fileProf)[0]
+                                   + ".cal.ypr")):
+            continue
+        # SQLite stores NaN as NULL
+        Found[fileProf] = (fileProf,)                                         \
+                          + tuple(float("nan") if Value is None else Value
+                                  for Value in Row)
+    return Found
+
+#
+# save the results of a set of profile files
+#
+def SaveBands(Conn, Results, CalKey):
+    """Results is a list of (fileProf, FCentre, DeltaS, SMean, DeltaSMean),
+    as returned by yapp_common.CalProfFiles(). Older results for the same
+    file and calibration parameters are replaced."""
+    Rows = []
+    for (fileProf, FCentre, DeltaS, SMean, DeltaSMean) in Results:
+        (Path, MTime, Size) = _GetFileKey(fileProf)
+        Rows.append((Path, CalKey, MTime, Size, FCentre, DeltaS, SMean,
+                     DeltaSMean))
+    Conn.executemany("INSERT OR REPLACE INTO bands VALUES "
+                     "(?, ?, ?, ?, ?, ?, ?, ?)", Rows)
+    Conn.commit()
+    return
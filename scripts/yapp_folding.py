@@ -0,0 +1,157 @@
+#!/usr/bin/python
+
+#
+# yapp_folding.py
+# Folding functions, for multiple trial periods in one pass over a filterbank
+#   file or a dedispersed time series
+#
+
+import os
+import numpy
+import yapp_sigproc as sp
+import yapp_common as yapp
+import yapp_dedisp as dedisp
+
+DEF_SIZE_BLOCK = 65536
+
+INFIX_FOLD = "p"
+
+#
+# calculate the phase bin of each sample
+#
+def GetPhaseBins(t, Period, PDot, NBins):
+    """Return the phase bin of each time t (in s from the start of the data),
+    for a period in s and a period derivative in s/s, using the phase
+    t/P - (PDot t^2)/(2 P^2)."""
+    Phase = (t / Period) - ((0.5 * PDot * t * t) / (Period * Period))
+    Bins = ((Phase - numpy.floor(Phase)) * NBins).astype(numpy.int64)
+    # guard against rounding up to the end of the last bin
+    return numpy.minimum(Bins, NBins - 1)
+
+#
+# fold a block of data at a set of trial periods
+#
+def FoldBlock(Cubes, Counts, Block, Start, TSamp, Trials, SampsPerSubInt):
+    """Add a block of data to the folded cubes. Block is an (NSamps, NChans)
+    array starting at sample Start, Cubes is an (NTrials, NSubInts,
+    NSubBands, NBins) array of sums, and Counts is the (NTrials, NSubInts,
+    NBins) number of samples in each sum. Trials is a list of (period, period
+    derivative), in s and s/s. Channels are summed into NSubBands contiguous
+    sub-bands before folding, and the samples are accumulated with
+    numpy.bincount()."""
+    (NTrials, NSubInts, NSubBands, NBins) = Cubes.shape
+    NSamps = len(Block)
+    Bands = numpy.asarray(Block, dtype=numpy.float64)                         \
+            .reshape(NSamps, NSubBands, -1).sum(axis=2)
+    Samps = Start + numpy.arange(NSamps, dtype=numpy.int64)
+    SubInts = numpy.minimum(Samps // SampsPerSubInt, NSubInts - 1)
+    # only accumulate into the sub-integrations spanned by the block
+    (First, Last) = (SubInts[0], SubInts[-1] + 1)
+    SubInts -= First
+    BandIdx = numpy.arange(NSubBands) * NBins
+    for (i, (Period, PDot)) in enumerate(Trials):
+        Bins = GetPhaseBins(Samps * TSamp, Period, PDot, NBins)
+        Idx = ((SubInts * (NSubBands * NBins)) + Bins)[:, numpy.newaxis]      \
+              + BandIdx
+        Sums = numpy.bincount(Idx.ravel(), weights=Bands.ravel(),
+                              minlength=(Last - First) * NSubBands * NBins)
+        Cubes[i, First:Last] += Sums.reshape(Last - First, NSubBands, NBins)
+        Hits = numpy.bincount((SubInts * NBins) + Bins,
+                              minlength=(Last - First) * NBins)
+        Counts[i, First:Last] += Hits.reshape(Last - First, NBins)
+    return
+
+#
+# fold a file at a set of trial periods
+#
+def FoldFile(FileSpec, Trials, NBins, NSubInts=1, NSubBands=1,               \
+             BlockSize=DEF_SIZE_BLOCK, Progress=None, RFIMask=None):
+    """Read the file once, in blocks of BlockSize time samples, and fold it at
+    each (period, period derivative) in Trials. NSubBands must be a factor of
+    the number of channels, and is 1 for time series. If RFIMask, from
+    yapp_rfi, is given, it is applied to each block as it is read. Returns
+    (hdr, cubes, counts), as described in FoldBlock()."""
+    (hdr, Data) = sp.ReadSIGPROCData(FileSpec)
+    if (RFIMask is not None):
+        RFIMask.Check(hdr)
+    if (NBins < 1 or NSubInts < 1 or NSubBands < 1):
+        raise ValueError("Number of bins, sub-integrations and sub-bands "
+                         "must be positive")
+    if (hdr.NChans % NSubBands != 0):
+        raise ValueError("Number of sub-bands (%d) must be a factor of the "
+                         "number of channels (%d)" % (NSubBands, hdr.NChans))
+    if (NSubInts > hdr.NTimeSamps):
+        raise ValueError("More sub-integrations than time samples")
+    SampsPerSubInt = int(numpy.ceil(float(hdr.NTimeSamps) / NSubInts))
+    Cubes = numpy.zeros((len(Trials), NSubInts, NSubBands, NBins),
+                        dtype=numpy.float64)
+    Counts = numpy.zeros((len(Trials), NSubInts, NBins), dtype=numpy.int64)
+    for Start in range(0, hdr.NTimeSamps, BlockSize):
+        Stop = min(Start + BlockSize, hdr.NTimeSamps)
+        Block = Data[Start:Stop]
+        if (RFIMask is not None):
+            Block = RFIMask.Apply(Block, Start)
+        FoldBlock(Cubes, Counts, Block, Start, hdr.TSamp, Trials,
+                  SampsPerSubInt)
+        if (Progress is not None):
+            Progress(Stop, hdr.NTimeSamps)
+    return (hdr, Cubes, Counts)
+
+#
+# get the mean value in each bin of a folded cube
+#
+def GetMeanCube(Cube, Count):
+    """Return the (NSubInts, NSubBands, NBins) mean of the samples folded into
+    each bin of one trial, with empty bins set to 0."""
+    Count = numpy.maximum(Count, 1)[:, numpy.newaxis, :]
+    return Cube / Count
+
+#
+# get the sub-band profiles of a folded cube
+#
+def GetBandProfiles(Cube, Count):
+    """Return the (NSubBands, NBins) profiles of one trial, averaged over all
+    sub-integrations, with empty bins set to 0."""
+    return Cube.sum(axis=0) / numpy.maximum(Count.sum(axis=0), 1)
+
+#
+# build profile headers for the sub-bands of a folded file
+#
+def GetBandHeaders(hdr, NSubBands):
+    """Return one yapp_common.ProfHeader per sub-band, in file channel
+    order, with frequencies in MHz and the duration of the data in s. A
+    single band takes the centre frequency and bandwidth of the file, as
+    written by yapp_fold."""
+    ChanBW = abs(hdr.ChanBW)
+    tObs = hdr.NTimeSamps * hdr.TSamp
+    if (1 == NSubBands):
+        return [yapp.MakeProfHeader(hdr.FCentre, ChanBW, hdr.BW, tObs)]
+    Freqs = dedisp.GetChanFreqs(hdr).reshape(NSubBands, -1)
+    return [yapp.MakeProfHeader(Band.mean(), ChanBW, len(Band) * ChanBW, tObs)
+            for Band in Freqs]
+
+#
+# calibrate the sub-band profiles of a folded file
+#
+def CalBandProfiles(Profiles, hdrs, onBin, offBin, Tsys, G, NPol,          \
+                    polyOrder=0):
+    """Calibrate (NSubBands, NBins) profiles with
+    yapp_common.DoCalBatch(), using the bandwidth and duration in hdrs.
+    Returns the calibrated profiles and the per-band 1-sigma error in S."""
+    NBins = Profiles.shape[1]
+    BW = numpy.array([hdr.BW for hdr in hdrs]) * 1e6    # in Hz
+    tObs = numpy.array([hdr.tObs for hdr in hdrs])
+    return yapp.DoCalBatch(Profiles, onBin, offBin, Tsys, G, NPol, tObs,
+                           NBins, BW, polyOrder)
+
+#
+# build the base name of the output files of a trial period
+#
+def GetFoldBasename(FileSpec, Period, OutDir=None):
+    """Return <dir>/<base>.p<period in ms>, to which the extension of each
+    output is added."""
+    Base = os.path.splitext(os.path.basename(FileSpec))[0]
+    Name = Base + "." + INFIX_FOLD + ("%.10g" % (Period * 1e3))
+    if (OutDir is None):
+        OutDir = os.path.dirname(FileSpec)
+    return os.path.join(OutDir, Name)
@@ -8,10 +8,9 @@
 # Created by Jayanth Chennamangalam on 2013.02.18
 
 import sys
+import os
 import getopt
-import math
-import numpy
-import matplotlib.pyplot as plotter
+import yapp_mask as mask
 
 # function definitions
 def PrintUsage(ProgName):
@@ -19,11 +18,11 @@ def PrintUsage(ProgName):
     print "Usage: " + ProgName + " [options]"
     print "    -h  --help                           ",                        \
           "Display this usage information"
-    print "    -n  --nfft <nfft>                    ",                        \
+    print "    -n  --nfft <nfft>[,<nfft>...]        ",                        \
           "Length of FFT used in yapp_filter\n",                              \
           "                                         ",                        \
           "(default is 4096)"
-    print "    -t  --tsamp <tsamp>                  ",                        \
+    print "    -t  --tsamp <tsamp>[,<tsamp>...]     ",                        \
           "Sampling time in seconds"
     print "    -l  --lower <freq>                   ",                        \
           "Lower cut-off frequency in Hz\n",                                  \
@@ -33,21 +32,48 @@ def PrintUsage(ProgName):
           "Upper cut-off frequency in Hz\n",                                  \
           "                                         ",                        \
           "(default is 1000 Hz)"
+    print "    -s  --stop <freq>:<width>[:<taper>]  ",                        \
+          "Band-stop (notch) in Hz, with an optional\n",                      \
+          "                                         ",                        \
+          "taper width on either side; may be given\n",                       \
+          "                                         ",                        \
+          "more than once"
+    print "    -S  --stop-list <file>               ",                        \
+          "File with one band-stop per line, as\n",                           \
+          "                                         ",                        \
+          "<freq> <width> [<taper>]"
+    print "    -w  --taper <shape>                  ",                        \
+          "Taper shape, cosine or linear\n",                                  \
+          "                                         ",                        \
+          "(default is cosine)"
+    print "    -F  --float                          ",                        \
+          "Write the mask as single-precision\n",                             \
+          "                                         ",                        \
+          "floating-point (use yapp_filter -F)"
+    print "    -d  --dir <dir>                      ",                        \
+          "Directory of indexed masks to look up\n",                          \
+          "                                         ",                        \
+          "and write to (default is .)"
     print "    -g  --graphics                       ",                        \
           "Turn on graphics"
     return
 
 # default values
-NFFT = 4096                 # number of points in FFT used in yapp_filter
-TSamp = 0.0                 # sampling time
+NFFTs = [4096]              # number of points in FFT used in yapp_filter
+TSamps = []                 # sampling times
 FLow = 0.1                  # Hz, (1 / 10 s)
 FHigh = 1000                # Hz, (1 / 1 ms)
+Stops = []                  # band-stops, as (freq, width, taper) in Hz
+Taper = mask.DEF_MASK_TAPER # shape of band-stop tapers
+Format = mask.DEF_MASK_FORMAT
+Dir = "."                   # mask directory
 Plot = False                # plot flag
 
 # get the command line arguments
 ProgName = sys.argv[0]
-OptsShort = "hn:t:l:u:g"
-OptsLong = ["help", "nfft=", "tsamp=", "lower=", "upper=", "graphics"]
+OptsShort = "hn:t:l:u:s:S:w:Fd:g"
+OptsLong = ["help", "nfft=", "tsamp=", "lower=", "upper=", "stop=",
+            "stop-list=", "taper=", "float", "dir=", "graphics"]
 
 # get the arguments using the getopt module
 try:
@@ -59,68 +85,81 @@ except getopt.GetoptError, ErrMsg:
     sys.exit(1)
 
 # parse the arguments
-for o, a in Opts:
-    if o in ("-h", "--help"):
-        PrintUsage(ProgName)
-        sys.exit()
-    elif o in ("-n", "--nfft"):
-        NFFT = int(a)
-    elif o in ("-t", "--tsamp"):
-        TSamp = float(a)
-    elif o in ("-l", "--lower"):
-        FLow = float(a)
-    elif o in ("-u", "--upper"):
-        FHigh = float(a)
-    elif o in ("-g", "--graphics"):
-        Plot = True
-    else:
-        PrintUsage(ProgName)
-        sys.exit(1)
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-n", "--nfft"):
+            NFFTs = [int(NFFT) for NFFT in a.split(",")]
+        elif o in ("-t", "--tsamp"):
+            TSamps = [float(TSamp) for TSamp in a.split(",")]
+        elif o in ("-l", "--lower"):
+            FLow = float(a)
+        elif o in ("-u", "--upper"):
+            FHigh = float(a)
+        elif o in ("-s", "--stop"):
+            Stops.append(mask.ParseStop(a))
+        elif o in ("-S", "--stop-list"):
+            Stops.extend(mask.ReadStopList(a))
+        elif o in ("-w", "--taper"):
+            Taper = a
+        elif o in ("-F", "--float"):
+            Format = "float32"
+        elif o in ("-d", "--dir"):
+            Dir = a
+        elif o in ("-g", "--graphics"):
+            Plot = True
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except (ValueError, IOError), ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
 
-if (0.0 == TSamp):
+if (0 == len(TSamps) or 0.0 in TSamps):
     ErrMsg = "Sampling time not specified"
     sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
     # print usage information and exit
     PrintUsage(ProgName)
     sys.exit(1)
 
-# compute number of usable points in FFT output
-NUsable = (NFFT / 2) + 1
-
-# compute the usable bandwidth
-Bandwidth = (1.0 / TSamp) / 2
-
-# compute frequency resolution
-Res = Bandwidth / NUsable
-
-# compute the (conservative) indices of FLow and FHigh
-IdxLow = math.floor(FLow / Res)
-IdxHigh = math.ceil(FHigh / Res)
-if (0.0 == IdxLow):
-    print "WARNING: Frequency resolution may not be small enough. "           \
-          + "Consider using a longer transform."
-if (IdxHigh + 1 > NUsable):
-    ErrMsg = "Upper cut-off frequency greater than usable bandwidth"
+if Taper not in mask.MASK_TAPERS:
+    ErrMsg = "Unknown taper " + Taper
     sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
     sys.exit(1)
 
-# generate filter mask
-Mask = numpy.zeros(NUsable)
-Mask[IdxLow:IdxHigh+1] = 1.0
-# make sure the DC bin is zero
-Mask[0] = 0.0
-
-# write the coefficients to disk and also plot it
-MaskFilename = "yapp_mask_"                                                   \
-               + str(NFFT) + "_"                                              \
-               + str(TSamp) + "_"                                             \
-               + str(FLow) + "_"                                              \
-               + str(FHigh) + ".dat"
-Mask.astype('uint8').tofile(MaskFilename)
-# plot the mask
-if (Plot):
-    plotter.plot(Mask)
+if (Format != "float32" and any([Stop[2] > 0.0 for Stop in Stops])):
+    ErrMsg = "Tapered band-stops need a floating-point mask (-F)"
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
 
+# generate a mask for each combination of FFT length and sampling time,
+#   re-using masks that are already in the index
+Masks = []
+for NFFT in NFFTs:
+    for TSamp in TSamps:
+        # frequency resolution, as used in GenMask()
+        Res = ((1.0 / TSamp) / 2) / ((NFFT / 2) + 1)
+        if (FLow < Res):
+            sys.stderr.write("WARNING: Frequency resolution may not be small "
+                             + "enough for NFFT = " + str(NFFT)
+                             + ", tsamp = " + str(TSamp)
+                             + ". Consider using a longer transform.\n")
+        try:
+            (FileMask, Mask, Generated) = mask.WriteMask(NFFT, TSamp, FLow,
+                                                         FHigh, Stops, Taper,
+                                                         Format, Dir)
+        except ValueError, ErrMsg:
+            sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+            sys.exit(1)
+        print os.path.normpath(FileMask)
+        Masks.append(Mask)
+
+# plot the masks
 if (Plot):
+    import matplotlib.pyplot as plotter
+    for Mask in Masks:
+        plotter.plot(Mask)
     plotter.show()
-
@@ -8,10 +8,9 @@
 # Created by Jayanth Chennamangalam based on code by Sean McHugh, UCSB
 
 import sys
+import os
 import getopt
-import math
-import numpy
-import matplotlib.pyplot as plotter
+import yapp_pfb as pfb
 
 # function definitions
 def PrintUsage(ProgName):
@@ -27,8 +26,22 @@ def PrintUsage(ProgName):
           "Number of taps in PFB\n",                                          \
           "                                         ",                        \
           "(default is 8)"
-#    print "    -b  --nsubbands <value>    Number of sub-bands in data"
-#    print "                               (default is 1)"
+    print "    -b  --nsubbands <value>              ",                        \
+          "Number of sub-bands in data\n",                                    \
+          "                                         ",                        \
+          "(default is 1)"
+    print "    -w  --window <window>                ",                        \
+          "Window function, one of hanning,\n",                               \
+          "                                         ",                        \
+          "hamming, blackman, bartlett, rect\n",                              \
+          "                                         ",                        \
+          "(default is hanning)"
+    print "    -c  --cache <dir>                    ",                        \
+          "Re-use coefficients cached in, or add\n",                          \
+          "                                         ",                        \
+          "them to, the given directory\n",                                   \
+          "                                         ",                        \
+          "(default is $" + pfb.ENV_CACHE_DIR + ", if set)"
     print "    -g  --graphics                       ",                        \
           "Turn on graphics"
     return
@@ -37,14 +50,15 @@ def PrintUsage(ProgName):
 NFFT = 4096                 # number of points in FFT
 NTaps = 8                   # number of taps in PFB
 NSubBands = 1               # number of sub-bands in data
+Window = pfb.DEF_PFB_WINDOW # window function
+CacheDir = os.environ.get(pfb.ENV_CACHE_DIR)    # coefficient cache
 Plot = False                # plot flag
 
 # get the command line arguments
 ProgName = sys.argv[0]
-#OptsShort = "hn:t:b:g"
-#OptsLong = ["help", "nfft=", "ntaps=", "nsubbands=", "graphics"]
-OptsShort = "hn:t:g"
-OptsLong = ["help", "nfft=", "ntaps=", "graphics"]
+OptsShort = "hn:t:b:w:c:g"
+OptsLong = ["help", "nfft=", "ntaps=", "nsubbands=", "window=", "cache=",    \
+            "graphics"]
 
 # get the arguments using the getopt module
 try:
@@ -64,43 +78,32 @@ for o, a in Opts:
         NFFT = int(a)
     elif o in ("-t", "--ntaps"):
         NTaps = int(a)
-    #elif o in ("-b", "--sub-bands"):
-    #    NSubBands = int(a)
+    elif o in ("-b", "--nsubbands"):
+        NSubBands = int(a)
+    elif o in ("-w", "--window"):
+        Window = a
+    elif o in ("-c", "--cache"):
+        CacheDir = a
     elif o in ("-g", "--graphics"):
         Plot = True
     else:
         PrintUsage(ProgName)
         sys.exit(1)
 
-M = NTaps * NFFT
-
-# the filter-coefficient-generation section -->
-X = numpy.array([(float(i) / NFFT) - (float(NTaps) / 2) for i in range(M)])
-PFBCoeff = numpy.sinc(X) * numpy.hanning(M)
-# <-- the filter-coefficient-generation section
+if Window not in pfb.PFB_WINDOWS:
+    ErrMsg = "Unknown window function " + Window
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
 
-# 32-bit (float) coefficients
-PFBCoeffFloat32 = numpy.zeros(M * NSubBands, numpy.float32)
-k = 0
-for i in range(len(PFBCoeff)):
-    Coeff = float(PFBCoeff[i])
-    for m in range(NSubBands):
-        PFBCoeffFloat32[k+m] = Coeff
-    k = k + NSubBands
+# generate the coefficients, or take them from the cache, and write them to
+#   disk
+(FileCoeff, Generated) = pfb.WriteCoeff(NTaps, NFFT, NSubBands, Window,       \
+                                        CacheDir=CacheDir)
 
-# write the coefficients to disk and also plot it
-FileCoeff = open("coeff_"                                                     \
-                  + str(NTaps) + "_"                                          \
-                  + str(NFFT) + "_"                                           \
-                  + str(NSubBands) + ".dat",                                  \
-                 "wb")
-FileCoeff.write(PFBCoeffFloat32)
 # plot the coefficients
 if (Plot):
-    plotter.plot(PFBCoeffFloat32)
-
-FileCoeff.close()
-
-if (Plot):
+    # matplotlib is slow to import, so only load it when plotting
+    import matplotlib.pyplot as plotter
+    plotter.plot(pfb.ReadCoeff(FileCoeff, NTaps, NFFT, NSubBands).flatten())
     plotter.show()
-
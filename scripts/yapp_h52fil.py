@@ -0,0 +1,127 @@
+#!/usr/bin/python
+
+# yapp_h52fil.py
+# Extract a time range and a sub-band of an HDF5 filterbank file to a SIGPROC
+#   .fil file, reading only the chunks that hold them, optionally in parallel.
+#
+#   Usage: yapp_h52fil.py [options] <data-file>
+
+import sys
+import os
+import getopt
+import multiprocessing
+import yapp_sigproc as sp
+import yapp_hdf5 as hdf5
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-file>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -s  --start <samples>                ",                        \
+          "First time sample to extract\n",                                   \
+          "                                         ",                        \
+          "(default is 0)"
+    print "    -n  --nsamp <samples>                ",                        \
+          "Number of time samples to extract\n",                              \
+          "                                         ",                        \
+          "(default is all samples from the start)"
+    print "    -b  --band <first>:<last>            ",                        \
+          "First and last channel to extract, in\n",                          \
+          "                                         ",                        \
+          "file order (default is all channels)"
+    print "    -j  --jobs <n>                       ",                        \
+          "Number of worker processes\n",                                     \
+          "                                         ",                        \
+          "(default is number of CPUs)"
+    print "    -o  --output <file>                  ",                        \
+          "Output file\n",                                                    \
+          "                                         ",                        \
+          "(default is <base>.fil in the current\n",                          \
+          "                                         ",                        \
+          "directory)"
+    return
+
+# defaults
+Start = 0
+NSamps = None
+Band = None
+NJobs = multiprocessing.cpu_count()
+FileFil = None
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "hs:n:b:j:o:"
+OptsLong = ["help", "start=", "nsamp=", "band=", "jobs=", "output="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-s", "--start"):
+            Start = int(a)
+        elif o in ("-n", "--nsamp"):
+            NSamps = int(a)
+        elif o in ("-b", "--band"):
+            Band = [int(Chan) for Chan in a.split(":")]
+            if (len(Band) != 2):
+                raise ValueError("Invalid channel range " + a)
+        elif o in ("-j", "--jobs"):
+            NJobs = int(a)
+        elif o in ("-o", "--output"):
+            FileFil = a
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (len(Args) != 1):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (FileFil is None):
+    FileFil = os.path.splitext(os.path.basename(Args[0]))[0] + sp.EXT_FIL
+
+try:
+    hdr = hdf5.ReadHDF5Header(Args[0])
+    if (Band is None):
+        Band = [0, hdr.NChans - 1]
+    if (Band[0] < 0 or Band[1] >= hdr.NChans or Band[0] > Band[1]):
+        raise ValueError("Invalid channel range %d:%d for %d channels"        \
+                         % (Band[0], Band[1], hdr.NChans))
+    if (NSamps is None):
+        NSamps = hdr.NTimeSamps - Start
+    if (Start < 0 or NSamps < 1 or Start + NSamps > hdr.NTimeSamps):
+        raise ValueError("Invalid time range for %d time samples"             \
+                         % hdr.NTimeSamps)
+    Data = hdf5.ReadHDF5Data(Args[0], Start, Start + NSamps,
+                             slice(Band[0], Band[1] + 1), NJobs, hdr)
+    hdrOut = hdf5.GetSelectionHeader(hdr, Start, NSamps, Band[0],
+                                     (Band[1] - Band[0]) + 1)
+    fdest = open(FileFil, "wb")
+    sp.WriteSIGPROCHeader(fdest, hdrOut)
+    Data.tofile(fdest)
+    fdest.close()
+except (IOError, ImportError, KeyError, ValueError), ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+
+print "Wrote %d time samples of %d channels to %s."                           \
+      % (NSamps, (Band[1] - Band[0]) + 1, FileFil)
+print "DONE!"
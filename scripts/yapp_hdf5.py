@@ -0,0 +1,301 @@
+#!/usr/bin/python
+
+#
+# yapp_hdf5.py
+# HDF5 filterbank support, with the layout and metadata attributes of
+#   yapp_fil2h5 and YAPP_ReadHDF5Metadata() in yapp_common.c, and the labels
+#   in yapp_hdf5.h. The data is stored as a (time sample, channel) dataset,
+#   chunked in time and optionally in frequency, so that time ranges and
+#   channel ranges can be read without reading the rest of the data.
+#
+
+import copy
+import multiprocessing
+import numpy
+import yapp_sigproc as sp
+import yapp_presto as presto
+
+# h5py is only needed for HDF5 support
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+EXT_HDF5 = ".h5"
+
+DYNSPEC_GROUP = "/DynamicSpectrum"
+DYNSPEC_DATASET = DYNSPEC_GROUP + "/Data"
+
+# default number of time samples in a chunk, as in yapp_fil2h5.h
+DEF_CHUNK_TIME = 1024
+
+# number of time samples read or written in one block, rounded to a whole
+#   number of chunks
+DEF_SIZE_BLOCK = 65536
+
+# bitshuffle + LZ4 filter, as used by yapp_fil2h5
+FILTER_ID_BITSHUFFLE = 32008
+FILTER_OPTS_LZ4 = 2
+
+COMPRESSIONS = ["none", "gzip", "lzf", "bitshuffle"]
+
+ATTRNAME_SITE = "Site"
+ATTRNAME_SRCNAME = "Source"
+ATTRNAME_TSAMP = "Sampling interval (s)"
+ATTRNAME_FCEN = "Centre frequency (MHz)"
+ATTRNAME_BW = "Bandwidth (MHz)"
+ATTRNAME_NUMCHANS = "Number of channels"
+ATTRNAME_CHANBW = "Channel bandwidth (MHz)"
+ATTRNAME_TIMESAMPS = "Number of time samples"
+ATTRNAME_NUMBITS = "Number of bits"
+ATTRNAME_NUMIFS = "Number of IFs"
+ATTRNAME_BACKEND = "Backend"
+ATTRNAME_SRCRA = "Source RA (deg.)"
+ATTRNAME_SRCDEC = "Source Dec. (deg.)"
+ATTRNAME_FMIN = "Lowest frequency (MHz)"
+ATTRNAME_FMAX = "Highest frequency (MHz)"
+ATTRNAME_BFLIP = "Is band flipped?"
+ATTRNAME_TSTART = "Start time (MJD)"
+
+# HDF5 types of the samples, as written by yapp_fil2h5, where 8-bit data is
+#   stored as signed bytes, but holds the unsigned SIGPROC samples
+H5_SAMP_TYPES = {8: numpy.dtype("<i1"),
+                 16: numpy.dtype("<i2"),
+                 32: numpy.dtype("<f4")}
+
+def _CheckH5py():
+    if (h5py is None):
+        raise ImportError("h5py is needed for HDF5 support")
+    return
+
+#
+# get the dataset creation arguments for a compression scheme
+#
+def GetCompressionArgs(Compression):
+    """Return the keyword arguments of h5py's create_dataset() for one of
+    COMPRESSIONS. All are lossless. bitshuffle (with LZ4, as in yapp_fil2h5)
+    needs the filter plugin to be installed."""
+    _CheckH5py()
+    if (Compression is None or "none" == Compression):
+        return {}
+    elif ("gzip" == Compression):
+        return {"compression": "gzip", "compression_opts": 4,
+                "shuffle": True}
+    elif ("lzf" == Compression):
+        return {"compression": "lzf", "shuffle": True}
+    elif ("bitshuffle" == Compression):
+        if (not h5py.h5z.filter_avail(FILTER_ID_BITSHUFFLE)):
+            raise ValueError("The bitshuffle filter is not available")
+        return {"compression": FILTER_ID_BITSHUFFLE,
+                "compression_opts": (0, FILTER_OPTS_LZ4)}
+    raise ValueError("Unknown compression " + Compression)
+
+#
+# write a null-terminated string attribute, as YAPP_WriteHDF5StringAttribute()
+#   does
+#
+def _WriteStringAttribute(Dataset, Name, Value):
+    Value = Value.encode("ascii")
+    Type = h5py.h5t.C_S1.copy()
+    Type.set_size(len(Value) + 1)
+    Type.set_strpad(h5py.h5t.STR_NULLTERM)
+    Space = h5py.h5s.create(h5py.h5s.SCALAR)
+    Attr = h5py.h5a.create(Dataset.id, Name.encode("ascii"), Type, Space)
+    Attr.write(numpy.array(Value, dtype="S%d" % (len(Value) + 1)))
+    return
+
+#
+# write the metadata attributes of a dataset
+#
+def _WriteAttributes(Dataset, hdr):
+    """Write the attributes of YAPP_WriteMetadata(), with the same types. As
+    in yapp_fil2h5, the sampling interval is written in ms."""
+    _WriteStringAttribute(Dataset, ATTRNAME_SITE, hdr.Site)
+    _WriteStringAttribute(Dataset, ATTRNAME_SRCNAME, hdr.Pulsar)
+    Attrs = [(ATTRNAME_TSAMP, hdr.TSamp * 1e3, "<f8"),
+             (ATTRNAME_FCEN, hdr.FCentre, "<f4"),
+             (ATTRNAME_BW, hdr.BW, "<f4"),
+             (ATTRNAME_NUMCHANS, hdr.NChans, "<i4"),
+             (ATTRNAME_CHANBW, abs(hdr.ChanBW), "<f4"),
+             (ATTRNAME_TIMESAMPS, hdr.NTimeSamps, "<i4"),
+             (ATTRNAME_NUMBITS, hdr.NBits, "<i4"),
+             (ATTRNAME_NUMIFS, hdr.NIFs, "<i4"),
+             (ATTRNAME_BACKEND, hdr.BackendID, "<i4"),
+             (ATTRNAME_SRCRA, hdr.SourceRA, "<f8"),
+             (ATTRNAME_SRCDEC, hdr.SourceDec, "<f8"),
+             (ATTRNAME_FMIN, hdr.FMin, "<f4"),
+             (ATTRNAME_FMAX, hdr.FMax, "<f4"),
+             (ATTRNAME_BFLIP, int(hdr.IsBandFlipped), "<i1"),
+             (ATTRNAME_TSTART, hdr.TStart, "<f8")]
+    for (Name, Value, Type) in Attrs:
+        Dataset.attrs.create(Name, Value, dtype=Type)
+    return
+
+#
+# write filterbank data to an HDF5 file
+#
+def WriteHDF5(FileH5, hdr, Data, ChunkTime=DEF_CHUNK_TIME, ChunkChans=0,     \
+              Compression=None, BlockSize=DEF_SIZE_BLOCK, Progress=None):
+    """Write (NTimeSamps, NChans) data, such as the memory map returned by
+    yapp_sigproc.ReadSIGPROCData(), with the header hdr. The dataset is
+    chunked as ChunkTime time samples by ChunkChans channels (all channels
+    if 0), and compressed with one of COMPRESSIONS. Only 8-, 16- and 32-bit
+    data is supported, as by yapp_fil2h5."""
+    _CheckH5py()
+    if (hdr.NBits not in H5_SAMP_TYPES):
+        raise ValueError("Unsupported number of bits %d; only 8-, 16- and "
+                         "32-bit data is supported" % hdr.NBits)
+    (NTimeSamps, NChans) = Data.shape
+    if (0 == ChunkChans):
+        ChunkChans = NChans
+    if (ChunkTime < 1 or ChunkChans < 1 or ChunkChans > NChans):
+        raise ValueError("Invalid chunk shape %d x %d for %d channels"        \
+                         % (ChunkTime, ChunkChans, NChans))
+    ChunkTime = min(ChunkTime, max(NTimeSamps, 1))
+    BlockSize = max(1, BlockSize // ChunkTime) * ChunkTime
+    H5Type = H5_SAMP_TYPES[hdr.NBits]
+    # check the compression before creating the file
+    CompressionArgs = GetCompressionArgs(Compression)
+
+    hdr = copy.copy(hdr)
+    hdr.NChans = NChans
+    hdr.NTimeSamps = NTimeSamps
+    fdest = h5py.File(FileH5, "w")
+    try:
+        fdest.create_group(DYNSPEC_GROUP)
+        Dataset = fdest.create_dataset(DYNSPEC_DATASET, (NTimeSamps, NChans),
+                                       dtype=H5Type,
+                                       chunks=(ChunkTime, ChunkChans),
+                                       **CompressionArgs)
+        _WriteAttributes(Dataset, hdr)
+        # write whole chunks at a time
+        for Start in range(0, NTimeSamps, BlockSize):
+            Stop = min(Start + BlockSize, NTimeSamps)
+            Dataset[Start:Stop] = numpy.asarray(Data[Start:Stop]).view(H5Type)
+            if (Progress is not None):
+                Progress(Stop, NTimeSamps)
+    finally:
+        fdest.close()
+    return
+
+def _GetStringAttribute(Attrs, Name):
+    Value = numpy.asarray(Attrs.get(Name, b"")).tostring()
+    return Value.rstrip(b"\0").decode("ascii", "replace")
+
+#
+# read the header of an HDF5 file
+#
+def ReadHDF5Header(FileH5):
+    """Return a yapp_sigproc.SIGPROCHeader for an HDF5 file written by
+    WriteHDF5() or yapp_fil2h5, with the sampling interval in s, and the
+    chunk shape of the dataset in ChunkShape."""
+    _CheckH5py()
+    fsrc = h5py.File(FileH5, "r")
+    try:
+        Dataset = fsrc[DYNSPEC_DATASET]
+        Attrs = dict(Dataset.attrs.items())
+        (NTimeSamps, NChans) = Dataset.shape
+        ChunkShape = Dataset.chunks
+    finally:
+        fsrc.close()
+
+    hdr = sp.SIGPROCHeader()
+    hdr.Site = _GetStringAttribute(Attrs, ATTRNAME_SITE)
+    hdr.Pulsar = _GetStringAttribute(Attrs, ATTRNAME_SRCNAME)
+    hdr.TSamp = float(Attrs.get(ATTRNAME_TSAMP, 0.0)) / 1e3
+    hdr.FCentre = float(Attrs.get(ATTRNAME_FCEN, 0.0))
+    hdr.BW = float(Attrs.get(ATTRNAME_BW, 0.0))
+    hdr.NBits = int(Attrs.get(ATTRNAME_NUMBITS, 32))
+    hdr.NIFs = int(Attrs.get(ATTRNAME_NUMIFS, 1))
+    hdr.BackendID = int(Attrs.get(ATTRNAME_BACKEND, 0))
+    hdr.SourceRA = float(Attrs.get(ATTRNAME_SRCRA, 0.0))
+    hdr.SourceDec = float(Attrs.get(ATTRNAME_SRCDEC, 0.0))
+    hdr.FMin = float(Attrs.get(ATTRNAME_FMIN, 0.0))
+    hdr.FMax = float(Attrs.get(ATTRNAME_FMAX, 0.0))
+    hdr.IsBandFlipped = bool(Attrs.get(ATTRNAME_BFLIP, 0))
+    hdr.TStart = float(Attrs.get(ATTRNAME_TSTART, 0.0))
+    # the shape of the dataset is trusted over the attributes
+    hdr.NChans = NChans
+    hdr.NTimeSamps = NTimeSamps
+    ChanBW = float(Attrs.get(ATTRNAME_CHANBW, 0.0))
+    if (hdr.IsBandFlipped):
+        hdr.FChan1 = hdr.FMax
+        hdr.ChanBW = -ChanBW
+    else:
+        hdr.FChan1 = hdr.FMin
+        hdr.ChanBW = ChanBW
+    hdr.ChunkShape = ChunkShape
+    return hdr
+
+#
+# read a block of an HDF5 file
+#
+def _ReadBlock(FileH5, Start, Stop, Chans, NBits):
+    fsrc = h5py.File(FileH5, "r")
+    try:
+        Block = fsrc[DYNSPEC_DATASET][Start:Stop, Chans]
+    finally:
+        fsrc.close()
+    if (8 == NBits):
+        # the samples are unsigned, as in SIGPROC files
+        Block = Block.view(numpy.uint8)
+    return Block
+
+def _ReadBlockTask(Task):
+    return _ReadBlock(*Task)
+
+#
+# read a range of time samples and channels of an HDF5 file
+#
+def ReadHDF5Data(FileH5, Start=0, Stop=None, Chans=slice(None), NJobs=1,     \
+                 hdr=None):
+    """Return the (Stop - Start, channels) data of an HDF5 file, for the time
+    samples Start to Stop and the channels selected by Chans, which is a
+    slice or an increasing list of channel indices, in file order. Only the
+    chunks that hold the selected data are read. With NJobs > 1, the time
+    range is split on chunk boundaries and read by that many worker
+    processes, each of which opens the file itself. Samples are of the types
+    returned by yapp_sigproc.ReadSIGPROCData()."""
+    _CheckH5py()
+    if (hdr is None):
+        hdr = ReadHDF5Header(FileH5)
+    if (Stop is None or Stop > hdr.NTimeSamps):
+        Stop = hdr.NTimeSamps
+    if (Start < 0 or Start > Stop):
+        raise ValueError("Invalid time range %d to %d" % (Start, Stop))
+    if (not isinstance(Chans, slice)):
+        Chans = list(Chans)
+    if (NJobs <= 1):
+        return _ReadBlock(FileH5, Start, Stop, Chans, hdr.NBits)
+
+    # split the time range on chunk boundaries, into at least one block per
+    #   worker
+    ChunkShape = getattr(hdr, "ChunkShape", None)
+    ChunkTime = 1 if ChunkShape is None else ChunkShape[0]
+    NChunks = -(-(Stop - Start) // ChunkTime)
+    BlockSize = ChunkTime * max(1, -(-NChunks // NJobs))
+    Edges = list(range(((Start // ChunkTime) * ChunkTime) + BlockSize, Stop,
+                       BlockSize))
+    Edges = [Start] + Edges + [Stop]
+    Tasks = [(FileH5, Edges[i], Edges[i+1], Chans, hdr.NBits)
+             for i in range(len(Edges) - 1) if Edges[i+1] > Edges[i]]
+    pool = multiprocessing.Pool(min(NJobs, len(Tasks)))
+    try:
+        Blocks = pool.map(_ReadBlockTask, Tasks)
+    finally:
+        pool.close()
+        pool.join()
+    return numpy.concatenate(Blocks)
+
+#
+# get the header of a selection of time samples and channels
+#
+def GetSelectionHeader(hdr, Start, NTimeSamps, FirstChan, NChans):
+    """Return a copy of hdr for the NTimeSamps time samples starting at Start
+    and the NChans contiguous channels starting at FirstChan, in file
+    order."""
+    hdrSel = presto.GetSectionHeader(hdr, Start, NTimeSamps)
+    hdrSel.NChans = NChans
+    hdrSel.FChan1 = hdr.FChan1 + (FirstChan * hdr.ChanBW)
+    sp.SetBandFromFChan1(hdrSel)
+    return hdrSel
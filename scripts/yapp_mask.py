@@ -0,0 +1,201 @@
+#!/usr/bin/python
+
+#
+# yapp_mask.py
+# Filter mask functions, for masks used by yapp_filter
+#
+
+import os
+import hashlib
+import math
+import numpy
+import yapp_common as yapp
+
+# filter mask file naming, and the index of masks in a directory
+FILE_MASK_PREFIX = "yapp_mask"
+FILE_MASK_SUFFIX = ".dat"
+FILE_MASK_INDEX = "yapp_mask.idx"
+
+# mask data types
+MASK_FORMATS = {"uint8": numpy.uint8,
+                "float32": numpy.float32}
+DEF_MASK_FORMAT = "uint8"
+
+# shapes of the transition from stop to pass at the edges of a notch, as a
+#   function of the fractional distance x (0 to 1) into the taper
+MASK_TAPERS = {"cosine": lambda x: 0.5 * (1.0 - numpy.cos(numpy.pi * x)),
+               "linear": lambda x: x}
+DEF_MASK_TAPER = "cosine"
+
+#
+# parse a band-stop specification of the form <freq>:<width>[:<taper>]
+#
+def ParseStop(Spec):
+    """Return (FCentre, Width, Taper) in Hz, where Taper is the width of the
+    transition on either side of the notch."""
+    Fields = Spec.split(":")
+    if (len(Fields) < 2 or len(Fields) > 3):
+        raise ValueError("Invalid band-stop specification " + Spec)
+    Stop = [float(Field) for Field in Fields]
+    if (2 == len(Stop)):
+        Stop.append(0.0)
+    if (Stop[1] < 0.0 or Stop[2] < 0.0):
+        raise ValueError("Invalid band-stop specification " + Spec)
+    return tuple(Stop)
+
+#
+# read a list of band-stops from a file
+#
+def ReadStopList(FileStops):
+    """Each line contains the centre frequency, the width and, optionally,
+    the taper width of a notch, in Hz, separated by white space. Anything
+    after a '#' is ignored."""
+    Stops = []
+    for Line in open(FileStops, "r"):
+        Line = Line.split("#")[0].strip()
+        if ("" == Line):
+            continue
+        Stops.append(ParseStop(":".join(Line.split())))
+    return Stops
+
+#
+# canonical description of a mask, used to name and index it
+#
+def GetMaskKey(NFFT, TSamp, FLow, FHigh, Stops=[], Taper=DEF_MASK_TAPER,     \
+               Format=DEF_MASK_FORMAT):
+    if (0 == len(Stops)):
+        StopSpec = "-"
+    else:
+        StopSpec = ",".join(["%r:%r:%r" % Stop for Stop in sorted(Stops)])
+    return "%d %r %r %r %s %s %s"                                             \
+           % (NFFT, TSamp, float(FLow), float(FHigh), Format, Taper, StopSpec)
+
+#
+# build the name of a mask file
+#
+def GetMaskFilename(NFFT, TSamp, FLow, FHigh, Stops=[],                       \
+                    Taper=DEF_MASK_TAPER, Format=DEF_MASK_FORMAT):
+    """Plain pass-band byte masks keep the name used by earlier versions;
+    anything else gets a short hash of its description appended."""
+    Name = FILE_MASK_PREFIX                                                   \
+           + "_" + str(NFFT)                                                  \
+           + "_" + str(TSamp)                                                 \
+           + "_" + str(FLow)                                                  \
+           + "_" + str(FHigh)
+    if (len(Stops) > 0 or Format != DEF_MASK_FORMAT):
+        Key = GetMaskKey(NFFT, TSamp, FLow, FHigh, Stops, Taper, Format)
+        Name = Name + "_" + hashlib.sha1(Key.encode("ascii")).hexdigest()[:8]
+    return Name + FILE_MASK_SUFFIX
+
+#
+# generate a filter mask
+#
+def GenMask(NFFT, TSamp, FLow, FHigh, Stops=[], Taper=DEF_MASK_TAPER):
+    """Return the (NFFT / 2) + 1 point frequency response as float32, passing
+    [FLow, FHigh] and stopping each notch in Stops, a list of (FCentre, Width,
+    TaperWidth) in Hz. All band edges are rounded outwards to whole bins."""
+    if Taper not in MASK_TAPERS:
+        raise ValueError("Unknown taper " + Taper)
+    # compute number of usable points in FFT output
+    NUsable = (NFFT / 2) + 1
+    # compute the usable bandwidth and the frequency resolution
+    Bandwidth = (1.0 / TSamp) / 2
+    Res = Bandwidth / NUsable
+
+    # compute the (conservative) indices of FLow and FHigh
+    IdxLow = int(math.floor(FLow / Res))
+    IdxHigh = int(math.ceil(FHigh / Res))
+    if (IdxHigh + 1 > NUsable):
+        raise ValueError("Upper cut-off frequency greater than usable "
+                         "bandwidth")
+
+    Mask = numpy.zeros(NUsable)
+    Mask[IdxLow:IdxHigh+1] = 1.0
+
+    Idx = numpy.arange(NUsable)
+    for (FCentre, Width, TaperWidth) in Stops:
+        StopLow = int(math.floor((FCentre - (Width / 2)) / Res))
+        StopHigh = int(math.ceil((FCentre + (Width / 2)) / Res))
+        # distance of each bin from the stop band, in Hz
+        Dist = numpy.maximum(numpy.maximum(StopLow - Idx, Idx - StopHigh), 0)  \
+               * Res
+        if (TaperWidth > 0.0):
+            Resp = MASK_TAPERS[Taper](numpy.minimum(Dist / TaperWidth, 1.0))
+        else:
+            Resp = (Dist > 0).astype(numpy.float64)
+        Mask *= Resp
+
+    # make sure the DC bin is zero
+    Mask[0] = 0.0
+    return Mask.astype(numpy.float32)
+
+#
+# read the index of masks in a directory
+#
+def ReadMaskIndex(Dir="."):
+    """Return a dictionary mapping mask descriptions to file names."""
+    Index = {}
+    FileIndex = os.path.join(Dir, FILE_MASK_INDEX)
+    if (not os.path.exists(FileIndex)):
+        return Index
+    for Line in open(FileIndex, "r"):
+        if (Line.startswith("#")):
+            continue
+        Fields = Line.split()
+        if (len(Fields) < 2):
+            continue
+        Index[" ".join(Fields[:-1])] = Fields[-1]
+    return Index
+
+#
+# write the index of masks in a directory
+#
+def WriteMaskIndex(Index, Dir="."):
+    def WriteData(fdest):
+        fdest.write("# NFFT TSamp Lower Upper Format Taper Stops Filename\n")
+        for Key in sorted(Index.keys()):
+            fdest.write(Key + " " + Index[Key] + "\n")
+    yapp.WriteFileAtomic(os.path.join(Dir, FILE_MASK_INDEX), WriteData)
+    return
+
+#
+# look up a mask in the index of a directory
+#
+def LookupMask(NFFT, TSamp, FLow, FHigh, Stops=[], Taper=DEF_MASK_TAPER,     \
+               Format=DEF_MASK_FORMAT, Dir="."):
+    """Return the path of a matching mask, or None if there is none."""
+    Key = GetMaskKey(NFFT, TSamp, FLow, FHigh, Stops, Taper, Format)
+    Name = ReadMaskIndex(Dir).get(Key)
+    if (Name is None or not os.path.exists(os.path.join(Dir, Name))):
+        return None
+    return os.path.join(Dir, Name)
+
+#
+# write a mask, re-using an indexed copy if there is one
+#
+def WriteMask(NFFT, TSamp, FLow, FHigh, Stops=[], Taper=DEF_MASK_TAPER,      \
+              Format=DEF_MASK_FORMAT, Dir="."):
+    """Write the mask to Dir and add it to the index there. Returns (path,
+    mask, generated), where generated is False if the mask was already in the
+    index, in which case it is read back from disk."""
+    if Format not in MASK_FORMATS:
+        raise ValueError("Unknown mask format " + Format)
+    FileMask = LookupMask(NFFT, TSamp, FLow, FHigh, Stops, Taper, Format, Dir)
+    if (FileMask is not None):
+        Mask = numpy.fromfile(FileMask, dtype=MASK_FORMATS[Format])
+        return (FileMask, Mask.astype(numpy.float32), False)
+
+    Mask = GenMask(NFFT, TSamp, FLow, FHigh, Stops, Taper)
+    if (MASK_FORMATS[Format] != numpy.float32                                 \
+        and numpy.any((Mask != 0.0) & (Mask != 1.0))):
+        raise ValueError("Tapered masks need to be written as float32")
+    if (not os.path.isdir(Dir)):
+        os.makedirs(Dir)
+    Name = GetMaskFilename(NFFT, TSamp, FLow, FHigh, Stops, Taper, Format)
+    FileMask = os.path.join(Dir, Name)
+    Mask.astype(MASK_FORMATS[Format]).tofile(FileMask)
+
+    Index = ReadMaskIndex(Dir)
+    Index[GetMaskKey(NFFT, TSamp, FLow, FHigh, Stops, Taper, Format)] = Name
+    WriteMaskIndex(Index, Dir)
+    return (FileMask, Mask, True)
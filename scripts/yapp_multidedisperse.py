@@ -0,0 +1,212 @@
+#!/usr/bin/python
+
+# yapp_multidedisperse.py
+# Dedisperse a filterbank file at a range of DMs in a single pass over the
+#   data, writing one time series per DM, as yapp_dedisperse would for each.
+#   Optionally uses two-stage (sub-band) dedispersion for large numbers of DM
+#   trials.
+#
+#   Usage: yapp_multidedisperse.py [options] <data-file>
+
+import sys
+import getopt
+import multiprocessing
+import time
+import numpy
+import yapp_sigproc as sp
+import yapp_dedisp as dedisp
+import yapp_rfi as rfi
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-file>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -d  --dm <dms>                       ",                        \
+          "DMs at which to de-disperse, either as\n",                         \
+          "                                         ",                        \
+          "<dm>[,<dm>...] or <low>:<high>[:<step>]\n",                       \
+          "                                         ",                        \
+          "(default is 10.0; the default step is\n",                          \
+          "                                         ",                        \
+          "set by the tolerance)"
+    print "    -l  --law <law>                      ",                        \
+          "Dispersion law\n",                                                 \
+          "                                         ",                        \
+          "(default is 2.0)"
+    print "    -n  --nsamp <samples>                ",                        \
+          "Number of samples read in one block\n",                            \
+          "                                         ",                        \
+          "(default is 16384 samples)"
+    print "    -b  --nsubband <nsubband>            ",                        \
+          "Number of sub-bands, for two-stage\n",                             \
+          "                                         ",                        \
+          "dedispersion (must be a factor of the\n",                          \
+          "                                         ",                        \
+          "number of channels)"
+    print "    -t  --tolerance <samples>            ",                        \
+          "Dispersion smearing allowed by the\n",                             \
+          "                                         ",                        \
+          "choice of DM trials, in samples\n",                                \
+          "                                         ",                        \
+          "(default is 1.0)"
+    print "    -B  --benchmark                      ",                        \
+          "Compare the throughput of two-stage and\n",                        \
+          "                                         ",                        \
+          "brute-force dedispersion on the first\n",                          \
+          "                                         ",                        \
+          "block of data, and exit"
+    print "    -m  --mask <file>                    ",                        \
+          "RFI mask from yapp_findrfi.py, applied\n",                         \
+          "                                         ",                        \
+          "as the data is read"
+    print "    -j  --jobs <n>                       ",                        \
+          "Number of parallel processes\n",                                   \
+          "                                         ",                        \
+          "(default is the number of CPUs)"
+    print "    -o  --outdir <dir>                   ",                        \
+          "Output directory\n",                                               \
+          "                                         ",                        \
+          "(default is that of the input file)"
+    return
+
+def ParseDMs(Spec, Freqs, TSamp, Tol, Law):
+    "Parses a DM list or range."
+    if (":" in Spec):
+        Fields = [float(Field) for Field in Spec.split(":")]
+        if (2 == len(Fields)):
+            return dedisp.GetDMGrid(Freqs, TSamp, Fields[0], Fields[1], Tol,
+                                    Law)
+        (DMLow, DMHigh, DMStep) = Fields
+        if (DMStep <= 0.0):
+            raise ValueError("DM step must be positive")
+        # include the upper limit, allowing for rounding
+        NDMs = int(numpy.floor(((DMHigh - DMLow) / DMStep) + 1e-6)) + 1
+        return DMLow + (numpy.arange(NDMs) * DMStep)
+    return numpy.array([float(DM) for DM in Spec.split(",")])
+
+def PrintProgress(Done, Total):
+    "Prints the fraction of data processed."
+    sys.stdout.write("\rProcessed %d of %d time samples." % (Done, Total))
+    sys.stdout.flush()
+    return
+
+# defaults
+DMSpec = "10.0"
+Law = dedisp.DEF_LAW
+BlockSize = 16384
+NSubBands = 0
+Tol = dedisp.DEF_DM_TOL
+Benchmark = False
+FileRFIMask = None
+NJobs = multiprocessing.cpu_count()
+OutDir = None
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "hd:l:n:b:t:Bm:j:o:"
+OptsLong = ["help", "dm=", "law=", "nsamp=", "nsubband=", "tolerance=",
+            "benchmark", "mask=", "jobs=", "outdir="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-d", "--dm"):
+            DMSpec = a
+        elif o in ("-l", "--law"):
+            Law = float(a)
+        elif o in ("-n", "--nsamp"):
+            BlockSize = int(a)
+        elif o in ("-b", "--nsubband"):
+            NSubBands = int(a)
+        elif o in ("-t", "--tolerance"):
+            Tol = float(a)
+        elif o in ("-B", "--benchmark"):
+            Benchmark = True
+        elif o in ("-m", "--mask"):
+            FileRFIMask = a
+        elif o in ("-j", "--jobs"):
+            NJobs = int(a)
+        elif o in ("-o", "--outdir"):
+            OutDir = a
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (len(Args) != 1):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (BlockSize <= 0 or NJobs <= 0 or Tol <= 0.0):
+    sys.stderr.write("ERROR: Block size, tolerance and number of jobs must "
+                     + "be positive!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (Benchmark and 0 == NSubBands):
+    sys.stderr.write("ERROR: Benchmark requires the number of sub-bands!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+try:
+    hdr = sp.ReadSIGPROCHeader(Args[0])
+    DMs = ParseDMs(DMSpec, dedisp.GetChanFreqs(hdr), hdr.TSamp, Tol, Law)
+    if (NSubBands > 0):
+        Plan = dedisp.GetSubBandPlan(dedisp.GetChanFreqs(hdr), hdr.TSamp,
+                                     DMs, NSubBands, Tol, Law)
+    RFIMask = None
+    if (FileRFIMask is not None):
+        RFIMask = rfi.ReadRFIMask(FileRFIMask)
+        RFIMask.Check(hdr)
+except (IOError, ValueError), ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+
+if (Benchmark):
+    print "Comparing dedispersion at %d DMs, with %d sub-bands and %d "      \
+          "coarse DMs, on %d time samples."                                  \
+          % (len(DMs), NSubBands, len(Plan[0]), min(BlockSize,
+                                                    hdr.NTimeSamps))
+    (RateBrute, RateSubBand, SNRBrute, SNRSubBand)                            \
+        = dedisp.CompareThroughput(Args[0], DMs, NSubBands, Law, BlockSize,
+                                   Tol)
+    print "Brute force                       : %.1f DM trials/s" % RateBrute
+    print "Two-stage                         : %.1f DM trials/s" % RateSubBand
+    print "Speed-up                          : %.2f" % (RateSubBand / RateBrute)
+    print "Peak S/N, brute force             : %.2f" % SNRBrute
+    print "Peak S/N, two-stage               : %.2f" % SNRSubBand
+    sys.exit()
+
+print "Dedispersing at %d DMs, from %g to %g."                                \
+      % (len(DMs), DMs.min(), DMs.max())
+if (NSubBands > 0):
+    print "Using %d sub-bands, and %d coarse DMs."                            \
+          % (NSubBands, len(Plan[0]))
+tStart = time.time()
+try:
+    Files = dedisp.DedisperseFile(Args[0], DMs, Law, BlockSize, NJobs,
+                                  OutDir, PrintProgress, NSubBands, Tol,
+                                  RFIMask)
+except (IOError, ValueError), ErrMsg:
+    sys.stderr.write("\nERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+print "\nWrote %d time series in %.3f s." % (len(Files), time.time() - tStart)
+print "DONE!"
@@ -0,0 +1,109 @@
+#!/usr/bin/python
+
+# yapp_multifilter.py
+# Filter many time series, such as the dedispersed time series of all DM
+#   trials or beams, with a filter mask from yapp_genfiltermask.py, in a
+#   single pass, by overlap-save.
+#
+#   Usage: yapp_multifilter.py [options] <data-files>
+
+import sys
+import os
+import getopt
+import yapp_filtering as filt
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-files>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -f  --filter <file>                  ",                        \
+          "Filter mask filename"
+    print "    -F  --float-mask                     ",                        \
+          "Filter mask is single-precision\n",                                \
+          "                                         ",                        \
+          "floating-point\n",                                                 \
+          "                                         ",                        \
+          "(default is bytes)"
+    print "    -b  --block <samples>                ",                        \
+          "Length of the FFT used to filter a\n",                             \
+          "                                         ",                        \
+          "block (default is 8 times the length\n",                           \
+          "                                         ",                        \
+          "of the FFT of the mask)"
+    print "    -o  --outdir <dir>                   ",                        \
+          "Output directory\n",                                               \
+          "                                         ",                        \
+          "(default is the current directory)"
+    return
+
+def PrintProgress(Done, Total):
+    "Prints the fraction of data processed."
+    sys.stdout.write("\rFiltered %d of %d time samples." % (Done, Total))
+    sys.stdout.flush()
+    return
+
+# defaults
+FileMask = None
+IsFloat = False
+NBlock = None
+OutDir = None
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "hf:Fb:o:"
+OptsLong = ["help", "filter=", "float-mask", "block=", "outdir="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-f", "--filter"):
+            FileMask = a
+        elif o in ("-F", "--float-mask"):
+            IsFloat = True
+        elif o in ("-b", "--block"):
+            NBlock = int(a)
+        elif o in ("-o", "--outdir"):
+            OutDir = a
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (0 == len(Args)):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (FileMask is None):
+    sys.stderr.write("ERROR: Filter mask not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+try:
+    if (OutDir is not None and not os.path.isdir(OutDir)):
+        os.makedirs(OutDir)
+    Mask = filt.ReadMask(FileMask, IsFloat)
+    Files = filt.FilterFiles(Args, Mask, NBlock, OutDir, PrintProgress)
+except (IOError, OSError, ValueError), ErrMsg:
+    sys.stderr.write("\nERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+
+print "\nWrote %d filtered time series." % len(Files)
+print "DONE!"
@@ -0,0 +1,245 @@
+#!/usr/bin/python
+
+# yapp_multifold.py
+# Fold a filterbank file or a dedispersed time series at a set of trial
+#   periods in a single pass over the data, writing one folded profile (or
+#   profile stack, for sub-bands) per period. Optionally calibrates the
+#   profiles.
+#
+#   Usage: yapp_multifold.py [options] <data-file>
+
+import os
+import sys
+import getopt
+import math
+import numpy
+import yapp_sigproc as sp
+import yapp_common as yapp
+import yapp_folding as folding
+import yapp_rfi as rfi
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-file>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -t  --period <periods>               ",                        \
+          "Folding periods in milliseconds, either\n",                        \
+          "                                         ",                        \
+          "as <p>[,<p>...] or <low>:<high>:<step>"
+    print "    -d  --pdot <pdot>                    ",                        \
+          "Period derivative in s/s\n",                                       \
+          "                                         ",                        \
+          "(default is 0)"
+    print "    -b  --nbins <nbins>                  ",                        \
+          "Number of phase bins\n",                                           \
+          "                                         ",                        \
+          "(default is the number of samples in\n",                           \
+          "                                         ",                        \
+          "the shortest period)"
+    print "    -s  --nsubint <nsubint>              ",                        \
+          "Number of sub-integrations\n",                                     \
+          "                                         ",                        \
+          "(default is 1)"
+    print "    -f  --nsubband <nsubband>            ",                        \
+          "Number of sub-bands, for filterbank\n",                            \
+          "                                         ",                        \
+          "data (default is 1)"
+    print "    -n  --nsamp <samples>                ",                        \
+          "Number of samples read in one block\n",                            \
+          "                                         ",                        \
+          "(default is 65536 samples)"
+    print "    -T  --tsys <tsys>                    ",                        \
+          "System temperature in K, to calibrate\n",                          \
+          "                                         ",                        \
+          "the profiles"
+    print "    -G  --gain <gain>                    ",                        \
+          "Gain in K/Jy"
+    print "    -N  --npol <npol>                    ",                        \
+          "Number of polarisations\n",                                        \
+          "                                         ",                        \
+          "(default is 2)"
+    print "    -r  --onrange <start>:<stop>         ",                        \
+          "Start and end phase of pulse"
+    print "    -B  --basefit <order>                ",                        \
+          "Do polynomial-fit baseline subtraction\n",                         \
+          "                                         ",                        \
+          "with given order"
+    print "    -m  --mask <file>                    ",                        \
+          "RFI mask from yapp_findrfi.py, applied\n",                         \
+          "                                         ",                        \
+          "as the data is read"
+    print "    -o  --outdir <dir>                   ",                        \
+          "Output directory\n",                                               \
+          "                                         ",                        \
+          "(default is that of the input file)"
+    return
+
+def ParsePeriods(Spec):
+    "Parses a period list or range, in ms."
+    if (":" in Spec):
+        (PLow, PHigh, PStep) = [float(Field) for Field in Spec.split(":")]
+        if (PStep <= 0.0):
+            raise ValueError("Period step must be positive")
+        # include the upper limit, allowing for rounding
+        NPeriods = int(numpy.floor(((PHigh - PLow) / PStep) + 1e-6)) + 1
+        return PLow + (numpy.arange(NPeriods) * PStep)
+    return numpy.array([float(Period) for Period in Spec.split(",")])
+
+def PrintProgress(Done, Total):
+    "Prints the fraction of data processed."
+    sys.stdout.write("\rProcessed %d of %d time samples." % (Done, Total))
+    sys.stdout.flush()
+    return
+
+# defaults
+PeriodSpec = None
+PDot = 0.0
+NBins = 0
+NSubInts = 1
+NSubBands = 1
+BlockSize = folding.DEF_SIZE_BLOCK
+Tsys = 0.0
+G = 0.0
+NPol = 2
+OnRange = None
+polyOrder = 0
+FileRFIMask = None
+OutDir = None
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "ht:d:b:s:f:n:T:G:N:r:B:m:o:"
+OptsLong = ["help", "period=", "pdot=", "nbins=", "nsubint=", "nsubband=",
+            "nsamp=", "tsys=", "gain=", "npol=", "onrange=", "basefit=",
+            "mask=", "outdir="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-t", "--period"):
+            PeriodSpec = a
+        elif o in ("-d", "--pdot"):
+            PDot = float(a)
+        elif o in ("-b", "--nbins"):
+            NBins = int(a)
+        elif o in ("-s", "--nsubint"):
+            NSubInts = int(a)
+        elif o in ("-f", "--nsubband"):
+            NSubBands = int(a)
+        elif o in ("-n", "--nsamp"):
+            BlockSize = int(a)
+        elif o in ("-T", "--tsys"):
+            Tsys = float(a)
+        elif o in ("-G", "--gain"):
+            G = float(a)
+        elif o in ("-N", "--npol"):
+            NPol = int(a)
+        elif o in ("-r", "--onrange"):
+            OnRange = [float(Phase) for Phase in a.split(":")]
+            if (len(OnRange) != 2):
+                raise ValueError("Invalid pulse phase range " + a)
+        elif o in ("-B", "--basefit"):
+            polyOrder = int(a)
+        elif o in ("-m", "--mask"):
+            FileRFIMask = a
+        elif o in ("-o", "--outdir"):
+            OutDir = a
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+    if (PeriodSpec is not None):
+        Periods = ParsePeriods(PeriodSpec) / 1e3    # in s
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (len(Args) != 1):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (PeriodSpec is None or numpy.any(Periods <= 0.0)):
+    sys.stderr.write("ERROR: Folding period not specified, or not "
+                     + "positive!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (BlockSize <= 0):
+    sys.stderr.write("ERROR: Block size must be positive!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (Tsys != 0.0 and (0.0 == G or OnRange is None)):
+    sys.stderr.write("ERROR: Calibration needs the gain and the pulse phase "
+                     + "range!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+Trials = [(Period, PDot) for Period in Periods]
+try:
+    if (OutDir is not None and not os.path.isdir(OutDir)):
+        os.makedirs(OutDir)
+    RFIMask = None
+    if (FileRFIMask is not None):
+        RFIMask = rfi.ReadRFIMask(FileRFIMask)
+    if (0 == NBins):
+        # as in yapp_fold, one bin per sample
+        hdr = sp.ReadSIGPROCHeader(Args[0])
+        NBins = int(math.floor(Periods.min() / hdr.TSamp))
+    print "Folding at %d periods, with %d bins, %d sub-integrations and %d "  \
+          "sub-bands." % (len(Trials), NBins, NSubInts, NSubBands)
+    (hdr, Cubes, Counts)                                                      \
+        = folding.FoldFile(Args[0], Trials, NBins, NSubInts, NSubBands,
+                           BlockSize, PrintProgress, RFIMask)
+except (IOError, OSError, ValueError), ErrMsg:
+    sys.stderr.write("\nERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+print
+
+hdrs = folding.GetBandHeaders(hdr, NSubBands)
+try:
+    for (i, Period) in enumerate(Periods):
+        Base = folding.GetFoldBasename(Args[0], Period, OutDir)
+        Profiles = folding.GetBandProfiles(Cubes[i], Counts[i])
+        DeltaS = [None] * NSubBands
+        if (Tsys != 0.0):
+            onBin = int(OnRange[0] * NBins)
+            offBin = int(OnRange[1] * NBins)
+            (Profiles, DeltaS)                                                \
+                = folding.CalBandProfiles(Profiles, hdrs, onBin, offBin,
+                                          Tsys, G, NPol, polyOrder)
+            for (hdrBand, DeltaSBand) in zip(hdrs, DeltaS):
+                hdrBand.DeltaS = DeltaSBand
+        if (1 == NSubBands):
+            FileProf = Base + ".ypr"
+            yapp.WriteProf(FileProf, hdrs[0],
+                           Profiles[0].astype(numpy.float32), DeltaS[0])
+        else:
+            FileProf = Base + yapp.EXT_PROFSTACK
+            yapp.WriteProfStack(FileProf, hdrs, Profiles)
+        print "Wrote " + FileProf + "."
+        if (NSubInts > 1):
+            FileCube = Base + ".npy"
+            numpy.save(FileCube, folding.GetMeanCube(Cubes[i], Counts[i])
+                                        .astype(numpy.float32))
+            print "Wrote " + FileCube + "."
+except (IOError, OSError, ValueError), ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+
+print "DONE!"
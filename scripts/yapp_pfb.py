@@ -0,0 +1,283 @@
+#!/usr/bin/python
+
+#
+# yapp_pfb.py
+# Polyphase filterbank (PFB) functions
+#
+
+import os
+import errno
+import hashlib
+import itertools
+import multiprocessing
+import shutil
+import numpy
+import yapp_common as yapp
+import yapp_sigproc as sp
+
+# PFB coefficient file naming, as expected by yapp_ft
+FILE_COEFF_PREFIX = "coeff"
+FILE_COEFF_SUFFIX = ".dat"
+
+# supported window functions
+PFB_WINDOWS = {"hanning": numpy.hanning,
+               "hamming": numpy.hamming,
+               "blackman": numpy.blackman,
+               "bartlett": numpy.bartlett,
+               "rect": numpy.ones}
+DEF_PFB_WINDOW = "hanning"
+
+# environment variable naming the default coefficient cache directory
+ENV_CACHE_DIR = "YAPP_CACHE_DIR"
+
+# baseband data, as read by yapp_ft: 8-bit signed samples with Re(X), Im(X),
+#   Re(Y), Im(Y) interleaved
+NUM_BYTES_PER_SAMP = 4
+DEF_NTAPS = 8
+DEF_NFFT = 1024
+
+# default number of spectra channelised in one block
+DEF_SIZE_BLOCK = 1024
+
+#
+# build the name of a coefficient file
+#
+def GetCoeffFilename(NTaps, NFFT, NSubBands=1):
+    return FILE_COEFF_PREFIX                                                  \
+           + "_" + str(NTaps)                                                 \
+           + "_" + str(NFFT)                                                  \
+           + "_" + str(NSubBands)                                             \
+           + FILE_COEFF_SUFFIX
+
+#
+# generate PFB filter coefficients
+#
+def GenCoeff(NTaps, NFFT, NSubBands=1, Window=DEF_PFB_WINDOW):
+    """Return the NTaps * NFFT PFB pre-filter coefficients as float32, a sinc
+    function modulated by the given window. Each coefficient is repeated
+    NSubBands times, so that the coefficients for all sub-bands of a sample
+    are contiguous."""
+    if Window not in PFB_WINDOWS:
+        raise ValueError("Unknown window function " + Window)
+    M = NTaps * NFFT
+    X = (numpy.arange(M, dtype=numpy.float64) / NFFT) - (float(NTaps) / 2)
+    PFBCoeff = numpy.sinc(X) * PFB_WINDOWS[Window](M)
+    return numpy.repeat(PFBCoeff.astype(numpy.float32), NSubBands)
+
+#
+# get the coefficient cache entry for a set of parameters
+#
+def GetCachePath(CacheDir, NTaps, NFFT, NSubBands=1, Window=DEF_PFB_WINDOW):
+    """The cache is addressed by a hash of everything that determines the
+    contents of the coefficient file."""
+    Key = "pfbcoeff:1:%d:%d:%d:%s" % (NTaps, NFFT, NSubBands, Window)
+    Digest = hashlib.sha1(Key.encode("ascii")).hexdigest()
+    return os.path.join(CacheDir, "pfbcoeff", Digest + FILE_COEFF_SUFFIX)
+
+#
+# link or copy a file
+#
+def _LinkOrCopy(Src, Dest):
+    try:
+        os.link(Src, Dest)
+    except OSError:
+        # different file system, or links not supported
+        shutil.copyfile(Src, Dest)
+    return
+
+#
+# write coefficients, re-using a cached copy if there is one
+#
+def WriteCoeff(NTaps, NFFT, NSubBands=1, Window=DEF_PFB_WINDOW,             \
+               Dir=".", CacheDir=None):
+    """Write coeff_<ntaps>_<nfft>_<nsubbands>.dat to Dir. If CacheDir is given,
+    the file is linked from the cache if present there, and is added to the
+    cache otherwise. Returns (path, generated), where generated is False if
+    the coefficients were taken from the cache."""
+    FileCoeff = os.path.join(Dir, GetCoeffFilename(NTaps, NFFT, NSubBands))
+    # never write through an existing file, as it may be a link into the cache
+    if (os.path.lexists(FileCoeff)):
+        os.remove(FileCoeff)
+    if (CacheDir is None):
+        GenCoeff(NTaps, NFFT, NSubBands, Window).tofile(FileCoeff)
+        return (FileCoeff, True)
+
+    FileCache = GetCachePath(CacheDir, NTaps, NFFT, NSubBands, Window)
+    Generated = False
+    if (not os.path.exists(FileCache)):
+        try:
+            os.makedirs(os.path.dirname(FileCache))
+        except OSError as Err:
+            if (Err.errno != errno.EEXIST):
+                raise
+        # concurrent pipelines never see a partially written cache entry
+        Coeff = GenCoeff(NTaps, NFFT, NSubBands, Window)
+        yapp.WriteFileAtomic(FileCache, Coeff.tofile, "wb")
+        Generated = True
+    _LinkOrCopy(FileCache, FileCoeff)
+    return (FileCoeff, Generated)
+
+#
+# read coefficients written by yapp_genpfbcoeff.py
+#
+def ReadCoeff(FileCoeff, NTaps, NFFT, NSubBands=1):
+    """Return the coefficients as an (NTaps, NFFT) float32 array, using the
+    first sub-band."""
+    Coeff = numpy.fromfile(FileCoeff, dtype=numpy.float32)
+    if (len(Coeff) != NTaps * NFFT * NSubBands):
+        raise ValueError("%s has %d coefficients, expected %d"               \
+                         % (FileCoeff, len(Coeff), NTaps * NFFT * NSubBands))
+    return Coeff[::NSubBands].reshape(NTaps, NFFT)
+
+#
+# open dual-polarisation baseband data
+#
+def ReadBaseband(FileData, NFFT):
+    """Return a read-only memory map of shape (NFrames, NFFT, 4) of the
+    baseband data, one frame of NFFT samples per row. Samples at the end that
+    do not fill a frame are left out, as by yapp_ft."""
+    NFrames = os.path.getsize(FileData) // (NFFT * NUM_BYTES_PER_SAMP)
+    if (0 == NFrames):
+        raise ValueError("%s has less than %d samples" % (FileData, NFFT))
+    return numpy.memmap(FileData, dtype=numpy.int8, mode="r",
+                        shape=(NFrames, NFFT, NUM_BYTES_PER_SAMP))
+
+#
+# get the number of spectra in a number of frames
+#
+def GetNumSpectra(NFrames, NTaps):
+    """Return the number of spectra, one per frame once the first NTaps
+    frames have been read, as in yapp_ft."""
+    return max(NFrames - NTaps + 1, 0)
+
+#
+# channelise a block of baseband data
+#
+def PFBSpectra(Frames, Coeff):
+    """Frames is an (NSpectra + NTaps - 1, NFFT, 4) array of baseband frames
+    and Coeff the (NTaps, NFFT) coefficients. Spectrum i is the FFT of the
+    sum over taps j of frame i + j weighted by Coeff[j], as in DoPFB() of
+    yapp_ft. The FIR of all spectra is a single tensor contraction over a
+    strided view of the frames, and the FFTs of both polarisations of all
+    spectra are done in one batched call. Returns an (NSpectra, NFFT, 2)
+    complex array, in FFT order, with X and Y in the last axis."""
+    (NTaps, NFFT) = Coeff.shape
+    # the filtered samples must be float32 to be viewed as complex64
+    Coeff = numpy.asarray(Coeff, dtype=numpy.float32)
+    Frames = numpy.ascontiguousarray(Frames, dtype=numpy.float32)
+    NSpectra = GetNumSpectra(len(Frames), NTaps)
+    # (spectrum, tap, sample, component) view, without copying
+    Taps = numpy.lib.stride_tricks.as_strided(Frames,
+                                              shape=(NSpectra, NTaps, NFFT,
+                                                     NUM_BYTES_PER_SAMP),
+                                              strides=((Frames.strides[0],)
+                                                       + Frames.strides))
+    Filtered = numpy.einsum("stkc,tk->skc", Taps, Coeff)
+    # Re and Im of each polarisation are adjacent, so they can be viewed as
+    #   complex values
+    return numpy.fft.fft(Filtered.view(numpy.complex64), axis=1)
+
+#
+# channelise a block of baseband data to total power
+#
+def PFBPower(Frames, Coeff, NAcc=1):
+    """Return the total power, |X|^2 + |Y|^2, of the spectra of Frames (see
+    PFBSpectra()), summed over NAcc spectra at a time, as an
+    (NSpectra / NAcc, NFFT) float32 array with the channels in increasing
+    order of frequency."""
+    Spectra = PFBSpectra(Frames, Coeff)
+    Power = (Spectra.real ** 2 + Spectra.imag ** 2).sum(axis=2)
+    NOut = len(Power) // NAcc
+    Power = Power[:NOut*NAcc].reshape(NOut, NAcc, Power.shape[1]).sum(axis=1)
+    return numpy.fft.fftshift(Power, axes=1).astype(numpy.float32)
+
+# coefficients shared with the worker processes
+_Shared = {}
+
+def _InitWorker(Coeff):
+    _Shared["Coeff"] = Coeff
+    return
+
+def _PFBPowerTask(Task):
+    (FileData, FirstSpec, NSpectra, NAcc) = Task
+    Coeff = _Shared["Coeff"]
+    (NTaps, NFFT) = Coeff.shape
+    Frames = ReadBaseband(FileData, NFFT)
+    return PFBPower(Frames[FirstSpec:FirstSpec+NSpectra+NTaps-1], Coeff, NAcc)
+
+#
+# get the header of channelised data
+#
+def GetChannelisedHeader(NFFT, NAcc, TSamp, FCentre, NTimeSamps, Site="",    \
+                         Pulsar=""):
+    """Return a yapp_sigproc.SIGPROCHeader for the total power written by
+    ChanneliseFile(), for baseband data with a sampling interval of TSamp
+    seconds, centred on FCentre MHz."""
+    hdr = sp.SIGPROCHeader()
+    hdr.Site = Site
+    hdr.Pulsar = Pulsar
+    hdr.NChans = NFFT
+    hdr.NBits = 32
+    hdr.TSamp = TSamp * NFFT * NAcc
+    hdr.NTimeSamps = NTimeSamps
+    hdr.ChanBW = (1.0 / (TSamp * NFFT)) / 1e6
+    # channel NFFT / 2 is centred on the centre frequency
+    hdr.FMin = FCentre - ((NFFT // 2) * hdr.ChanBW)
+    hdr.FMax = hdr.FMin + ((NFFT - 1) * hdr.ChanBW)
+    hdr.FChan1 = hdr.FMin
+    hdr.BW = NFFT * hdr.ChanBW
+    hdr.FCentre = (hdr.FMin - (hdr.ChanBW / 2)) + ((NFFT / 2) * hdr.ChanBW)
+    return hdr
+
+#
+# channelise a baseband file
+#
+def ChanneliseFile(FileData, FileOut, Coeff, TSamp, FCentre, NAcc=1,          \
+                   NJobs=1, BlockSize=DEF_SIZE_BLOCK, Site="", Pulsar="",     \
+                   Progress=None):
+    """Channelise baseband data with the (NTaps, NFFT) PFB coefficients
+    Coeff (see ReadCoeff(); a single tap of ones gives a plain FFT, as
+    yapp_ft does without -b), and write the total power, summed over NAcc
+    spectra, to a 32-bit SIGPROC .fil file. The spectra are channelised in
+    blocks of about BlockSize spectra, by NJobs worker processes, and each
+    block is written as soon as it and the blocks before it are done. Returns
+    the number of spectra written."""
+    (NTaps, NFFT) = Coeff.shape
+    Frames = ReadBaseband(FileData, NFFT)
+    NSpectra = GetNumSpectra(len(Frames), NTaps)
+    NOut = NSpectra // NAcc
+    if (0 == NOut):
+        raise ValueError("%s is too short for %d taps and %d accumulations"  \
+                         % (FileData, NTaps, NAcc))
+    del Frames
+    BlockSize = max(1, BlockSize // NAcc) * NAcc
+    Tasks = [(FileData, First, min(BlockSize, (NOut * NAcc) - First), NAcc)
+             for First in range(0, NOut * NAcc, BlockSize)]
+
+    fdest = open(FileOut, "wb")
+    Pool = None
+    try:
+        sp.WriteSIGPROCHeader(fdest,
+                              GetChannelisedHeader(NFFT, NAcc, TSamp, FCentre,
+                                                   NOut, Site, Pulsar))
+        Coeff = numpy.asarray(Coeff, dtype=numpy.float32)
+        if (NJobs > 1 and len(Tasks) > 1):
+            Pool = multiprocessing.Pool(min(NJobs, len(Tasks)), _InitWorker,
+                                        (Coeff,))
+            Blocks = Pool.imap(_PFBPowerTask, Tasks)
+        else:
+            _InitWorker(Coeff)
+            Blocks = itertools.imap(_PFBPowerTask, Tasks)
+        Done = 0
+        for Block in Blocks:
+            Block.tofile(fdest)
+            Done = Done + len(Block)
+            if (Progress is not None):
+                Progress(Done, NOut)
+    finally:
+        if (Pool is not None):
+            Pool.close()
+            Pool.join()
+        _Shared.clear()
+        fdest.close()
+    return NOut
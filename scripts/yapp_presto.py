@@ -0,0 +1,325 @@
+#!/usr/bin/python
+
+#
+# yapp_presto.py
+# PRESTO time series (.dat, with a .inf header file) support, and conversion
+#   and splitting of .tim and .dat time series by rewriting only the header,
+#   based on YAPP_ReadPRESTOHeaderFile() in yapp_common.c and the labels in
+#   yapp_presto.h
+#
+
+import os
+import copy
+import math
+import numpy
+import yapp_sigproc as sp
+
+EXT_DAT = ".dat"
+EXT_INF = ".inf"
+
+INFIX_SPLIT = "split"
+
+# header labels, from yapp_presto.h, padded to the same length
+PR_LEN_LABEL = 40
+PR_LABEL_FILENAME = " Data file name without suffix          "
+PR_LABEL_SITE = " Telescope used                         "
+PR_LABEL_BACKEND = " Instrument used                        "
+PR_LABEL_SRCNAME = " Object being observed                  "
+PR_LABEL_SRCRA = " J2000 Right Ascension (hh:mm:ss.ssss)  "
+PR_LABEL_SRCDEC = " J2000 Declination     (dd:mm:ss.ssss)  "
+PR_LABEL_TSTART = " Epoch of observation (MJD)             "
+PR_LABEL_BARYCEN = " Barycentered?           (1=yes, 0=no)  "
+PR_LABEL_PSRCEN = " Pulsar-centered?        (1=yes, 0=no)  "
+PR_LABEL_NSAMPS = " Number of bins in the time series      "
+PR_LABEL_TSAMP = " Width of each time series bin (sec)    "
+PR_LABEL_BREAKS = " Any breaks in the data? (1=yes, 0=no)  "
+PR_LABEL_OBSTYPE = " Type of observation (EM band)          "
+PR_LABEL_DM = " Dispersion measure (cm-3 pc)           "
+PR_LABEL_FMIN = " Central freq of low channel (Mhz)      "
+PR_LABEL_BW = " Total bandwidth (Mhz)                  "
+PR_LABEL_NCHANS = " Number of channels                     "
+PR_LABEL_CHANBW = " Channel bandwidth (Mhz)                "
+
+# time series are single-precision floating-point
+SAMP_TYPE = numpy.dtype("<f4")
+
+# largest block copied at a time, in bytes
+SIZE_COPY = 64 * 1024 * 1024
+
+#
+# convert between sexagesimal strings and degrees, as in yapp_common.c
+#
+def RAString2Double(RA):
+    (Hour, Min, Sec) = [float(Field) for Field in RA.split(":")]
+    return (Hour + (Min / 60) + (Sec / 3600)) * sp.DEG_PER_HOUR
+
+def RADouble2String(RA):
+    Hours = RA / sp.DEG_PER_HOUR
+    Hour = int(Hours)
+    Min = int((Hours - Hour) * 60)
+    Sec = (((Hours - Hour) * 60) - Min) * 60
+    return "%.2d:%.2d:%.7g" % (Hour, Min, Sec)
+
+def DecString2Double(Dec):
+    (Deg, Min, Sec) = [float(Field) for Field in Dec.split(":")]
+    Sign = -1.0 if Dec.strip().startswith("-") else 1.0
+    return Sign * (abs(Deg) + (Min / 60) + (Sec / 3600))
+
+def DecDouble2String(Dec):
+    Neg = "-" if Dec < 0.0 else ""
+    Dec = abs(Dec)
+    Deg = int(Dec)
+    Min = int((Dec - Deg) * 60)
+    Sec = (((Dec - Deg) * 60) - Min) * 60
+    return "%s%.2d:%.2d:%.7g" % (Neg, Deg, Min, Sec)
+
+#
+# get the name of the header file of a .dat file
+#
+def GetINFFilename(FileDat):
+    return os.path.splitext(FileDat)[0] + EXT_INF
+
+#
+# read the header file of a .dat file
+#
+def ReadINFHeader(FileDat):
+    """Parse the .inf file of a .dat file into a yapp_sigproc.SIGPROCHeader,
+    with the derived quantities calculated as in
+    YAPP_ReadPRESTOHeaderFile(). NChans is the number of channels that the
+    time series was made from."""
+    hdr = sp.SIGPROCHeader()
+    FileInf = GetINFFilename(FileDat)
+    fsrc = open(FileInf, "r")
+    for line in fsrc:
+        (Label, Sep, Value) = line.rpartition("=")
+        if (Sep != "=" or 0 == len(Value.split())):
+            continue
+        Label = line[:PR_LEN_LABEL]
+        Value = Value.split()[0]
+        if (PR_LABEL_SITE == Label):
+            hdr.Site = Value
+        elif (PR_LABEL_BACKEND == Label):
+            hdr.BackendID = int(Value)
+        elif (PR_LABEL_SRCNAME == Label):
+            hdr.Pulsar = Value
+        elif (PR_LABEL_SRCRA == Label):
+            hdr.SourceRA = RAString2Double(Value)
+        elif (PR_LABEL_SRCDEC == Label):
+            hdr.SourceDec = DecString2Double(Value)
+        elif (PR_LABEL_TSTART == Label):
+            hdr.TStart = float(Value)
+        elif (PR_LABEL_BARYCEN == Label):
+            hdr.FlagBaryCen = int(Value)
+        elif (PR_LABEL_PSRCEN == Label):
+            hdr.Fields[sp.SP_LABEL_FLAGPSRCEN] = int(Value)
+        elif (PR_LABEL_NSAMPS == Label):
+            hdr.NTimeSamps = int(Value)
+        elif (PR_LABEL_TSAMP == Label):
+            hdr.TSamp = float(Value)
+        elif (PR_LABEL_DM == Label):
+            hdr.DM = float(Value)
+        elif (PR_LABEL_FMIN == Label):
+            hdr.FMin = float(Value)
+        elif (PR_LABEL_NCHANS == Label):
+            hdr.NChans = int(Value)
+        elif (PR_LABEL_CHANBW == Label):
+            hdr.ChanBW = float(Value)
+    fsrc.close()
+
+    # calculate the bandwidth (even though it has been read) and the centre
+    #   frequency
+    hdr.FChan1 = hdr.FMin
+    sp.SetBandFromFChan1(hdr)
+    hdr.NBits = 32
+    hdr.HeaderLen = 0
+    # trust the size of the data over the header
+    hdr.NTimeSamps = os.path.getsize(FileDat) // SAMP_TYPE.itemsize
+    return hdr
+
+#
+# write the header file of a .dat file
+#
+def WriteINFHeader(FileDat, hdr):
+    """Write the .inf file of a .dat file, with the same fields as
+    YAPP_WriteMetadata()."""
+    Base = os.path.splitext(os.path.basename(FileDat))[0]
+    fdest = open(GetINFFilename(FileDat), "w")
+    fdest.write(PR_LABEL_FILENAME + "=  %s\n" % Base)
+    fdest.write(PR_LABEL_SITE + "=  %s\n" % hdr.Site)
+    fdest.write(PR_LABEL_BACKEND + "=  %d\n" % hdr.BackendID)
+    fdest.write(PR_LABEL_SRCNAME + "=  %s\n" % hdr.Pulsar)
+    fdest.write(PR_LABEL_SRCRA + "=  %s\n" % RADouble2String(hdr.SourceRA))
+    fdest.write(PR_LABEL_SRCDEC + "=  %s\n" % DecDouble2String(hdr.SourceDec))
+    fdest.write(PR_LABEL_TSTART + "=  %.15g\n" % hdr.TStart)
+    fdest.write(PR_LABEL_BARYCEN + "=  %d\n" % hdr.FlagBaryCen)
+    fdest.write(PR_LABEL_PSRCEN + "=  %d\n"
+                % hdr.Fields.get(sp.SP_LABEL_FLAGPSRCEN, 0))
+    fdest.write(PR_LABEL_NSAMPS + "=  %d\n" % hdr.NTimeSamps)
+    fdest.write(PR_LABEL_TSAMP + "=  %.10g\n" % hdr.TSamp)
+    fdest.write(PR_LABEL_BREAKS + "=  0\n")
+    fdest.write(PR_LABEL_OBSTYPE + "=  Radio\n")
+    fdest.write(PR_LABEL_DM + "=  %g\n" % hdr.DM)
+    fdest.write(PR_LABEL_FMIN + "=  %.10g\n" % hdr.FMin)
+    fdest.write(PR_LABEL_BW + "=  %.10g\n" % hdr.BW)
+    fdest.write(PR_LABEL_NCHANS + "=  %d\n" % hdr.NChans)
+    fdest.write(PR_LABEL_CHANBW + "=  %.10g\n" % abs(hdr.ChanBW))
+    fdest.close()
+    return
+
+#
+# read the header of a time series
+#
+def ReadSeriesHeader(FileSpec):
+    """Return the header of a .tim or .dat file. For .tim files, NChans is
+    the number of channels that the time series was made from, as for .dat
+    files, and not 1."""
+    if (EXT_DAT == os.path.splitext(FileSpec)[1]):
+        return ReadINFHeader(FileSpec)
+    hdr = sp.ReadSIGPROCHeader(FileSpec)
+    if (hdr.NBits != 32):
+        raise ValueError("Unsupported number of bits %d in %s; only "
+                         "single-precision floating-point time series are "
+                         "supported" % (hdr.NBits, FileSpec))
+    hdr.NChans = hdr.Fields.get(sp.SP_LABEL_NUMCHANS, 1)
+    return hdr
+
+#
+# open a time series
+#
+def ReadSeries(FileSpec, hdr=None):
+    """Return (hdr, data) for a .tim or .dat file, where data is a read-only
+    float32 memory map of the NTimeSamps samples."""
+    if (hdr is None):
+        hdr = ReadSeriesHeader(FileSpec)
+    Data = numpy.memmap(FileSpec, dtype=SAMP_TYPE, mode="r",
+                        offset=hdr.HeaderLen, shape=(hdr.NTimeSamps,))
+    return (hdr, Data)
+
+#
+# copy a byte range from one file to another without reading it into Python
+#
+def CopyRange(FileSrc, Offset, Length, fdest):
+    """Copy Length bytes starting at Offset in FileSrc to the current
+    position of the open file fdest. os.copy_file_range() or os.sendfile()
+    is used where available, so that the data is copied within the kernel,
+    and the data is copied in blocks otherwise."""
+    fdest.flush()
+    fsrc = open(FileSrc, "rb")
+    try:
+        if (hasattr(os, "copy_file_range") or hasattr(os, "sendfile")):
+            Done = 0
+            while (Done < Length):
+                Count = min(Length - Done, SIZE_COPY)
+                if (hasattr(os, "copy_file_range")):
+                    Count = os.copy_file_range(fsrc.fileno(), fdest.fileno(),
+                                               Count, Offset + Done)
+                else:
+                    Count = os.sendfile(fdest.fileno(), fsrc.fileno(),
+                                        Offset + Done, Count)
+                if (0 == Count):
+                    raise IOError("Unexpected end of data in " + FileSrc)
+                Done += Count
+            # both calls write at the file position of fdest, but not through
+            #   the Python file object
+            fdest.seek(0, os.SEEK_END)
+        else:
+            fsrc.seek(Offset)
+            Done = 0
+            while (Done < Length):
+                Buf = fsrc.read(min(Length - Done, SIZE_COPY))
+                if (0 == len(Buf)):
+                    raise IOError("Unexpected end of data in " + FileSrc)
+                fdest.write(Buf)
+                Done += len(Buf)
+    finally:
+        fsrc.close()
+    return
+
+#
+# write a time series that shares its samples with an existing file
+#
+def WriteSeries(FileOut, hdr, FileSrc, hdrSrc, Start=0, NSamps=None):
+    """Write NSamps samples of FileSrc (with header hdrSrc), starting at
+    sample Start, to FileOut, with the header hdr, in the format given by the
+    extension of FileOut. Only the header is rewritten: the samples are
+    copied within the kernel where possible, and if FileOut is a .dat file
+    that holds all samples of a .dat file, it is hard-linked to FileSrc."""
+    if (NSamps is None):
+        NSamps = hdrSrc.NTimeSamps - Start
+    hdr = copy.copy(hdr)
+    hdr.NTimeSamps = NSamps
+    Offset = hdrSrc.HeaderLen + (Start * SAMP_TYPE.itemsize)
+    Length = NSamps * SAMP_TYPE.itemsize
+    if (os.path.exists(FileOut)):
+        if (os.path.samefile(FileOut, FileSrc)):
+            raise ValueError("Output file " + FileOut + " is the input file")
+        os.remove(FileOut)
+    if (EXT_DAT == os.path.splitext(FileOut)[1]):
+        WriteINFHeader(FileOut, hdr)
+        if (0 == Offset and NSamps == hdrSrc.NTimeSamps                       \
+            and Length == os.path.getsize(FileSrc)):
+            try:
+                os.link(FileSrc, FileOut)
+                return
+            except OSError:
+                # e.g., on another file system
+                pass
+        fdest = open(FileOut, "wb")
+    else:
+        fdest = open(FileOut, "wb")
+        sp.WriteSIGPROCHeader(fdest, hdr, IsTim=True)
+    try:
+        CopyRange(FileSrc, Offset, Length, fdest)
+    finally:
+        fdest.close()
+    return
+
+#
+# get the sections of a time series
+#
+def GetSections(hdr, SampsPerSect):
+    """Return a list of (start sample, number of samples) for splitting a
+    time series into sections of SampsPerSect samples. As in yapp_split, the
+    last section is the last SampsPerSect samples, and may overlap the one
+    before it."""
+    if (SampsPerSect >= hdr.NTimeSamps):
+        return [(0, hdr.NTimeSamps)]
+    NSects = int(math.ceil(float(hdr.NTimeSamps) / SampsPerSect))
+    Starts = [i * SampsPerSect for i in range(NSects - 1)]
+    Starts.append(hdr.NTimeSamps - SampsPerSect)
+    return [(Start, SampsPerSect) for Start in Starts]
+
+#
+# split a time series into views
+#
+def SplitSeries(hdr, Data, SampsPerSect):
+    """Return a list of (header, view) for each section of a time series
+    opened with ReadSeries(), where each view is a slice of the memory map,
+    so that no samples are copied. The start time of each header is that of
+    the first sample of its section."""
+    Sects = []
+    for (Start, NSamps) in GetSections(hdr, SampsPerSect):
+        Sects.append((GetSectionHeader(hdr, Start, NSamps),
+                      Data[Start:Start+NSamps]))
+    return Sects
+
+#
+# build the header of a section of a time series
+#
+def GetSectionHeader(hdr, Start, NSamps):
+    hdrSect = copy.copy(hdr)
+    hdrSect.Fields = dict(hdr.Fields)
+    hdrSect.NTimeSamps = NSamps
+    hdrSect.TStart = hdr.TStart + ((Start * hdr.TSamp) / 86400)
+    return hdrSect
+
+#
+# build the name of a converted or split time series
+#
+def GetSeriesFilename(FileSpec, Ext, Sect=None, OutDir=""):
+    """Return <dir>/<base>[.split<sect>]<ext>, where <dir> is the current
+    directory by default, as for yapp_split and yapp_tim2dat."""
+    Base = os.path.splitext(os.path.basename(FileSpec))[0]
+    if (Sect is not None):
+        Base = Base + "." + INFIX_SPLIT + str(Sect)
+    return os.path.join(OutDir, Base + Ext)
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+#
+# yapp_profindex.py
+# Per-directory index of folded profile (.ypr) headers, so that bands can be
+#   selected and sorted by frequency without opening every profile
+#
+
+import os
+import yapp_common as yapp
+
+INDEX_FILENAME = ".yapp_profindex"
+INDEX_VERSION = 1
+
+# the fields of an index line, the file name being last so that it may
+#   contain spaces
+INDEX_FIELDS = ["mtime", "size", "fcentre", "chanbw", "bw", "tobs", "nbins",
+                "nhdrlines", "deltas", "name"]
+
+#
+# read the index of a directory
+#
+def ReadIndex(Dir):
+    """Return a dictionary mapping each file name in the index of Dir to
+    (mtime, size, FCentre, ChanBW, BW, tObs, NBins, NHdrLines, DeltaS), where
+    DeltaS is None if the profile is not calibrated. An index that is missing
+    or of another version is treated as empty."""
+    Entries = {}
+    try:
+        fsrc = open(os.path.join(Dir, INDEX_FILENAME), "r")
+    except IOError:
+        return Entries
+    if (fsrc.readline().split() != ["#", "version", str(INDEX_VERSION)]):
+        fsrc.close()
+        return Entries
+    for line in fsrc:
+        if (line.startswith("#")):
+            continue
+        Fields = line.rstrip("\n").split(None, len(INDEX_FIELDS) - 1)
+        DeltaS = float(Fields[8])
+        Entries[Fields[9]] = (float(Fields[0]), int(Fields[1]),
+                              float(Fields[2]), float(Fields[3]),
+                              float(Fields[4]), float(Fields[5]),
+                              int(Fields[6]), int(Fields[7]),
+                              None if DeltaS != DeltaS else DeltaS)
+    fsrc.close()
+    return Entries
+
+#
+# write the index of a directory
+#
+def WriteIndex(Dir, Entries):
+    """Write the index of Dir, leaving out files that no longer exist. The
+    index replaces the old one atomically, so that readers never see a partly
+    written index."""
+    def WriteData(fdest):
+        fdest.write("# version %d\n" % INDEX_VERSION)
+        fdest.write("# " + " ".join(INDEX_FIELDS) + "\n")
+        for Name in sorted(Entries):
+            if (not os.path.exists(os.path.join(Dir, Name))):
+                continue
+            (MTime, Size, FCentre, ChanBW, BW, tObs, NBins, NHdrLines,
+             DeltaS) = Entries[Name]
+            # repr() so that the values read back are exactly those parsed
+            fdest.write("%r %d %r %r %r %r %d %d %r %s\n"
+                        % (MTime, Size, FCentre, ChanBW, BW, tObs, NBins,
+                           NHdrLines,
+                           float("nan") if DeltaS is None else DeltaS, Name))
+    yapp.WriteFileAtomic(os.path.join(Dir, INDEX_FILENAME), WriteData)
+    return
+
+#
+# build a header from an index entry
+#
+def _MakeHeader(Entry):
+    (MTime, Size, FCentre, ChanBW, BW, tObs, NBins, NHdrLines, DeltaS) = Entry
+    hdr = yapp.MakeProfHeader(FCentre, ChanBW, BW, tObs, DeltaS)
+    hdr.NBins = NBins
+    return hdr
+
+#
+# get the headers of a set of profile files
+#
+def GetProfHeaders(filesProf):
+    """Return a yapp_common.ProfHeader for each file in filesProf, in the same
+    order, taken from the index of the file's directory. Files that are not
+    in the index, or have been modified since they were indexed, have their
+    headers read and the index updated. If an index cannot be written, the
+    headers are still returned. The header lines of the returned headers are
+    rebuilt from the indexed values."""
+    Dirs = {}
+    for fileProf in filesProf:
+        (Dir, Name) = os.path.split(os.path.abspath(fileProf))
+        Dirs.setdefault(Dir, []).append((fileProf, Name))
+
+    hdrs = {}
+    for (Dir, Files) in Dirs.items():
+        Entries = ReadIndex(Dir)
+        Changed = False
+        for (fileProf, Name) in Files:
+            Key = yapp.GetFileKey(fileProf)
+            Entry = Entries.get(Name)
+            if (Entry is None or Entry[:2] != Key):
+                hdr = yapp.ReadProfHeader(fileProf)
+                Entry = Key + (hdr.FCentre, hdr.ChanBW, hdr.BW, hdr.tObs,
+                               hdr.NBins, len(hdr.Lines), hdr.DeltaS)
+                Entries[Name] = Entry
+                Changed = True
+            hdrs[fileProf] = _MakeHeader(Entry)
+        if (Changed):
+            try:
+                WriteIndex(Dir, Entries)
+            except (IOError, OSError):
+                # e.g., a read-only directory
+                pass
+    return [hdrs[fileProf] for fileProf in filesProf]
+
+#
+# select and sort profile files by centre frequency
+#
+def SelectBands(filesProf, FRange=None):
+    """Return a list of (fileProf, header) for the files in filesProf, sorted
+    by centre frequency, using GetProfHeaders(). If FRange is given as (low,
+    high) in MHz, only the files with centre frequencies in that range are
+    returned."""
+    Bands = zip(filesProf, GetProfHeaders(filesProf))
+    if (FRange is not None):
+        Bands = [band for band in Bands
+                 if FRange[0] <= band[1].FCentre <= FRange[1]]
+    Bands.sort(key=lambda band: (band[1].FCentre, band[0]))
+    return Bands
@@ -0,0 +1,262 @@
+#!/usr/bin/python
+
+#
+# yapp_pyramid.py
+# Quick-look pyramid functions, for browsing filterbank data at screen
+#   resolution, with levels of the data decimated by successive factors of 2
+#   in time, stored next to the data file and read through memory maps
+#
+
+import os
+import shutil
+import tempfile
+import numpy
+import yapp_common as yapp
+import yapp_sigproc as sp
+import yapp_decim as decim
+
+# pyramid directory naming, and the version of its contents
+FILE_PYRAMID_SUFFIX = ".ypyr"
+FILE_PYRAMID_INFO = "info.npz"
+PYRAMID_VERSION = 1
+
+# default time decimation factor of the finest level; time ranges that need a
+#   finer level are read from the data file itself
+DEF_MIN_TFACTOR = 8
+
+# default maximum number of channels of the levels
+DEF_MAX_CHANS = 256
+
+# minimum number of time samples of the coarsest level
+MIN_LEVEL_SAMPS = 256
+
+# statistics kept of each window
+PYRAMID_STATS = ("mean", "max")
+
+#
+# block-wise maxima
+#
+class MaxDecimator(decim.Decimator):
+    """As yapp_decim.Decimator, but takes the maximum over each window,
+    rather than the average."""
+    def _Average(self, Block):
+        NOut = len(Block) // self.TFactor
+        return Block.reshape(NOut, self.TFactor, self.NOutChans,
+                             self.CFactor).max(axis=(1, 3))                   \
+                    .astype(numpy.float32)
+
+#
+# get the layout of the pyramid of a file
+#
+def GetLevelFactors(NTimeSamps, MinTFactor=DEF_MIN_TFACTOR):
+    """Return the time decimation factors of the levels, MinTFactor, twice
+    that, and so on, for as long as a level has at least MIN_LEVEL_SAMPS time
+    samples."""
+    TFactors = []
+    TFactor = MinTFactor
+    while (NTimeSamps // TFactor >= MIN_LEVEL_SAMPS):
+        TFactors.append(TFactor)
+        TFactor = TFactor * 2
+    return TFactors
+
+def GetChanFactor(NChans, MaxChans=DEF_MAX_CHANS):
+    "Return the smallest channel decimation factor that leaves MaxChans."
+    return max(1, (NChans + MaxChans - 1) // MaxChans)
+
+#
+# get the name of the pyramid directory of a file
+#
+def GetPyramidDirname(FileSpec):
+    return FileSpec + FILE_PYRAMID_SUFFIX
+
+def _GetLevelFilename(Dir, TFactor, Stat):
+    return os.path.join(Dir, "t%d.%s.npy" % (TFactor, Stat))
+
+def _GetFileKey(FileSpec):
+    return numpy.array((PYRAMID_VERSION,) + yapp.GetFileKey(FileSpec),
+                       dtype=numpy.float64)
+
+#
+# build the pyramid of a file
+#
+def BuildPyramid(FileSpec, MinTFactor=DEF_MIN_TFACTOR,                        \
+                 MaxChans=DEF_MAX_CHANS, BlockSize=decim.DEF_SIZE_BLOCK,      \
+                 Progress=None):
+    """Read a .fil or .tim file once, and write the mean and the maximum of
+    the data over windows of each of the time decimation factors of
+    GetLevelFactors() and the channel decimation factor of GetChanFactor(),
+    to the pyramid directory of the file. Each level is decimated from the
+    one below it, by 2 in time. The means are float32, and the maxima are of
+    the sample type of the data, so that they are exact. Returns the
+    directory name."""
+    (hdr, Data) = sp.ReadSIGPROCData(FileSpec)
+    if (MinTFactor < 1 or MaxChans < 1):
+        raise ValueError("Decimation factor and number of channels must be "
+                         "positive")
+    TFactors = GetLevelFactors(hdr.NTimeSamps, MinTFactor)
+    CFactor = GetChanFactor(hdr.NChans, MaxChans)
+    NChans = hdr.NChans // CFactor
+    DirPyr = GetPyramidDirname(FileSpec)
+    Parent = os.path.dirname(os.path.abspath(FileSpec))
+    # the levels are written to a directory of their own, which only takes
+    #   the place of the old pyramid once it is complete
+    DirTemp = tempfile.mkdtemp(dir=Parent, suffix=FILE_PYRAMID_SUFFIX)
+    Done = False
+    try:
+        Levels = []
+        for (i, TFactor) in enumerate(TFactors):
+            # the first level is decimated from the data, and every other
+            #   level from the level below it
+            if (0 == i):
+                (TStep, CStep, NIn) = (TFactor, CFactor, hdr.NChans)
+            else:
+                (TStep, CStep, NIn) = (2, 1, NChans)
+            Shape = (hdr.NTimeSamps // TFactor, NChans)
+            Mean = numpy.lib.format.open_memmap(
+                       _GetLevelFilename(DirTemp, TFactor, "mean"), mode="w+",
+                       dtype=numpy.float32, shape=Shape)
+            Max = numpy.lib.format.open_memmap(
+                      _GetLevelFilename(DirTemp, TFactor, "max"), mode="w+",
+                      dtype=Data.dtype, shape=Shape)
+            Levels.append([decim.Decimator(NIn, TStep, CStep),
+                           MaxDecimator(NIn, TStep, CStep), Mean, Max, 0])
+
+        # read whole windows of the first level at a time where possible
+        if (len(TFactors) > 0):
+            BlockSize = max(1, BlockSize // TFactors[0]) * TFactors[0]
+        for Start in range(0, hdr.NTimeSamps, BlockSize):
+            Block = Data[Start:Start+BlockSize]
+            (BlockMean, BlockMax) = (Block, Block)
+            for Level in Levels:
+                (DecMean, DecMax, Mean, Max, NDone) = Level
+                BlockMean = DecMean.Process(BlockMean)
+                BlockMax = DecMax.Process(BlockMax)
+                Mean[NDone:NDone+len(BlockMean)] = BlockMean
+                Max[NDone:NDone+len(BlockMax)] = BlockMax
+                Level[4] = NDone + len(BlockMean)
+                if (0 == len(BlockMean)):
+                    break
+            if (Progress is not None):
+                Progress(min(Start + BlockSize, hdr.NTimeSamps),
+                         hdr.NTimeSamps)
+        for Level in Levels:
+            Level[2].flush()
+            Level[3].flush()
+        del Levels
+
+        numpy.savez(os.path.join(DirTemp, FILE_PYRAMID_INFO),
+                    Key=_GetFileKey(FileSpec),
+                    TFactors=numpy.array(TFactors, dtype=numpy.int64),
+                    CFactor=numpy.array(CFactor))
+        os.chmod(DirTemp, 0o755)
+        if (os.path.isdir(DirPyr)):
+            shutil.rmtree(DirPyr)
+        os.rename(DirTemp, DirPyr)
+        Done = True
+    finally:
+        if (not Done):
+            shutil.rmtree(DirTemp, ignore_errors=True)
+    return DirPyr
+
+#
+# quick-look access to a file
+#
+class Pyramid(object):
+    """Serves any time range of a .fil or .tim file at screen resolution, from
+    the coarsest level of its pyramid that still has enough time samples, or
+    from the data itself for short ranges. The levels are opened as memory
+    maps, so only the samples of the range that is viewed are read."""
+    def __init__(self, FileSpec):
+        (self.hdr, self.Data) = sp.ReadSIGPROCData(FileSpec)
+        DirPyr = GetPyramidDirname(FileSpec)
+        Info = numpy.load(os.path.join(DirPyr, FILE_PYRAMID_INFO))
+        try:
+            if (not numpy.array_equal(Info["Key"], _GetFileKey(FileSpec))):
+                raise ValueError("Pyramid of " + FileSpec + " is out of date")
+            self.TFactors = [int(TFactor) for TFactor in Info["TFactors"]]
+            self.CFactor = int(Info["CFactor"])
+        finally:
+            Info.close()
+        self.NChans = self.hdr.NChans // self.CFactor
+        self.Levels = {}
+        for TFactor in self.TFactors:
+            self.Levels[TFactor]                                              \
+                = dict([(Stat, numpy.load(_GetLevelFilename(DirPyr, TFactor,
+                                                            Stat),
+                                          mmap_mode="r"))
+                        for Stat in PYRAMID_STATS])
+
+    def GetHeader(self):
+        """Returns the header of the data as decimated in frequency, for the
+        frequencies of the channels of the views."""
+        return decim.GetDecimHeader(self.hdr, 1, self.CFactor)
+
+    def GetLevel(self, NSamps, Width):
+        """Returns the largest time decimation factor that leaves at least
+        Width time samples of NSamps, 1 being the data itself."""
+        Fits = [TFactor for TFactor in self.TFactors
+                if NSamps // TFactor >= Width]
+        if (0 == len(Fits)):
+            return 1
+        return max(Fits)
+
+    def _ReadRaw(self, Start, Stop, Stat):
+        Block = self.Data[Start:Stop]
+        if (1 == self.CFactor):
+            return numpy.asarray(Block, dtype=numpy.float32)
+        Block = Block[:, :self.NChans*self.CFactor]                           \
+                .reshape(Stop - Start, self.NChans, self.CFactor)
+        if ("max" == Stat):
+            return Block.max(axis=2).astype(numpy.float32)
+        return Block.mean(axis=2, dtype=numpy.float32)
+
+    def GetView(self, Start, Stop, Width, Stat="mean"):
+        """Return (Times, Image) for time samples Start to Stop of the data,
+        where Image is a float32 (time, channel) array of at most Width rows,
+        each the mean (or the maximum, if Stat is "max") of the data over an
+        equal number of time samples and CFactor channels, and Times is the
+        time of the start of each row, in seconds from the start of the
+        data."""
+        if (Stat not in PYRAMID_STATS):
+            raise ValueError("Unknown statistic " + Stat)
+        Start = max(0, int(Start))
+        Stop = min(self.hdr.NTimeSamps, int(Stop))
+        if (Stop <= Start or Width < 1):
+            raise ValueError("Empty time range")
+        TFactor = self.GetLevel(Stop - Start, Width)
+        # the incomplete window at the end of the data is only in the data
+        if (TFactor > 1
+            and Start // TFactor >= len(self.Levels[TFactor][Stat])):
+            TFactor = 1
+        if (1 == TFactor):
+            Image = self._ReadRaw(Start, Stop, Stat)
+        else:
+            Level = self.Levels[TFactor][Stat]
+            First = Start // TFactor
+            Last = min(max(Stop // TFactor, First + 1), len(Level))
+            Image = numpy.asarray(Level[First:Last], dtype=numpy.float32)
+            Start = First * TFactor
+        # combine rows to fit the width
+        Factor = (len(Image) + Width - 1) // Width
+        Starts = numpy.arange(0, len(Image), Factor)
+        if ("max" == Stat):
+            Image = numpy.maximum.reduceat(Image, Starts, axis=0)
+        else:
+            Counts = numpy.diff(numpy.append(Starts, len(Image)))
+            Image = numpy.add.reduceat(Image, Starts, axis=0)                 \
+                    / Counts[:, numpy.newaxis].astype(numpy.float32)
+        Times = (Start + (Starts * TFactor)) * self.hdr.TSamp
+        return (Times, Image)
+
+#
+# open the pyramid of a file, building it if needed
+#
+def GetPyramid(FileSpec, MinTFactor=DEF_MIN_TFACTOR,                          \
+               MaxChans=DEF_MAX_CHANS, Progress=None):
+    """Return the Pyramid of a file, building it first if there is none, or if
+    the file has changed size or modification time since it was built."""
+    try:
+        return Pyramid(FileSpec)
+    except (IOError, KeyError, ValueError):
+        BuildPyramid(FileSpec, MinTFactor, MaxChans, Progress=Progress)
+    return Pyramid(FileSpec)
@@ -0,0 +1,203 @@
+#!/usr/bin/python
+
+# yapp_quicklook.py
+# Browse filterbank data or time series at screen resolution, from a pyramid
+#   of time-decimated levels built once and stored next to the data file.
+#   Zooming and panning the time axis reads only the samples needed for the
+#   new range, from the level that matches it.
+#
+#   Usage: yapp_quicklook.py [options] <data-file>
+
+import sys
+import getopt
+import numpy
+import yapp_pyramid as pyr
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-file>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -t  --start <time>                   ",                        \
+          "Start time in s (default is 0)"
+    print "    -d  --duration <time>                ",                        \
+          "Duration in s (default is all of\n",                               \
+          "                                         ",                        \
+          "the data)"
+    print "    -x  --max                            ",                        \
+          "Plot the maximum of each pixel instead\n",                         \
+          "                                         ",                        \
+          "of the mean"
+    print "    -f  --min-factor <factor>            ",                        \
+          "Time decimation factor of the finest\n",                           \
+          "                                         ",                        \
+          "level of the pyramid (default is 8)"
+    print "    -c  --max-chans <nchans>             ",                        \
+          "Maximum number of channels of the\n",                              \
+          "                                         ",                        \
+          "pyramid (default is 256)"
+    print "    -b  --build                          ",                        \
+          "(Re)build the pyramid and exit"
+    print "    -o  --output <file>                  ",                        \
+          "Write the plot to an image file instead\n",                        \
+          "                                         ",                        \
+          "of showing it on screen"
+    print "    -s  --size <width>x<height>          ",                        \
+          "Size of the plot in pixels\n",                                     \
+          "                                         ",                        \
+          "(default is 1024x768)"
+    return
+
+def PrintProgress(Done, Total):
+    "Prints the fraction of data processed."
+    sys.stdout.write("\rBuilt pyramid from %d of %d time samples."           \
+                     % (Done, Total))
+    sys.stdout.flush()
+    return
+
+def GetImage(Pyramid, TStart, TStop, Width, Stat):
+    """Returns the image of the time range TStart to TStop, in s, with the
+    channels in ascending order of frequency, and its extent."""
+    TSamp = Pyramid.hdr.TSamp
+    (Times, Img) = Pyramid.GetView(int(TStart / TSamp),
+                                   int(numpy.ceil(TStop / TSamp)), Width, Stat)
+    if (len(Times) > 1):
+        TEnd = Times[-1] + (Times[1] - Times[0])
+    else:
+        TEnd = TStop
+    hdr = Pyramid.GetHeader()
+    Img = Img.T
+    FChans = hdr.FChan1 + (numpy.arange(Pyramid.NChans) * hdr.ChanBW)
+    if (hdr.ChanBW < 0):
+        Img = Img[::-1]
+    ChanBW = abs(hdr.ChanBW)
+    Extent = [Times[0], TEnd, FChans.min() - (ChanBW / 2),
+              FChans.max() + (ChanBW / 2)]
+    return (Img, Extent)
+
+# defaults
+TStart = 0.0
+Duration = None
+Stat = "mean"
+MinTFactor = pyr.DEF_MIN_TFACTOR
+MaxChans = pyr.DEF_MAX_CHANS
+BuildOnly = False
+FilePlot = None
+(Width, Height) = (1024, 768)
+DPI = 100
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "ht:d:xf:c:bo:s:"
+OptsLong = ["help", "start=", "duration=", "max", "min-factor=",
+            "max-chans=", "build", "output=", "size="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-t", "--start"):
+            TStart = float(a)
+        elif o in ("-d", "--duration"):
+            Duration = float(a)
+        elif o in ("-x", "--max"):
+            Stat = "max"
+        elif o in ("-f", "--min-factor"):
+            MinTFactor = int(a)
+        elif o in ("-c", "--max-chans"):
+            MaxChans = int(a)
+        elif o in ("-b", "--build"):
+            BuildOnly = True
+        elif o in ("-o", "--output"):
+            FilePlot = a
+        elif o in ("-s", "--size"):
+            (Width, Height) = [int(Size) for Size in a.split("x")]
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (len(Args) != 1):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (MinTFactor < 1 or MaxChans < 1 or Width < 1 or Height < 1):
+    sys.stderr.write("ERROR: Decimation factor, number of channels and plot "
+                     + "size must be positive!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+try:
+    if (BuildOnly):
+        DirPyr = pyr.BuildPyramid(Args[0], MinTFactor, MaxChans,
+                                  Progress=PrintProgress)
+        print "\nWrote " + DirPyr + "."
+        print "DONE!"
+        sys.exit()
+    Pyramid = pyr.GetPyramid(Args[0], MinTFactor, MaxChans, PrintProgress)
+    TObs = Pyramid.hdr.NTimeSamps * Pyramid.hdr.TSamp
+    if (Duration is None):
+        Duration = TObs - TStart
+    (Img, Extent) = GetImage(Pyramid, TStart, TStart + Duration, Width, Stat)
+except (IOError, OSError, ValueError), ErrMsg:
+    sys.stderr.write("\nERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+
+# import matplotlib only now, so that errors in the input are reported without
+#   waiting for it to load, and without a display if the plot is only written
+#   to a file
+import matplotlib
+if (FilePlot is not None):
+    matplotlib.use("Agg")
+import matplotlib.pyplot as plotter
+
+Fig = plotter.figure(figsize=(float(Width) / DPI, float(Height) / DPI),
+                     dpi=DPI)
+Axes = plotter.gca()
+Image = plotter.imshow(Img, origin="lower", aspect="auto",
+                       interpolation="nearest", cmap="jet", extent=Extent)
+# keep the colour scale from being set by a few bright pixels
+Image.set_clim(numpy.percentile(Img, [0.5, 99.5]))
+cbar = plotter.colorbar(Image, orientation="vertical")
+cbar.set_label(Stat.capitalize())
+# the image is replaced on zooming, so the limits must not follow it
+Axes.set_autoscale_on(False)
+
+def OnZoom(Axes):
+    "Replaces the image with one of the new time range, at screen resolution."
+    (TLow, THigh) = Axes.get_xlim()
+    (TLow, THigh) = (max(TLow, 0.0), min(THigh, TObs))
+    if (THigh <= TLow):
+        return
+    NPixels = max(1, int(Axes.get_window_extent().width))
+    (Img, Extent) = GetImage(Pyramid, TLow, THigh, NPixels, Stat)
+    Image.set_data(Img)
+    Image.set_extent(Extent)
+    Fig.canvas.draw_idle()
+    return
+
+Axes.callbacks.connect("xlim_changed", OnZoom)
+
+plotter.xlabel("Time (s)")
+plotter.ylabel("Frequency (MHz)")
+plotter.title(Args[0])
+if (FilePlot is not None):
+    plotter.savefig(FilePlot, dpi=DPI)
+else:
+    plotter.show()
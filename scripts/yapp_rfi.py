@@ -0,0 +1,281 @@
+#!/usr/bin/python
+
+#
+# yapp_rfi.py
+# RFI excision functions, for finding interference in filterbank data and
+#   masking it, with a channel by time block mask that is applied as the data
+#   is read, rather than by rewriting the data
+#
+
+import os
+import itertools
+import multiprocessing
+import warnings
+import numpy
+import yapp_common as yapp
+import yapp_sigproc as sp
+import yapp_stats as stats
+
+INFIX_RFI = "rfi"
+EXT_RFIMASK = ".npz"
+RFIMASK_VERSION = 1
+
+# default number of time samples per block of the mask
+DEF_SIZE_BLOCK = 2048
+
+# default thresholds, in units of the robust standard deviation
+DEF_SK_THRESH = 5.0
+DEF_MAD_THRESH = 5.0
+
+# maximum number of values read in one chunk, which bounds the memory used by
+#   each worker process
+DEF_CHUNK_VALUES = 1 << 22
+
+#
+# channel by time block mask
+#
+class RFIMask(object):
+    """Flags of (time block, channel), each block being BlockSize time samples
+    (the last block may be shorter), and the value that flagged samples are
+    replaced with in each channel. If ZeroDM, the zero-DM time series, the
+    mean over the unflagged channels of each time sample, is subtracted from
+    them when the mask is applied (Eatough et al. 2009)."""
+    def __init__(self, NTimeSamps, NChans, BlockSize=DEF_SIZE_BLOCK,
+                 ZeroDM=False):
+        self.NTimeSamps = NTimeSamps
+        self.NChans = NChans
+        self.BlockSize = BlockSize
+        self.NBlocks = (NTimeSamps + BlockSize - 1) // BlockSize
+        self.ZeroDM = ZeroDM
+        self.Flags = numpy.zeros((self.NBlocks, NChans), dtype=numpy.bool_)
+        self.Fill = numpy.zeros(NChans, dtype=numpy.float32)
+
+    def GetFraction(self):
+        "Returns the fraction of the data that is flagged."
+        if (0 == self.Flags.size):
+            return 0.0
+        return float(self.Flags.sum()) / self.Flags.size
+
+    def GetChanFraction(self):
+        "Returns the fraction of the time blocks flagged in each channel."
+        return self.Flags.mean(axis=0)
+
+    def Check(self, hdr):
+        "Raises ValueError if the mask is not for data with this header."
+        if (hdr.NChans != self.NChans or hdr.NTimeSamps != self.NTimeSamps):
+            raise ValueError("RFI mask is for %d channels and %d time "
+                             "samples, not %d and %d"
+                             % (self.NChans, self.NTimeSamps, hdr.NChans,
+                                hdr.NTimeSamps))
+        return
+
+    def Apply(self, Block, Start):
+        """Return a float32 copy of a (time sample, channel) block of the
+        data, of which the first time sample is sample Start of the data,
+        with the flagged samples replaced by the fill value of their channel,
+        and with the zero-DM time series subtracted if ZeroDM."""
+        Clean = numpy.array(Block, dtype=numpy.float32)
+        Stop = Start + len(Clean)
+        FirstBlock = Start // self.BlockSize
+        LastBlock = (Stop + self.BlockSize - 1) // self.BlockSize
+        for i in range(FirstBlock, LastBlock):
+            Lo = max(i * self.BlockSize, Start) - Start
+            Hi = min((i + 1) * self.BlockSize, Stop) - Start
+            Flags = self.Flags[i]
+            if (Flags.any()):
+                Clean[Lo:Hi, Flags] = self.Fill[Flags]
+            if (self.ZeroDM):
+                NGood = self.NChans - Flags.sum()
+                if (0 == NGood):
+                    continue
+                # flagged samples equal the fill value, so they do not
+                #   contribute to the sum
+                Level = (Clean[Lo:Hi] - self.Fill).sum(axis=1) / NGood
+                Clean[Lo:Hi] -= Level[:, numpy.newaxis] * ~Flags
+        return Clean
+
+#
+# calculate the sums of a range of blocks of a file
+#
+def _CalcMomentsTask(Task):
+    (FileSpec, FirstBlock, LastBlock, BlockSize) = Task
+    (hdr, Data) = sp.ReadSIGPROCData(FileSpec)
+    Start = FirstBlock * BlockSize
+    Stop = min(LastBlock * BlockSize, hdr.NTimeSamps)
+    Chunk = numpy.asarray(Data[Start:Stop], dtype=numpy.float32)
+    # the sums are taken about the first sample of each channel, which keeps
+    #   them small, accumulated in double precision, and shifted back
+    Shift = Chunk[0].astype(numpy.float64)
+    Chunk -= Chunk[0]
+    S1 = numpy.empty((LastBlock - FirstBlock, hdr.NChans), dtype=numpy.float64)
+    S2 = numpy.empty((LastBlock - FirstBlock, hdr.NChans), dtype=numpy.float64)
+    for i in range(len(S1)):
+        Block = Chunk[i*BlockSize:(i+1)*BlockSize]
+        M = len(Block)
+        Sum = Block.sum(axis=0, dtype=numpy.float64)
+        SumSq = numpy.einsum("ij,ij->j", Block, Block, dtype=numpy.float64)
+        S1[i] = Sum + (M * Shift)
+        S2[i] = SumSq + (2 * Shift * Sum) + (M * Shift * Shift)
+    return (FirstBlock, S1, S2)
+
+#
+# calculate the spectral kurtosis estimator
+#
+def CalcSK(S1, S2, M):
+    """Return the spectral kurtosis estimator of Nita & Gary (2010), for
+    d = 1, of M power samples with sum S1 and sum of squares S2. It is 1 for
+    Gaussian noise, and NaN where it is not defined."""
+    M = numpy.asarray(M, dtype=numpy.float64)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        SK = ((M + 1) / (M - 1)) * (((M * S2) / (S1 * S1)) - 1)
+    SK[~numpy.isfinite(SK)] = numpy.nan
+    return SK
+
+#
+# find outliers with the median and the MAD
+#
+def _GetOutliers(Values, Thresh, Axis):
+    """Return True where the values deviate from their median along Axis by
+    more than Thresh times the standard deviation estimated from the MAD, or
+    are NaN."""
+    Invalid = numpy.isnan(Values)
+    with warnings.catch_warnings():
+        # all values along the axis may be NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        Median = numpy.nanmedian(Values, axis=Axis, keepdims=True)
+        Dev = numpy.abs(Values - Median)
+        Sigma = stats.MAD_TO_SIGMA                                            \
+                * numpy.nanmedian(Dev, axis=Axis, keepdims=True)
+    with numpy.errstate(invalid="ignore"):
+        return Invalid | (Dev > (Thresh * Sigma))
+
+#
+# find the RFI in a filterbank file
+#
+def FindRFI(FileSpec, BlockSize=DEF_SIZE_BLOCK, SKThresh=DEF_SK_THRESH,    \
+            MADThresh=DEF_MAD_THRESH, ZeroDM=False, NJobs=1, Progress=None):
+    """Read the file once, in chunks that are processed by NJobs worker
+    processes, and return an RFIMask of blocks of BlockSize time samples. Only
+    the sum and the sum of squares of each (block, channel) are kept, from
+    which a (block, channel) is flagged if
+      - its spectral kurtosis (see CalcSK()) deviates from that of the other
+        blocks of the channel by more than SKThresh robust standard
+        deviations,
+      - its mean deviates from that of the other blocks of the channel by
+        more than MADThresh robust standard deviations,
+    and a whole channel is flagged if it is constant, or if its median
+    spectral kurtosis deviates from that of the other channels by more than
+    SKThresh. The fill value of a channel is the median of the means of its
+    unflagged blocks."""
+    hdr = sp.ReadSIGPROCHeader(FileSpec)
+    if (BlockSize < 2):
+        raise ValueError("Block size must be at least 2 samples")
+    Mask = RFIMask(hdr.NTimeSamps, hdr.NChans, BlockSize, ZeroDM)
+    if (0 == Mask.NBlocks):
+        return Mask
+    BlocksPerChunk = max(1, DEF_CHUNK_VALUES // (BlockSize * hdr.NChans))
+    Tasks = [(FileSpec, First, min(First + BlocksPerChunk, Mask.NBlocks),
+              BlockSize)
+             for First in range(0, Mask.NBlocks, BlocksPerChunk)]
+    S1 = numpy.zeros((Mask.NBlocks, hdr.NChans), dtype=numpy.float64)
+    S2 = numpy.zeros((Mask.NBlocks, hdr.NChans), dtype=numpy.float64)
+    Pool = None
+    if (NJobs > 1 and len(Tasks) > 1):
+        Pool = multiprocessing.Pool(min(NJobs, len(Tasks)))
+        Results = Pool.imap(_CalcMomentsTask, Tasks)
+    else:
+        Results = itertools.imap(_CalcMomentsTask, Tasks)
+    try:
+        for (First, ChunkS1, ChunkS2) in Results:
+            S1[First:First+len(ChunkS1)] = ChunkS1
+            S2[First:First+len(ChunkS2)] = ChunkS2
+            if (Progress is not None):
+                Progress(min((First + len(ChunkS1)) * BlockSize,
+                             hdr.NTimeSamps), hdr.NTimeSamps)
+    finally:
+        if (Pool is not None):
+            Pool.close()
+            Pool.join()
+
+    # number of samples in each block
+    M = numpy.minimum(BlockSize, hdr.NTimeSamps
+                      - (numpy.arange(Mask.NBlocks) * BlockSize))
+    M = M[:, numpy.newaxis].astype(numpy.float64)
+    Mean = S1 / M
+    SK = CalcSK(S1, S2, M)
+    Flags = _GetOutliers(SK, SKThresh, 0)
+    Flags |= _GetOutliers(Mean, MADThresh, 0)
+    # the last block may be too short to judge on its own
+    if (Mask.NBlocks > 1 and M[-1, 0] < BlockSize):
+        Flags[-1] = Flags[-2]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        ChanSK = numpy.nanmedian(SK, axis=0)
+    BadChans = _GetOutliers(ChanSK, SKThresh, 0)
+    N = float(hdr.NTimeSamps)
+    ChanVar = (S2.sum(axis=0) - ((S1.sum(axis=0) ** 2) / N)) / N
+    BadChans |= (ChanVar <= 0.0)
+    Flags[:, BadChans] = True
+    Mask.Flags = Flags
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        Fill = numpy.nanmedian(numpy.where(Flags, numpy.nan, Mean), axis=0)
+    # channels that are flagged throughout take the median of all blocks
+    AllBad = numpy.isnan(Fill)
+    Fill[AllBad] = numpy.median(Mean[:, AllBad], axis=0)
+    Mask.Fill = Fill.astype(numpy.float32)
+    return Mask
+
+#
+# get the name of the RFI mask of a file
+#
+def GetRFIMaskFilename(FileSpec, OutDir=None):
+    """Return a name such as data.rfi.npz, in OutDir (the current directory
+    if None)."""
+    Base = os.path.splitext(os.path.basename(FileSpec))[0]
+    FileMask = Base + "." + INFIX_RFI + EXT_RFIMASK
+    if (OutDir is not None):
+        FileMask = os.path.join(OutDir, FileMask)
+    return FileMask
+
+#
+# write an RFI mask
+#
+def WriteRFIMask(FileMask, Mask):
+    """Write the mask, with the flags packed into bits, so that a mask takes
+    one bit per channel and block."""
+    Arrays = {"Version": numpy.array(RFIMASK_VERSION),
+              "NTimeSamps": numpy.array(Mask.NTimeSamps),
+              "NChans": numpy.array(Mask.NChans),
+              "BlockSize": numpy.array(Mask.BlockSize),
+              "ZeroDM": numpy.array(Mask.ZeroDM),
+              "Flags": numpy.packbits(Mask.Flags, axis=1),
+              "Fill": Mask.Fill}
+    yapp.WriteFileAtomic(FileMask,
+                         lambda fdest: numpy.savez_compressed(fdest, **Arrays),
+                         "wb")
+    return
+
+#
+# read an RFI mask
+#
+def ReadRFIMask(FileMask):
+    "Return the RFIMask written by WriteRFIMask()."
+    try:
+        Arrays = numpy.load(FileMask)
+        try:
+            if (int(Arrays["Version"]) != RFIMASK_VERSION):
+                raise ValueError(FileMask + " is of an unknown version")
+            Mask = RFIMask(int(Arrays["NTimeSamps"]), int(Arrays["NChans"]),
+                           int(Arrays["BlockSize"]), bool(Arrays["ZeroDM"]))
+            Flags = numpy.unpackbits(Arrays["Flags"], axis=1)
+            Mask.Flags = Flags[:, :Mask.NChans].astype(numpy.bool_)
+            Mask.Fill = numpy.array(Arrays["Fill"], dtype=numpy.float32)
+        finally:
+            Arrays.close()
+    except KeyError:
+        raise ValueError(FileMask + " is not an RFI mask")
+    if (Mask.Flags.shape != (Mask.NBlocks, Mask.NChans)):
+        raise ValueError(FileMask + " is not an RFI mask")
+    return Mask
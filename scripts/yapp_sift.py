@@ -0,0 +1,202 @@
+#!/usr/bin/python
+
+#
+# yapp_sift.py
+# Single-pulse sifting functions, for dedispersed time series at many DMs
+#
+
+import os
+import re
+import numpy
+import yapp_sigproc as sp
+import yapp_dedisp as dedisp
+import yapp_boxcar as boxcar
+import yapp_stats as stats
+
+DEF_THRESHOLD = 8.0     # as in yapp_siftpulses
+DEF_SIZE_BLOCK = 65536
+DEF_MAX_WIDTH = 1       # no smoothing
+
+# maximum separation of events in the same candidate, in samples and in DM
+#   trials
+DEF_MAX_GAP = 8
+DEF_MAX_DM_GAP = 1
+
+EXT_CAND = ".cand"
+
+# candidate table columns; DMLow, DMHigh, SampLow and SampHigh give the extent
+#   of the events in the candidate, and the rest describe its brightest event,
+#   where Sample is the first sample of the boxcar and Width is its width in
+#   samples
+CandType = numpy.dtype([("DM", "<f8"),
+                        ("SNR", "<f4"),
+                        ("Time", "<f8"),
+                        ("Sample", "<i8"),
+                        ("Width", "<i4"),
+                        ("NEvents", "<i4"),
+                        ("DMLow", "<f8"),
+                        ("DMHigh", "<f8"),
+                        ("SampLow", "<i8"),
+                        ("SampHigh", "<i8")])
+CAND_FORMATS = ["%.6g", "%.2f", "%.6f", "%d", "%d", "%d", "%.6g", "%.6g", "%d",
+                "%d"]
+
+#
+# open a set of dedispersed time series
+#
+def OpenSeries(FilesSpec):
+    """Return (DMs, hdr, series), with the series sorted by DM. hdr is the
+    header of the lowest-DM file, and series is a list of 1-D read-only
+    memory maps, truncated to the length of the shortest series."""
+    Series = []
+    for FileSpec in FilesSpec:
+        if (not FileSpec.endswith(sp.EXT_TIM)):
+            raise ValueError("%s is not a SIGPROC .tim file" % FileSpec)
+        (hdr, Data) = sp.ReadSIGPROCData(FileSpec)
+        Series.append((hdr.DM, hdr, Data[:, 0]))
+    Series.sort(key=lambda Entry: Entry[0])
+    hdr = Series[0][1]
+    for Entry in Series:
+        if (Entry[1].TSamp != hdr.TSamp):
+            raise ValueError("All time series must have the same sampling "
+                             "time")
+    NSamps = min([len(Entry[2]) for Entry in Series])
+    return (numpy.array([Entry[0] for Entry in Series]), hdr,
+            [Entry[2][:NSamps] for Entry in Series])
+
+#
+# find threshold crossings in a normalised block
+#
+def FindEvents(SNR, Threshold):
+    """SNR is an (NDMs, NSamps) array. Returns (DM indices, sample indices,
+    S/N) of the samples above Threshold."""
+    (DMIdx, SampIdx) = numpy.nonzero(SNR > Threshold)
+    return (DMIdx, SampIdx, SNR[DMIdx, SampIdx])
+
+#
+# group events into candidates
+#
+def ClusterEvents(SampIdx, DMIdx, MaxGap=DEF_MAX_GAP,                         \
+                  MaxDMGap=DEF_MAX_DM_GAP):
+    """Return a candidate label for each event. Events are first split where
+    there is a gap of more than MaxGap samples between consecutive events in
+    time, and each of these groups is then split where there is a gap of more
+    than MaxDMGap DM trials between consecutive events in DM."""
+    SampIdx = numpy.asarray(SampIdx, dtype=numpy.int64)
+    DMIdx = numpy.asarray(DMIdx, dtype=numpy.int64)
+    Labels = numpy.zeros(len(SampIdx), dtype=numpy.int64)
+    if (0 == len(SampIdx)):
+        return Labels
+    Order = numpy.argsort(SampIdx, kind="mergesort")
+    TimeGroups = numpy.empty(len(SampIdx), dtype=numpy.int64)
+    TimeGroups[Order] = numpy.concatenate(
+        ([0], numpy.cumsum(numpy.diff(SampIdx[Order]) > MaxGap)))
+    Order = numpy.lexsort((SampIdx, DMIdx, TimeGroups))
+    Breaks = (numpy.diff(TimeGroups[Order]) != 0)                             \
+             | (numpy.diff(DMIdx[Order]) > MaxDMGap)
+    Labels[Order] = numpy.concatenate(([0], numpy.cumsum(Breaks)))
+    return Labels
+
+#
+# build the candidate table from clustered events
+#
+def GetCandidates(SampIdx, DMIdx, SNR, Widths, Labels, DMs, TSamp):
+    """Return the candidates as a CandType array, sorted by time."""
+    NCands = (Labels.max() + 1) if len(Labels) > 0 else 0
+    Cands = numpy.zeros(NCands, dtype=CandType)
+    if (0 == NCands):
+        return Cands
+    # sort by label, brightest event first
+    Order = numpy.lexsort((-SNR, Labels))
+    Starts = numpy.flatnonzero(numpy.diff(Labels[Order])) + 1
+    Starts = numpy.concatenate(([0], Starts))
+    Peak = Order[Starts]
+    Cands["DM"] = DMs[DMIdx[Peak]]
+    Cands["SNR"] = SNR[Peak]
+    Cands["Sample"] = SampIdx[Peak]
+    Cands["Time"] = SampIdx[Peak] * TSamp
+    Cands["Width"] = Widths[Peak]
+    Cands["NEvents"] = numpy.diff(numpy.concatenate((Starts, [len(Order)])))
+    Cands["DMLow"] = DMs[numpy.minimum.reduceat(DMIdx[Order], Starts)]
+    Cands["DMHigh"] = DMs[numpy.maximum.reduceat(DMIdx[Order], Starts)]
+    Cands["SampLow"] = numpy.minimum.reduceat(SampIdx[Order], Starts)
+    Cands["SampHigh"] = numpy.maximum.reduceat(SampIdx[Order], Starts)
+    return Cands[numpy.argsort(Cands["Sample"], kind="mergesort")]
+
+#
+# sift a set of dedispersed time series for single pulses
+#
+def SiftSeries(FilesSpec, Threshold=DEF_THRESHOLD, BlockSize=DEF_SIZE_BLOCK, \
+               MaxGap=DEF_MAX_GAP, MaxDMGap=DEF_MAX_DM_GAP,                   \
+               MaxWidth=DEF_MAX_WIDTH, Progress=None):
+    """Read the time series in blocks of BlockSize samples, normalise each
+    block of each series by its median and MAD, and keep the samples above
+    Threshold. A final block shorter than half a block is normalised with the
+    statistics of the previous block. If MaxWidth is more than 1, the
+    normalised series are searched with boxcars of widths 1, 2, 4, ...,
+    MaxWidth samples (see yapp_boxcar.BoxcarSearch()), and the S/N is that of
+    the best width. Returns (candidates, number of events, number of samples
+    per series, header of the lowest-DM series)."""
+    (DMs, hdr, Series) = OpenSeries(FilesSpec)
+    NSamps = len(Series[0])
+    Widths = boxcar.GetWidths(MaxWidth)
+    # each block is followed by the samples needed to complete the boxcars
+    #   that start near its end
+    NExtra = Widths.max() - 1
+    Events = []
+    Block = numpy.empty((len(Series), min(BlockSize, NSamps) + NExtra),
+                        dtype=numpy.float32)
+    Stats = None
+    for Start in range(0, NSamps, BlockSize):
+        NBlock = min(BlockSize, NSamps - Start)
+        NRead = min(NBlock + NExtra, NSamps - Start)
+        for (i, Data) in enumerate(Series):
+            Block[i, :NRead] = Data[Start:Start+NRead]
+        if (Stats is None or NBlock >= BlockSize / 2):
+            Stats = stats.CalcRobustStats(Block[:, :NBlock])
+        SNR = Block[:, :NBlock+NExtra]
+        SNR -= Stats[0][:, numpy.newaxis]
+        SNR /= Stats[1][:, numpy.newaxis]
+        # samples beyond the end of the data are at the median
+        SNR[:, NRead:] = 0.0
+        if (NExtra > 0):
+            (SNR, BestWidths) = boxcar.BoxcarSearch(SNR, NBlock, Widths)
+        else:
+            BestWidths = numpy.ones(SNR.shape, dtype=numpy.int32)
+        (DMIdx, SampIdx, EventSNR) = FindEvents(SNR, Threshold)
+        Events.append((DMIdx, SampIdx + Start, EventSNR,
+                       BestWidths[DMIdx, SampIdx]))
+        if (Progress is not None):
+            Progress(Start + NBlock, NSamps)
+
+    (DMIdx, SampIdx, SNR, EventWidths)                                        \
+        = [numpy.concatenate([Event[i] for Event in Events])
+           for i in range(4)]
+    Labels = ClusterEvents(SampIdx, DMIdx, MaxGap, MaxDMGap)
+    Cands = GetCandidates(SampIdx, DMIdx, SNR, EventWidths, Labels, DMs,
+                          hdr.TSamp)
+    return (Cands, len(SNR), NSamps, hdr)
+
+#
+# build the name of a candidate table
+#
+def GetCandFilename(FileSpec):
+    """Strip the DM from the name of a dedispersed time series, so that
+    <base>.dm<dm>.tim gives <base>.cand."""
+    Base = os.path.splitext(FileSpec)[0]
+    Base = re.sub(r"\." + dedisp.INFIX_DEDISPERSE + r"[-+.0-9eE]*$", "", Base)
+    return Base + EXT_CAND
+
+#
+# write a candidate table
+#
+def WriteCandTable(FileCand, Cands):
+    numpy.savetxt(FileCand, Cands, fmt=CAND_FORMATS, delimiter=" ",
+                  header=" ".join(CandType.names))
+    return
+
+#
+# read a candidate table
+#
+def ReadCandTable(FileCand):
+    return numpy.loadtxt(FileCand, dtype=CandType, ndmin=1)
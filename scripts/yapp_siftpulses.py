@@ -0,0 +1,163 @@
+#!/usr/bin/python
+
+# yapp_siftpulses.py
+# Sift dedispersed time series at many DMs for single pulses, optionally
+#   searching over a range of pulse widths, group the events into candidates,
+#   and write them to a candidate table. Optionally plots the candidates.
+#
+#   Usage: yapp_siftpulses.py [options] <data-file-dm0> ... <data-file-dmN-1>
+
+import sys
+import getopt
+import math
+import yapp_sift as sift
+
+# function definitions
+def PrintUsage(ProgName):
+    "Prints usage information."
+    print "Usage: " + ProgName + " [options] <data-file-dm0> ... "            \
+          "<data-file-dmN-1>"
+    print "    -h  --help                           ",                        \
+          "Display this usage information"
+    print "    -n  --nsamp <samples>                ",                        \
+          "Number of samples read in one block,\n",                           \
+          "                                         ",                        \
+          "over which statistics are computed\n",                             \
+          "                                         ",                        \
+          "(default is 65536 samples)"
+    print "    -t  --threshold <sigmas>             ",                        \
+          "Threshold in sigmas\n",                                            \
+          "                                         ",                        \
+          "(default is 8.0)"
+    print "    -w  --maxwidth <samples>             ",                        \
+          "Search with boxcars of widths 1, 2, 4,\n",                         \
+          "                                         ",                        \
+          "..., up to this width\n",                                          \
+          "                                         ",                        \
+          "(default is 1 sample, no smoothing)"
+    print "    -g  --gap <samples>                  ",                        \
+          "Maximum gap in time between events of\n",                          \
+          "                                         ",                        \
+          "a candidate (default is 8 samples)"
+    print "    -m  --dmgap <trials>                 ",                        \
+          "Maximum gap in DM between events of a\n",                          \
+          "                                         ",                        \
+          "candidate (default is 1 DM trial)"
+    print "    -o  --output <file>                  ",                        \
+          "Candidate table\n",                                                \
+          "                                         ",                        \
+          "(default is <base>.cand)"
+    print "    -p  --plot <file>                    ",                        \
+          "Plot the candidates to an image file"
+    return
+
+def PrintProgress(Done, Total):
+    "Prints the fraction of data processed."
+    sys.stdout.write("\rProcessed %d of %d time samples." % (Done, Total))
+    sys.stdout.flush()
+    return
+
+# defaults
+BlockSize = sift.DEF_SIZE_BLOCK
+Threshold = sift.DEF_THRESHOLD
+MaxWidth = sift.DEF_MAX_WIDTH
+MaxGap = sift.DEF_MAX_GAP
+MaxDMGap = sift.DEF_MAX_DM_GAP
+FileCand = None
+FilePlot = None
+
+# get the command line arguments
+ProgName = sys.argv[0]
+OptsShort = "hn:t:w:g:m:o:p:"
+OptsLong = ["help", "nsamp=", "threshold=", "maxwidth=", "gap=", "dmgap=",
+            "output=", "plot="]
+
+# get the arguments using the getopt module
+try:
+    (Opts, Args) = getopt.getopt(sys.argv[1:], OptsShort, OptsLong)
+except getopt.GetoptError, ErrMsg:
+    # print usage information and exit
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+# parse the arguments
+try:
+    for o, a in Opts:
+        if o in ("-h", "--help"):
+            PrintUsage(ProgName)
+            sys.exit()
+        elif o in ("-n", "--nsamp"):
+            BlockSize = int(a)
+        elif o in ("-t", "--threshold"):
+            Threshold = float(a)
+        elif o in ("-w", "--maxwidth"):
+            MaxWidth = int(a)
+        elif o in ("-g", "--gap"):
+            MaxGap = int(a)
+        elif o in ("-m", "--dmgap"):
+            MaxDMGap = int(a)
+        elif o in ("-o", "--output"):
+            FileCand = a
+        elif o in ("-p", "--plot"):
+            FilePlot = a
+        else:
+            PrintUsage(ProgName)
+            sys.exit(1)
+except ValueError, ErrMsg:
+    sys.stderr.write("ERROR: " + str(ErrMsg) + "!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (0 == len(Args)):
+    sys.stderr.write("ERROR: Input file not specified!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (1 == len(Args)):
+    sys.stderr.write("ERROR: Only one input file given!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (BlockSize < 2 or MaxWidth < 1 or MaxGap < 0 or MaxDMGap < 0):
+    sys.stderr.write("ERROR: Number of samples must be > 1, maximum width "
+                     + "must be positive, and gaps must not be negative!\n")
+    PrintUsage(ProgName)
+    sys.exit(1)
+
+if (FileCand is None):
+    FileCand = sift.GetCandFilename(Args[0])
+
+try:
+    (Cands, NEvents, NSamps, hdr)                                             \
+        = sift.SiftSeries(Args, Threshold, BlockSize, MaxGap, MaxDMGap,
+                          MaxWidth, PrintProgress)
+except (IOError, ValueError), ErrMsg:
+    sys.stderr.write("\nERROR: " + str(ErrMsg) + "!\n")
+    sys.exit(1)
+
+# number of events expected from Gaussian noise alone
+NRandEvents = len(Args) * NSamps * 0.5 * math.erfc(Threshold / math.sqrt(2))
+print "\n%d events of an expected %d detected, in %d candidates."            \
+      % (NEvents, NRandEvents, len(Cands))
+
+sift.WriteCandTable(FileCand, Cands)
+print "Candidates written to %s." % FileCand
+
+if (FilePlot is not None):
+    # import matplotlib only now, and without a display, as the plot is only
+    #   written to a file
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plotter
+    # scale the marker area with S/N above the threshold
+    plotter.scatter(Cands["Time"], Cands["DM"],
+                    s=4 * (1 + Cands["SNR"] - Threshold) ** 2,
+                    facecolors="none", edgecolors="k")
+    plotter.xlabel("Time (s)")
+    plotter.ylabel("DM (cm$^{-3}$ pc)")
+    plotter.title(hdr.Pulsar)
+    plotter.savefig(FilePlot)
+    print "Candidates plotted to %s." % FilePlot
+
+print "DONE!"
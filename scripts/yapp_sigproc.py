@@ -0,0 +1,370 @@
+#!/usr/bin/python
+
+#
+# yapp_sigproc.py
+# SIGPROC filterbank (.fil) and dedispersed time series (.tim) support, based
+#   on the header parser in yapp_common.c and the labels in yapp_sigproc.h
+#
+
+import os
+import struct
+import numpy
+
+EXT_FIL = ".fil"
+EXT_TIM = ".tim"
+
+# header field labels, from yapp_sigproc.h
+SP_LABEL_HDRSTART = "HEADER_START"
+SP_LABEL_HDREND = "HEADER_END"
+SP_LABEL_RAWFILENAME = "rawdatafile"
+SP_LABEL_SRCNAME = "source_name"
+SP_LABEL_DATATYPE = "data_type"
+SP_LABEL_NUMCHANS = "nchans"
+SP_LABEL_FCHAN1 = "fch1"
+SP_LABEL_CHANBW = "foff"
+SP_LABEL_NUMBEAMS = "nbeams"
+SP_LABEL_BEAMID = "ibeam"
+SP_LABEL_NUMBITS = "nbits"
+SP_LABEL_NUMIFS = "nifs"
+SP_LABEL_TSAMP = "tsamp"
+SP_LABEL_TSTART = "tstart"
+SP_LABEL_OBSID = "telescope_id"
+SP_LABEL_BEID = "machine_id"
+SP_LABEL_SRCRA = "src_raj"
+SP_LABEL_SRCDEC = "src_dej"
+SP_LABEL_AZSTART = "az_start"
+SP_LABEL_ZASTART = "za_start"
+SP_LABEL_DM = "refdm"
+SP_LABEL_FLAGBARYCEN = "barycentric"
+SP_LABEL_FLAGPSRCEN = "pulsarcentric"
+SP_LABEL_FREQSTART = "FREQUENCY_START"
+SP_LABEL_FREQEND = "FREQUENCY_END"
+SP_LABEL_FREQCHAN = "fchannel"
+SP_LABEL_SIGNED = "signed"
+
+# binary types of the header values, as struct format characters
+SP_LABEL_TYPES = {SP_LABEL_RAWFILENAME: "s",
+                  SP_LABEL_SRCNAME: "s",
+                  SP_LABEL_DATATYPE: "i",
+                  SP_LABEL_NUMCHANS: "i",
+                  SP_LABEL_FCHAN1: "d",
+                  SP_LABEL_CHANBW: "d",
+                  SP_LABEL_NUMBEAMS: "i",
+                  SP_LABEL_BEAMID: "i",
+                  SP_LABEL_NUMBITS: "i",
+                  SP_LABEL_NUMIFS: "i",
+                  SP_LABEL_TSAMP: "d",
+                  SP_LABEL_TSTART: "d",
+                  SP_LABEL_OBSID: "i",
+                  SP_LABEL_BEID: "i",
+                  SP_LABEL_SRCRA: "d",
+                  SP_LABEL_SRCDEC: "d",
+                  SP_LABEL_AZSTART: "d",
+                  SP_LABEL_ZASTART: "d",
+                  SP_LABEL_DM: "d",
+                  SP_LABEL_FLAGBARYCEN: "i",
+                  SP_LABEL_FLAGPSRCEN: "i",
+                  SP_LABEL_FREQCHAN: "d",
+                  SP_LABEL_SIGNED: "b"}
+
+# observatory names, indexed by telescope ID
+SP_OBS_NAMES = ["Fake", "Arecibo", "Ooty", "Nancay", "Parkes", "Jodrell",
+                "GBT", "GMRT", "Effelsberg"]
+
+SP_RADEC_SCALE = 10000
+DEG_PER_HOUR = 15.0
+
+# sample types for whole-byte data, as read by YAPP_ReadData()
+SP_SAMP_TYPES = {8: numpy.uint8,
+                 16: numpy.uint16,
+                 32: numpy.float32}
+
+#
+# SIGPROC header
+#
+class SIGPROCHeader(object):
+    """Header of a SIGPROC file. Frequencies are in MHz and times in seconds,
+    and the derived quantities are calculated as in YAPP_ReadSIGPROCHeader().
+    Fields holds every value as read from the file, keyed by label."""
+    def __init__(self):
+        self.Fields = {}
+        self.Pulsar = ""
+        self.Site = ""
+        self.NChans = 1
+        self.NBits = 32
+        self.NIFs = 1
+        self.TSamp = 0.0
+        self.TStart = 0.0
+        self.FChan1 = 0.0
+        self.ChanBW = 0.0
+        self.SourceRA = 0.0     # degrees
+        self.SourceDec = 0.0
+        self.DM = 0.0
+        self.BackendID = 0
+        self.AzStart = 0.0
+        self.ZAStart = 0.0
+        self.FlagBaryCen = 0
+        self.Freqs = None       # channel frequencies of spliced data
+        self.IsBandFlipped = False
+        self.FMin = 0.0
+        self.FMax = 0.0
+        self.BW = 0.0
+        self.FCentre = 0.0
+        self.HeaderLen = 0      # bytes
+        self.NTimeSamps = 0
+
+#
+# read a length-prefixed string
+#
+def _ReadString(fsrc):
+    Buf = fsrc.read(4)
+    if (len(Buf) < 4):
+        raise ValueError("Unexpected end of header in " + fsrc.name)
+    (Len,) = struct.unpack("<i", Buf)
+    if (Len < 0 or Len > 4096):
+        raise ValueError("Invalid string length %d in header of %s"
+                         % (Len, fsrc.name))
+    return fsrc.read(Len).decode("ascii", "replace")
+
+#
+# read a value of the given struct format
+#
+def _ReadValue(fsrc, Type):
+    if ("s" == Type):
+        return _ReadString(fsrc)
+    Size = struct.calcsize("<" + Type)
+    return struct.unpack("<" + Type, fsrc.read(Size))[0]
+
+#
+# derive the band of a header from its channels
+#
+def _SetBWAndCentre(hdr, ChanBW):
+    # the band edges are half a channel beyond the extreme channel centres
+    hdr.BW = (hdr.FMax - hdr.FMin) + ChanBW
+    if (0 == hdr.NChans % 2):
+        hdr.FCentre = (hdr.FMin - (ChanBW / 2)) + ((hdr.NChans / 2) * ChanBW)
+    else:
+        hdr.FCentre = hdr.FMin + ((float(hdr.NChans) / 2) * ChanBW)
+    return
+
+def SetBandFromFChan1(hdr):
+    """Set FMin, FMax, BW and FCentre of hdr from FChan1, ChanBW and NChans,
+    FChan1 being the highest frequency if the band is flipped."""
+    ChanBW = abs(hdr.ChanBW)
+    if (hdr.IsBandFlipped):
+        hdr.FMax = hdr.FChan1
+        hdr.FMin = hdr.FMax - ((hdr.NChans - 1) * ChanBW)
+    else:
+        hdr.FMin = hdr.FChan1
+        hdr.FMax = hdr.FMin + ((hdr.NChans - 1) * ChanBW)
+    _SetBWAndCentre(hdr, ChanBW)
+    return
+
+#
+# read the header of a SIGPROC file
+#
+def ReadSIGPROCHeader(FileSpec):
+    """Parse the HEADER_START ... HEADER_END keyword stream of a .fil or .tim
+    file. Headerless files (with a separate .ym header) are not supported."""
+    hdr = SIGPROCHeader()
+    fsrc = open(FileSpec, "rb")
+    try:
+        Buf = fsrc.read(4)
+        if (len(Buf) < 4                                                      \
+            or struct.unpack("<i", Buf)[0] != len(SP_LABEL_HDRSTART)):
+            raise ValueError(FileSpec + " does not have a SIGPROC header")
+        if (fsrc.read(len(SP_LABEL_HDRSTART)).decode("ascii", "replace")     \
+            != SP_LABEL_HDRSTART):
+            raise ValueError("Missing label " + SP_LABEL_HDRSTART + " in "
+                             + FileSpec)
+
+        Freqs = []
+        InFreqs = False
+        while True:
+            Label = _ReadString(fsrc)
+            if (SP_LABEL_HDREND == Label):
+                break
+            elif (SP_LABEL_FREQSTART == Label):
+                InFreqs = True
+            elif (SP_LABEL_FREQEND == Label):
+                InFreqs = False
+            elif (Label in SP_LABEL_TYPES):
+                Value = _ReadValue(fsrc, SP_LABEL_TYPES[Label])
+                if (SP_LABEL_FREQCHAN == Label and InFreqs):
+                    Freqs.append(Value)
+                else:
+                    hdr.Fields[Label] = Value
+            else:
+                # the size of the value of an unknown label is not known, so
+                #   the rest of the header cannot be parsed
+                raise ValueError("Unknown field label " + Label
+                                 + " encountered in " + FileSpec)
+        hdr.HeaderLen = fsrc.tell()
+    finally:
+        fsrc.close()
+
+    Fields = hdr.Fields
+    hdr.Pulsar = Fields.get(SP_LABEL_SRCNAME, "")
+    ObsID = Fields.get(SP_LABEL_OBSID, 0)
+    if (0 <= ObsID < len(SP_OBS_NAMES)):
+        hdr.Site = SP_OBS_NAMES[ObsID]
+    hdr.NChans = Fields.get(SP_LABEL_NUMCHANS, 1)
+    hdr.NBits = Fields.get(SP_LABEL_NUMBITS, 32)
+    hdr.NIFs = Fields.get(SP_LABEL_NUMIFS, 1)
+    hdr.TSamp = Fields.get(SP_LABEL_TSAMP, 0.0)
+    hdr.TStart = Fields.get(SP_LABEL_TSTART, 0.0)
+    hdr.FChan1 = Fields.get(SP_LABEL_FCHAN1, 0.0)
+    hdr.ChanBW = Fields.get(SP_LABEL_CHANBW, 0.0)
+    # SIGPROC scales the RA and declination by 10000, and stores the RA in
+    #   hours
+    hdr.SourceRA = Fields.get(SP_LABEL_SRCRA, 0.0) / SP_RADEC_SCALE           \
+                   * DEG_PER_HOUR
+    hdr.SourceDec = Fields.get(SP_LABEL_SRCDEC, 0.0) / SP_RADEC_SCALE
+    hdr.DM = Fields.get(SP_LABEL_DM, 0.0)
+    hdr.BackendID = Fields.get(SP_LABEL_BEID, 0)
+    hdr.AzStart = Fields.get(SP_LABEL_AZSTART, 0.0)
+    hdr.ZAStart = Fields.get(SP_LABEL_ZASTART, 0.0)
+    hdr.FlagBaryCen = Fields.get(SP_LABEL_FLAGBARYCEN, 0)
+
+    if (len(Freqs) > 0):
+        # spliced data, where the first frequency is the highest
+        hdr.Freqs = numpy.array(Freqs)
+        hdr.FMax = Freqs[0]
+        hdr.FMin = Freqs[-1]
+        hdr.IsBandFlipped = True
+        _SetBWAndCentre(hdr, Freqs[-2] - Freqs[-1])
+    else:
+        hdr.IsBandFlipped = (hdr.ChanBW < 0.0)
+        SetBandFromFChan1(hdr)
+
+    DataSize = os.path.getsize(FileSpec) - hdr.HeaderLen
+    if (FileSpec.endswith(EXT_TIM)):
+        hdr.NChans = 1
+    hdr.NTimeSamps = (DataSize * 8) // (hdr.NChans * hdr.NBits)
+    return hdr
+
+#
+# write a length-prefixed string
+#
+def _WriteString(fdest, Value):
+    Value = Value.encode("ascii")
+    fdest.write(struct.pack("<i", len(Value)) + Value)
+    return
+
+#
+# write a header field
+#
+def _WriteField(fdest, Label, Value):
+    _WriteString(fdest, Label)
+    if ("s" == SP_LABEL_TYPES[Label]):
+        _WriteString(fdest, Value)
+    else:
+        fdest.write(struct.pack("<" + SP_LABEL_TYPES[Label], Value))
+    return
+
+#
+# write the header of a SIGPROC file
+#
+def WriteSIGPROCHeader(fdest, hdr, IsTim=False):
+    """Write the header to an open file, with the same fields as
+    YAPP_WriteMetadata(). Time series are never band-flipped, so for them the
+    first channel is the lowest."""
+    _WriteString(fdest, SP_LABEL_HDRSTART)
+    _WriteField(fdest, SP_LABEL_SRCNAME, hdr.Pulsar)
+    _WriteField(fdest, SP_LABEL_DATATYPE, 2 if IsTim else 1)
+    _WriteField(fdest, SP_LABEL_NUMCHANS, hdr.NChans)
+    ChanBW = abs(hdr.ChanBW)
+    if (hdr.IsBandFlipped and not IsTim):
+        _WriteField(fdest, SP_LABEL_FCHAN1, hdr.FMax)
+        _WriteField(fdest, SP_LABEL_CHANBW, -ChanBW)
+    else:
+        _WriteField(fdest, SP_LABEL_FCHAN1, hdr.FMin)
+        _WriteField(fdest, SP_LABEL_CHANBW, ChanBW)
+    _WriteField(fdest, SP_LABEL_NUMBITS, hdr.NBits)
+    _WriteField(fdest, SP_LABEL_NUMIFS, hdr.NIFs)
+    _WriteField(fdest, SP_LABEL_TSAMP, hdr.TSamp)
+    _WriteField(fdest, SP_LABEL_TSTART, hdr.TStart)
+    if (hdr.Site in SP_OBS_NAMES):
+        ObsID = SP_OBS_NAMES.index(hdr.Site)
+    else:
+        ObsID = 0
+    _WriteField(fdest, SP_LABEL_OBSID, ObsID)
+    _WriteField(fdest, SP_LABEL_BEID, hdr.BackendID)
+    _WriteField(fdest, SP_LABEL_SRCRA,
+                hdr.SourceRA * SP_RADEC_SCALE / DEG_PER_HOUR)
+    _WriteField(fdest, SP_LABEL_SRCDEC, hdr.SourceDec * SP_RADEC_SCALE)
+    _WriteField(fdest, SP_LABEL_AZSTART, hdr.AzStart)
+    _WriteField(fdest, SP_LABEL_ZASTART, hdr.ZAStart)
+    if (IsTim):
+        _WriteField(fdest, SP_LABEL_DM, hdr.DM)
+    _WriteField(fdest, SP_LABEL_FLAGBARYCEN, hdr.FlagBaryCen)
+    _WriteString(fdest, SP_LABEL_HDREND)
+    return
+
+#
+# unpack 1-, 2- or 4-bit samples
+#
+def UnpackBits(Packed, NBits):
+    """Unpack the last axis of a uint8 array of packed samples, lowest-order
+    bits first, as in YAPP_ReadData()."""
+    Packed = numpy.asarray(Packed, dtype=numpy.uint8)
+    SampsPerByte = 8 // NBits
+    Shifts = numpy.arange(0, 8, NBits, dtype=numpy.uint8)
+    Unpacked = (Packed[..., numpy.newaxis] >> Shifts)                         \
+               & numpy.uint8((1 << NBits) - 1)
+    return Unpacked.reshape(Packed.shape[:-1]                                 \
+                            + (Packed.shape[-1] * SampsPerByte,))
+
+#
+# time-indexable view of packed data
+#
+class PackedData(object):
+    """Wraps a memory map of 1-, 2- or 4-bit data, with one row of packed
+    bytes per time sample, and unpacks only the rows that are indexed."""
+    def __init__(self, Packed, NBits, NChans):
+        self.Packed = Packed
+        self.NBits = NBits
+        self.shape = (Packed.shape[0], NChans)
+        self.dtype = numpy.dtype(numpy.uint8)
+        self.ndim = 2
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, Key):
+        if (isinstance(Key, tuple)):
+            Rows = self[Key[0]]
+            if (1 == Rows.ndim):
+                return Rows[Key[1:]]
+            return Rows[(slice(None),) + Key[1:]]
+        return UnpackBits(self.Packed[Key], self.NBits)
+
+    def __array__(self, dtype=None):
+        Data = self[:]
+        if (dtype is not None):
+            Data = Data.astype(dtype)
+        return Data
+
+#
+# open the data in a SIGPROC file
+#
+def ReadSIGPROCData(FileSpec, hdr=None):
+    """Return (hdr, data), where data is a read-only memory map of shape
+    (NTimeSamps, NChans), unsigned for 8- and 16-bit data and float32 for
+    32-bit data. 1-, 2- and 4-bit data is returned as a PackedData object that
+    unpacks the rows it is indexed with."""
+    if (hdr is None):
+        hdr = ReadSIGPROCHeader(FileSpec)
+    if (hdr.NBits in SP_SAMP_TYPES):
+        Data = numpy.memmap(FileSpec, dtype=SP_SAMP_TYPES[hdr.NBits],
+                            mode="r", offset=hdr.HeaderLen,
+                            shape=(hdr.NTimeSamps, hdr.NChans))
+        return (hdr, Data)
+    if (hdr.NBits not in (1, 2, 4) or (hdr.NChans * hdr.NBits) % 8 != 0):
+        raise ValueError("Unsupported number of bits %d for %d channels"
+                         % (hdr.NBits, hdr.NChans))
+    Packed = numpy.memmap(FileSpec, dtype=numpy.uint8, mode="r",
+                          offset=hdr.HeaderLen,
+                          shape=(hdr.NTimeSamps,
+                                 (hdr.NChans * hdr.NBits) // 8))
+    return (hdr, PackedData(Packed, hdr.NBits, hdr.NChans))
@@ -2,14 +2,15 @@
 
 # yapp_stackprof.py
 # Calibrate folded sub-band profiles and create a 2D plot of
-#   frequency versus phase.
+#   frequency versus phase, on screen or in an image file.
 
 import sys
+import os
 import getopt
 import math
 import numpy
-import matplotlib.pyplot as plotter
 import yapp_common as yapp
+import yapp_profindex as profindex
 
 # function definitions
 def PrintUsage(ProgName):
@@ -33,18 +34,66 @@ def PrintUsage(ProgName):
           "with given order"
     print "    -l  --line                           ",                        \
           "1D stacked plots instead of 2D image"
+    print "    -o  --output <file>                  ",                        \
+          "Write the plot to an image file instead\n",                        \
+          "                                         ",                        \
+          "of showing it on screen"
+    print "    -s  --size <width>x<height>          ",                        \
+          "Size of the plot in pixels\n",                                     \
+          "                                         ",                        \
+          "(default is 1024x768)"
+    print "    -F  --frange <low>:<high>            ",                        \
+          "Only plot bands with centre frequencies\n",                        \
+          "                                         ",                        \
+          "in this range, in MHz"
     return
 
+def BinRows(Img, f, MaxRows):
+    """Averages groups of adjacent rows of Img, and the corresponding values
+    of f, so that there are at most MaxRows rows."""
+    Factor = int(math.ceil(float(len(Img)) / MaxRows))
+    if (Factor <= 1):
+        return (Img, f)
+    Starts = numpy.arange(0, len(Img), Factor)
+    Counts = numpy.diff(numpy.append(Starts, len(Img)))
+    return (numpy.add.reduceat(Img, Starts, axis=0) / Counts[:, numpy.newaxis],
+            numpy.add.reduceat(f, Starts) / Counts)
+
+def BinCols(Img, MaxCols):
+    """Averages groups of adjacent columns of Img, so that there are at most
+    MaxCols columns."""
+    (BinnedT, _) = BinRows(Img.T, numpy.zeros(Img.shape[1]), MaxCols)
+    return BinnedT.T
+
+def GetEnvelope(x, Img, MaxCols):
+    """Reduces each row of Img to the minimum and the maximum of each group of
+    adjacent columns, so that there are at most MaxCols groups, and peaks are
+    kept. Returns the x values and the rows, with the minimum and the maximum
+    of each group interleaved."""
+    Factor = int(math.ceil(float(len(x)) / MaxCols))
+    if (Factor <= 1):
+        return (x, Img)
+    Starts = numpy.arange(0, len(x), Factor)
+    Envelope = numpy.empty((len(Img), 2 * len(Starts)))
+    Envelope[:, 0::2] = numpy.minimum.reduceat(Img, Starts, axis=1)
+    Envelope[:, 1::2] = numpy.maximum.reduceat(Img, Starts, axis=1)
+    return (numpy.repeat(x[Starts], 2), Envelope)
+
 # defaults
 doCal = True
 Tsys = 0.0
+polyOrder = 0
 showLinePlot = False
+FilePlot = None
+(Width, Height) = (1024, 768)
+DPI = 100
+FRange = None
 
 # get the command line arguments
 ProgName = sys.argv[0]
-OptsShort = "hT:G:p:n:f:b:l"
+OptsShort = "hT:G:p:n:f:b:lo:s:F:"
 OptsLong = ["help", "tsys=", "gain=", "npol=", "onstart=", "onstop=",         \
-            "basefit=", "line"]
+            "basefit=", "line", "output=", "size=", "frange="]
 
 # get the arguments using the getopt module
 try:
@@ -82,6 +131,26 @@ for o, a in Opts:
     elif o in ("-l", "--line"):
         showLinePlot = True
         optind = optind + 1
+    elif o in ("-o", "--output"):
+        FilePlot = a
+        optind = optind + 2
+    elif o in ("-s", "--size"):
+        try:
+            (Width, Height) = [int(Size) for Size in a.lower().split("x")]
+        except ValueError:
+            sys.stderr.write("ERROR: Invalid plot size " + a + "!\n")
+            PrintUsage(ProgName)
+            sys.exit(1)
+        optind = optind + 2
+    elif o in ("-F", "--frange"):
+        try:
+            (FLow, FHigh) = [float(Freq) for Freq in a.split(":")]
+        except ValueError:
+            sys.stderr.write("ERROR: Invalid frequency range " + a + "!\n")
+            PrintUsage(ProgName)
+            sys.exit(1)
+        FRange = (FLow, FHigh)
+        optind = optind + 2
     else:
         PrintUsage(ProgName)
         sys.exit(1)
@@ -98,40 +167,45 @@ if (0.0 == Tsys):
     doCal = False
     print "WARNING: No Tsys given. No calibration will be performed!"
 
-NBands = len(sys.argv) - optind
-
-# read the centre frequencies
+# get the profiles from .yps profile stacks, which are memory-mapped, and the
+#   headers of .ypr files from the header index of each directory, so that
+#   .ypr files are only read for the selected bands
 Bands = []
+filesProf = []
 for fileProf in sys.argv[optind:]:
-    Bands.append([float((open(fileProf).readline())[37:-5]), fileProf])
-Bands.sort()
-
-f = numpy.zeros(NBands)
-for i in range(NBands):
-    f[i] = Bands[i][0]
+    if (yapp.EXT_PROFSTACK == os.path.splitext(fileProf)[1]):
+        (hdrs, profs) = yapp.ReadProfStack(fileProf)
+        for j in range(len(hdrs)):
+            Bands.append([hdrs[j].FCentre, hdrs[j], profs[j]])
+    else:
+        filesProf.append(fileProf)
+for (fileProf, hdr) in zip(filesProf, profindex.GetProfHeaders(filesProf)):
+    Bands.append([hdr.FCentre, hdr, fileProf])
+if (FRange is not None):
+    Bands = [band for band in Bands if FRange[0] <= band[0] <= FRange[1]]
+if (0 == len(Bands)):
+    sys.stderr.write("ERROR: No bands in the given frequency range!\n")
+    sys.exit(1)
 
 # read the bandwidth and duration of observation from the first file
-hdr = open(sys.argv[optind])
-# skip centre frequency
-hdr.readline()
+hdr = Bands[0][1]
 # read the original channel bandwidth in MHz
-ChanBW = float((hdr.readline())[37:-5])
+ChanBW = hdr.ChanBW
 # read the bandwidth in MHz and convert to Hz
-BW = float((hdr.readline())[37:-5]) * 1e6
+BW = hdr.BW * 1e6
 # read duration in seconds
-tObs = float((hdr.readline())[37:-3])
-hdr.close()
-
-# count the number of header lines in the first file (assume to be the same for
-#    all files)
-HeaderLines = 0
-hdr = open(sys.argv[optind])
-for line in hdr:
-    if ("#" == line[0]):
-        HeaderLines = HeaderLines + 1
-hdr.close()
-
-NBins = len(open(sys.argv[optind]).readlines()) - HeaderLines
+tObs = hdr.tObs
+
+# sort by centre frequency
+Bands.sort(key=lambda band: band[0])
+NBands = len(Bands)
+
+f = numpy.zeros(NBands)
+for i in range(NBands):
+    f[i] = Bands[i][0]
+
+# assume the number of bins to be the same for all files
+NBins = hdr.NBins
 x = numpy.array([float(i) / NBins for i in range(NBins)])
 
 if (doCal):
@@ -141,43 +215,76 @@ if (doCal):
 profImg = numpy.zeros(NBands * NBins)
 profImg.shape = (NBands, NBins)
 
+# read raw profiles
 for i in range(NBands):
-    # read raw profile
-    profImg[i] = numpy.loadtxt(Bands[i][1], dtype=numpy.float32,              \
-                               comments="#", delimiter="\n")
-    if (doCal):
-        # get the calibrated profile (and ignore the 1-sigma error)
-        (profImg[i], _) = yapp.DoCal(profImg[i], onBin, offBin,               \
-                                     Tsys, G, NPol, tObs, NBins, BW,          \
-                                     polyOrder)
+    if (isinstance(Bands[i][2], str)):
+        profImg[i] = yapp.ReadProf(Bands[i][2])[1]
+    else:
+        profImg[i] = Bands[i][2]
+
+if (doCal):
+    # get the calibrated profiles of all bands together (and ignore the
+    #   1-sigma errors)
+    (profImg, _) = yapp.DoCalBatch(profImg, onBin, offBin,                    \
+                                   Tsys, G, NPol, tObs, NBins, BW, polyOrder)
 
 # matplotlib.pyplot.imshow() does not align the rows correctly with respect to
 # the centre frequency of the channels, so compute the lowest frequency per
 # channel, to pass to imshow()
-for i in range(NBands):
-    f[i] = f[i] - ((BW * 1e-6) / 2) + (ChanBW / 2)      # BW is in MHz
+f = f - ((BW * 1e-6) / 2) + (ChanBW / 2)        # BW is in MHz
+extent = [min(x), max(x), min(f), max(f) + (BW * 1e-6)]
 
+# import matplotlib only now, so that errors in the input are reported without
+#   waiting for it to load, and without a display if the plot is only written
+#   to a file
+import matplotlib
+if (FilePlot is not None):
+    matplotlib.use("Agg")
+import matplotlib.pyplot as plotter
+from matplotlib.collections import LineCollection
+
+plotter.figure(figsize=(float(Width) / DPI, float(Height) / DPI), dpi=DPI)
+
+# there is no point in drawing more bands or phase bins than there are pixels,
+#   so reduce the data to the size of the plot first
 if showLinePlot:
     offset = 2 * numpy.std(profImg)
-    if NBands < 10:
-        numTicks = NBands
+    # leave at least 2 pixels between lines
+    (profImg, f) = BinRows(profImg, f, Height // 2)
+    (x, profImg) = GetEnvelope(x, profImg, Width)
+    NLines = len(profImg)
+    profImg = profImg + (numpy.arange(NLines) * offset)[:, numpy.newaxis]
+    # draw all lines as one collection, instead of one line per band
+    segments = numpy.empty((NLines, len(x), 2))
+    segments[:, :, 0] = x
+    segments[:, :, 1] = profImg
+    lines = LineCollection(segments, linewidths=0.5,
+                           colors=plotter.rcParams["axes.prop_cycle"]        \
+                                  .by_key()["color"])
+    axes = plotter.gca()
+    axes.add_collection(lines)
+    axes.set_xlim(x[0], x[-1])
+    axes.set_ylim(profImg.min(), profImg.max())
+    if NLines < 10:
+        numTicks = NLines
     else:
         numTicks = 10   # don't want more than 10 ticks on the y-axis
-    step = int(math.ceil(float(NBands) / numTicks))
-    yticks = numpy.array([i * offset for i in range(0, NBands, step)])
-    ylabels = f[::step]
-    for i in range(NBands):
-        profImg[i] = profImg[i] + (i * offset)
-        plotter.plot(x, profImg[i])
-        plotter.yticks(yticks, map(lambda val: "%.1f" % val, f))
+    step = int(math.ceil(float(NLines) / numTicks))
+    yticks = numpy.arange(0, NLines, step) * offset
+    plotter.yticks(yticks, map(lambda val: "%.1f" % val, f[::step]))
 else:
+    (profImg, _) = BinRows(profImg, f, Height)
+    profImg = BinCols(profImg, Width)
     img = plotter.imshow(profImg, origin="lower", aspect="auto", \
                      interpolation="nearest", cmap="jet")
-    img.set_extent([min(x), max(x), min(f), max(f) + (BW * 1e-6)])
+    img.set_extent(extent)
     cbar = plotter.colorbar(img, orientation="vertical")
     cbar.set_label("Flux Density (Jy)")
 
 plotter.xlabel("Phase")
 plotter.ylabel("Frequency (MHz)")
-plotter.show()
+if (FilePlot is not None):
+    plotter.savefig(FilePlot, dpi=DPI)
+else:
+    plotter.show()
 
@@ -0,0 +1,318 @@
+#!/usr/bin/python
+
+#
+# yapp_stats.py
+# Statistics functions, for the per-channel and global statistics of
+#   filterbank data and time series in a single pass, with the results cached
+#   next to the data file
+#
+
+import os
+import multiprocessing
+import numpy
+import yapp_common as yapp
+import yapp_sigproc as sp
+import yapp_presto as presto
+
+# scale factor from the median absolute deviation to the standard deviation,
+#   for Gaussian noise
+MAD_TO_SIGMA = 1.4826
+
+# default maximum number of time samples per channel kept for the median and
+#   MAD, and the default maximum number of samples of all channels kept, which
+#   bounds the size of the cache of files with many channels
+DEF_SKETCH_SIZE = 8192
+DEF_SKETCH_VALUES = 1 << 20
+MIN_SKETCH_SIZE = 256
+
+# number of time samples read in one block
+DEF_SIZE_BLOCK = 65536
+
+# statistics cache file naming, and the version of its contents
+FILE_STATS_SUFFIX = ".ystats.npz"
+STATS_VERSION = 1
+
+#
+# running statistics
+#
+class Stats(object):
+    """Per-channel count, mean, sum of squared deviations from the mean (M2),
+    minimum and maximum of (time sample, channel) data, updated one block at
+    a time. Blocks are combined with the pairwise update of Chan et al., of
+    which Welford's update is the one-sample case, so that the statistics of
+    separately processed parts of the data, such as by worker processes, can
+    be merged exactly with Merge(). For the median and the median absolute
+    deviation (MAD), every Stride-th time sample is kept, where Stride is
+    doubled whenever more than SketchSize samples are held, so that they are
+    approximate for long data."""
+    def __init__(self, NChans, SketchSize=DEF_SKETCH_SIZE):
+        self.NChans = NChans
+        self.SketchSize = SketchSize
+        self.Count = 0
+        self.Mean = numpy.zeros(NChans, dtype=numpy.float64)
+        self.M2 = numpy.zeros(NChans, dtype=numpy.float64)
+        self.Min = numpy.empty(NChans, dtype=numpy.float64)
+        self.Min.fill(numpy.inf)
+        self.Max = numpy.empty(NChans, dtype=numpy.float64)
+        self.Max.fill(-numpy.inf)
+        self.Stride = 1
+        # time sample indices and values of the kept samples
+        self.SketchIdx = numpy.zeros(0, dtype=numpy.int64)
+        self.Sketch = numpy.zeros((0, NChans), dtype=numpy.float32)
+
+    def _MergeMoments(self, Count, Mean, M2):
+        Total = self.Count + Count
+        Delta = Mean - self.Mean
+        self.Mean = self.Mean + (Delta * (float(Count) / Total))
+        self.M2 = self.M2 + M2                                                \
+                  + ((Delta ** 2) * (float(self.Count) * Count / Total))
+        self.Count = Total
+        return
+
+    def _Compact(self):
+        while (len(self.SketchIdx) > self.SketchSize):
+            self.Stride = self.Stride * 2
+            Keep = (0 == self.SketchIdx % self.Stride)
+            self.SketchIdx = self.SketchIdx[Keep]
+            self.Sketch = self.Sketch[Keep]
+        return
+
+    def Update(self, Block, Start=None):
+        """Add a (time sample, channel) block, of which the first time sample
+        is sample Start of the data (the sample after the last one added if
+        None)."""
+        Block = numpy.asarray(Block, dtype=numpy.float64)
+        if (1 == Block.ndim):
+            Block = Block[:, numpy.newaxis]
+        if (0 == len(Block)):
+            return
+        if (Start is None):
+            Start = self.Count
+        Mean = Block.mean(axis=0)
+        M2 = ((Block - Mean) ** 2).sum(axis=0)
+        if (0 == self.Count):
+            (self.Count, self.Mean, self.M2) = (len(Block), Mean, M2)
+        else:
+            self._MergeMoments(len(Block), Mean, M2)
+        numpy.minimum(self.Min, Block.min(axis=0), out=self.Min)
+        numpy.maximum(self.Max, Block.max(axis=0), out=self.Max)
+        # the first sample at or after Start that is a multiple of Stride
+        First = (-Start) % self.Stride
+        Idx = numpy.arange(Start + First, Start + len(Block), self.Stride,
+                           dtype=numpy.int64)
+        self.SketchIdx = numpy.concatenate((self.SketchIdx, Idx))
+        self.Sketch = numpy.concatenate((self.Sketch,
+                                         Block[First::self.Stride]
+                                         .astype(numpy.float32)))
+        self._Compact()
+        return
+
+    def Merge(self, Other):
+        """Add the statistics of another part of the data."""
+        if (Other.NChans != self.NChans):
+            raise ValueError("Cannot merge statistics of %d and %d channels"  \
+                             % (self.NChans, Other.NChans))
+        if (0 == Other.Count):
+            return
+        if (0 == self.Count):
+            (self.Count, self.Mean, self.M2) = (Other.Count,
+                                                Other.Mean.copy(),
+                                                Other.M2.copy())
+        else:
+            self._MergeMoments(Other.Count, Other.Mean, Other.M2)
+        numpy.minimum(self.Min, Other.Min, out=self.Min)
+        numpy.maximum(self.Max, Other.Max, out=self.Max)
+        # keep the samples of both at the coarser of the two strides
+        self.Stride = max(self.Stride, Other.Stride)
+        Idx = numpy.concatenate((self.SketchIdx, Other.SketchIdx))
+        Sketch = numpy.concatenate((self.Sketch, Other.Sketch))
+        Keep = (0 == Idx % self.Stride)
+        Order = numpy.argsort(Idx[Keep], kind="mergesort")
+        self.SketchIdx = Idx[Keep][Order]
+        self.Sketch = Sketch[Keep][Order]
+        self._Compact()
+        return
+
+    def GetVariance(self):
+        "Returns the per-channel sample variance."
+        return self.M2 / max(self.Count - 1, 1)
+
+    def GetRMS(self):
+        "Returns the per-channel standard deviation, as in YAPP_CalcRMS()."
+        return numpy.sqrt(self.GetVariance())
+
+    def GetMedian(self):
+        "Returns the approximate per-channel median."
+        return numpy.median(self.Sketch, axis=0)
+
+    def GetMAD(self):
+        "Returns the approximate per-channel median absolute deviation."
+        return numpy.median(numpy.abs(self.Sketch - self.GetMedian()), axis=0)
+
+    def GetGlobal(self):
+        """Returns a single-channel Stats of all channels together, as
+        YAPP_CalcStats() calculates."""
+        Global = Stats(1, self.SketchSize)
+        Global.Count = self.Count * self.NChans
+        if (0 == Global.Count):
+            return Global
+        Global.Mean = numpy.array([self.Mean.mean()])
+        # the channels have equal counts
+        Global.M2 = numpy.array([self.M2.sum()
+                                 + (self.Count
+                                    * ((self.Mean - Global.Mean) ** 2).sum())])
+        Global.Min = numpy.array([self.Min.min()])
+        Global.Max = numpy.array([self.Max.max()])
+        Global.Stride = self.Stride
+        Global.SketchIdx = numpy.repeat(self.SketchIdx, self.NChans)
+        Global.Sketch = self.Sketch.reshape(-1, 1)
+        return Global
+
+    def ToArrays(self):
+        "Returns the statistics as a dictionary of arrays, for saving."
+        return {"NChans": numpy.array(self.NChans),
+                "SketchSize": numpy.array(self.SketchSize),
+                "Count": numpy.array(self.Count),
+                "Mean": self.Mean, "M2": self.M2,
+                "Min": self.Min, "Max": self.Max,
+                "Stride": numpy.array(self.Stride),
+                "SketchIdx": self.SketchIdx, "Sketch": self.Sketch}
+
+    @classmethod
+    def FromArrays(cls, Arrays):
+        "Returns the statistics saved by ToArrays()."
+        Loaded = cls(int(Arrays["NChans"]), int(Arrays["SketchSize"]))
+        Loaded.Count = int(Arrays["Count"])
+        for Name in ("Mean", "M2", "Min", "Max", "SketchIdx", "Sketch"):
+            setattr(Loaded, Name, numpy.array(Arrays[Name]))
+        Loaded.Stride = int(Arrays["Stride"])
+        return Loaded
+
+#
+# calculate robust statistics of a block
+#
+def CalcRobustStats(Block):
+    """Return the median and the MAD-based standard deviation of each row of
+    Block. Rows with a zero MAD fall back to the standard deviation, and to 1
+    if that is zero too."""
+    Median = numpy.median(Block, axis=1)
+    Sigma = MAD_TO_SIGMA                                                      \
+            * numpy.median(numpy.abs(Block - Median[:, numpy.newaxis]), axis=1)
+    Zero = (0.0 == Sigma)
+    if (numpy.any(Zero)):
+        Sigma[Zero] = Block[Zero].std(axis=1)
+        Sigma[0.0 == Sigma] = 1.0
+    return (Median, Sigma)
+
+#
+# open the data of a file as (time sample, channel)
+#
+def _ReadData(FileSpec):
+    if (FileSpec.endswith(presto.EXT_DAT)):
+        (hdr, Data) = presto.ReadSeries(FileSpec)
+        return Data[:, numpy.newaxis]
+    (hdr, Data) = sp.ReadSIGPROCData(FileSpec)
+    return Data
+
+def _CalcStatsTask(Task):
+    (FileSpec, Start, Stop, BlockSize, SketchSize) = Task
+    Data = _ReadData(FileSpec)
+    PartStats = Stats(Data.shape[1], SketchSize)
+    for First in range(Start, Stop, BlockSize):
+        PartStats.Update(Data[First:min(First + BlockSize, Stop)], First)
+    return PartStats
+
+#
+# calculate the statistics of a file
+#
+def CalcStats(FileSpec, NJobs=1, BlockSize=DEF_SIZE_BLOCK, SketchSize=None):
+    """Return the per-channel Stats of a .fil, .tim or .dat file, in one
+    pass over the data. With NJobs > 1, the data is split into that many
+    parts, whose statistics are calculated by worker processes and merged.
+    SketchSize is as for Stats, and by default keeps at most
+    DEF_SKETCH_VALUES samples of all channels together."""
+    Data = _ReadData(FileSpec)
+    (NTimeSamps, NChans) = Data.shape
+    del Data
+    if (SketchSize is None):
+        SketchSize = min(DEF_SKETCH_SIZE,
+                         max(MIN_SKETCH_SIZE, DEF_SKETCH_VALUES // NChans))
+    Edges = numpy.linspace(0, NTimeSamps, max(NJobs, 1) + 1).astype(int)
+    Tasks = [(FileSpec, Edges[i], Edges[i+1], BlockSize, SketchSize)
+             for i in range(len(Edges) - 1) if Edges[i+1] > Edges[i]]
+    if (NJobs > 1 and len(Tasks) > 1):
+        Pool = multiprocessing.Pool(len(Tasks))
+        try:
+            Parts = Pool.map(_CalcStatsTask, Tasks)
+        finally:
+            Pool.close()
+            Pool.join()
+    else:
+        Parts = map(_CalcStatsTask, Tasks)
+    if (0 == len(Parts)):
+        return Stats(NChans, SketchSize)
+    FileStats = Parts[0]
+    for Part in Parts[1:]:
+        FileStats.Merge(Part)
+    return FileStats
+
+#
+# get the name of the statistics cache of a file
+#
+def GetStatsFilename(FileSpec):
+    return FileSpec + FILE_STATS_SUFFIX
+
+def _GetFileKey(FileSpec):
+    return numpy.array((STATS_VERSION,) + yapp.GetFileKey(FileSpec),
+                       dtype=numpy.float64)
+
+#
+# read the cached statistics of a file
+#
+def ReadStats(FileSpec):
+    """Return the cached Stats of a file, or None if there are none, or if
+    the file has changed size or modification time since."""
+    FileStats = GetStatsFilename(FileSpec)
+    if (not os.path.exists(FileStats)):
+        return None
+    try:
+        Arrays = numpy.load(FileStats)
+        try:
+            if (not numpy.array_equal(Arrays["Key"], _GetFileKey(FileSpec))):
+                return None
+            return Stats.FromArrays(Arrays)
+        finally:
+            Arrays.close()
+    except (IOError, KeyError, ValueError):
+        return None
+
+#
+# cache the statistics of a file
+#
+def WriteStats(FileSpec, FileStats):
+    """Write the statistics next to the file. A directory that cannot be
+    written to only means that the statistics are not cached."""
+    try:
+        Key = _GetFileKey(FileSpec)
+        yapp.WriteFileAtomic(GetStatsFilename(FileSpec),
+                             lambda fdest: numpy.savez(fdest, Key=Key,
+                                                       **FileStats.ToArrays()),
+                             "wb")
+    except (IOError, OSError):
+        return False
+    return True
+
+#
+# get the statistics of a file, from the cache if possible
+#
+def GetStats(FileSpec, NJobs=1, UseCache=True):
+    """Return the per-channel Stats of a file, from its cache if it is up to
+    date, and calculate and cache them otherwise."""
+    if (UseCache):
+        FileStats = ReadStats(FileSpec)
+        if (FileStats is not None):
+            return FileStats
+    FileStats = CalcStats(FileSpec, NJobs)
+    if (UseCache):
+        WriteStats(FileSpec, FileStats)
+    return FileStats
@@ -12,6 +12,9 @@
  *                                          processed
  *                                          (default is all)
  *     -f  --filter <file>                  Filter mask filename
+ *     -F  --float-mask                     Filter mask is single-precision
+ *                                          floating-point
+ *                                          (default is signed bytes)
  *     -g  --graphics                       Turn on plotting
  *     -i  --invert                         Invert the background and foreground
  *                                          colours in plots
@@ -45,7 +48,7 @@ fftwf_complex *g_pfcFFTBuf = NULL;
 float *g_pfXAxis = NULL;
 fftwf_plan g_stPlanFwd = {0};
 fftwf_plan g_stPlanBwd = {0};
-char *g_pcFilter = NULL;
+float *g_pfFilter = NULL;
 
 int main(int argc, char *argv[])
 {
@@ -53,6 +56,8 @@ int main(int argc, char *argv[])
     FILE *pFOut = NULL;
     char *pcFileData = NULL;
     char *pcFileFilter = NULL;
+    char *pcFilter = NULL;
+    char cIsFloatMask = YAPP_FALSE;
     char *pcFileOut = NULL;
     char acFileOut[LEN_GENSTRING] = {0};
     int iFormat = DEF_FORMAT;
@@ -87,13 +92,14 @@ int main(int argc, char *argv[])
     const char *pcProgName = NULL;
     int iNextOpt = 0;
     /* valid short options */
-    const char* const pcOptsShort = "hs:p:f:giev";
+    const char* const pcOptsShort = "hs:p:f:Fgiev";
     /* valid long options */
     const struct option stOptsLong[] = {
         { "help",                   0, NULL, 'h' },
         { "skip",                   1, NULL, 's' },
         { "proc",                   1, NULL, 'p' },
         { "filter",                 1, NULL, 'f' },
+        { "float-mask",             0, NULL, 'F' },
         { "graphics",               0, NULL, 'g' },
         { "invert",                 0, NULL, 'i' },
         { "non-interactive",        0, NULL, 'e' },
@@ -130,6 +136,11 @@ int main(int argc, char *argv[])
                 pcFileFilter = optarg;
                 break;
 
+            case 'F':   /* -F or --float-mask */
+                /* set option */
+                cIsFloatMask = YAPP_TRUE;
+                break;
+
             case 'g':   /* -g or --graphics */
                 /* set option */
                 cHasGraphics = YAPP_TRUE;
@@ -249,13 +260,31 @@ int main(int argc, char *argv[])
         YAPP_CleanUp();
         return YAPP_RET_ERROR;
     }
-    iFFTUsableSize = (int) stFileStats.st_size;
+    if (cIsFloatMask)
+    {
+        if (stFileStats.st_size % sizeof(float) != 0)
+        {
+            (void) fprintf(stderr,
+                           "ERROR: Size of %s is not a multiple of %d "
+                           "bytes!\n",
+                           pcFileFilter,
+                           (int) sizeof(float));
+            (void) fclose(pFFilter);
+            YAPP_CleanUp();
+            return YAPP_RET_ERROR;
+        }
+        iFFTUsableSize = (int) (stFileStats.st_size / sizeof(float));
+    }
+    else
+    {
+        iFFTUsableSize = (int) stFileStats.st_size;
+    }
     iBlockSize = 2 * (iFFTUsableSize - 1);
 
-    g_pcFilter = (char *) YAPP_Malloc((size_t) iFFTUsableSize,
-                                      sizeof(char),
-                                      YAPP_FALSE);
-    if (NULL == g_pcFilter)
+    g_pfFilter = (float *) YAPP_Malloc((size_t) iFFTUsableSize,
+                                       sizeof(float),
+                                       YAPP_FALSE);
+    if (NULL == g_pfFilter)
     {
         (void) fprintf(stderr,
                        "ERROR: Memory allocation failed! %s!\n",
@@ -265,7 +294,32 @@ int main(int argc, char *argv[])
         return YAPP_RET_ERROR;
     }
 
-    iRet = fread(g_pcFilter, sizeof(char), iFFTUsableSize, pFFilter);
+    if (cIsFloatMask)
+    {
+        iRet = fread(g_pfFilter, sizeof(float), iFFTUsableSize, pFFilter);
+    }
+    else
+    {
+        pcFilter = (char *) YAPP_Malloc((size_t) iFFTUsableSize,
+                                        sizeof(char),
+                                        YAPP_FALSE);
+        if (NULL == pcFilter)
+        {
+            (void) fprintf(stderr,
+                           "ERROR: Memory allocation failed! %s!\n",
+                           strerror(errno));
+            (void) fclose(pFFilter);
+            YAPP_CleanUp();
+            return YAPP_RET_ERROR;
+        }
+        iRet = fread(pcFilter, sizeof(char), iFFTUsableSize, pFFilter);
+        /* byte masks only distinguish stop (zero) and pass (non-zero)
+           bins */
+        for (i = 0; i < iFFTUsableSize; ++i)
+        {
+            g_pfFilter[i] = (0 == pcFilter[i]) ? 0.0 : 1.0;
+        }
+    }
     if (iRet < iFFTUsableSize)
     {
         (void) fprintf(stderr,
@@ -561,11 +615,8 @@ int main(int argc, char *argv[])
         /* output contains (N / 2) + 1 non-zero samples */
         for (i = 0; i < iFFTUsableSize; ++i)
         {
-            if (0.0 == g_pcFilter[i])
-            {
-                g_pfcFFTBuf[i][0] = 0.0;    /* real part */
-                g_pfcFFTBuf[i][1] = 0.0;    /* imaginary part */
-            }
+            g_pfcFFTBuf[i][0] *= g_pfFilter[i];     /* real part */
+            g_pfcFFTBuf[i][1] *= g_pfFilter[i];     /* imaginary part */
         }
         fftwf_execute(g_stPlanBwd);
 
@@ -748,6 +799,12 @@ void PrintUsage(const char *pcProgName)
     (void) printf("(default is all)\n");
     (void) printf("    -f  --filter <file>                 ");
     (void) printf("Filter mask filename\n");
+    (void) printf("    -F  --float-mask                    ");
+    (void) printf("Filter mask is single-precision\n");
+    (void) printf("                                        ");
+    (void) printf("floating-point\n");
+    (void) printf("                                        ");
+    (void) printf("(default is signed bytes)\n");
     (void) printf("    -g  --graphics                      ");
     (void) printf("Turn on plotting\n");
     (void) printf("    -i  --invert                        ");